@@ -0,0 +1,119 @@
+"""
+命令补全延迟随传送点数量的变化：对比前缀索引与每次复制全部传送点后过滤的旧写法，
+并检查两者的结果一致（索引结果为旧写法结果的前 limit 个以内的子集）
+用法：python benchmarks/completion.py [--counts 1000 10000 100000] [--iterations N]
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from typing import Callable, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import fake_data_api  # noqa: E402
+
+fake_data_api.install()
+
+from simple_tp.completion import CompletionIndex  # noqa: E402
+from simple_tp.data import DataManager  # noqa: E402
+from simple_tp.storage import create_storage  # noqa: E402
+from simple_tp.utils import CoordWithDimension  # noqa: E402
+
+PLAYER = "Player"
+# 依次模拟逐字输入时的前缀
+PREFIXES = ["", "h", "ho", "hom", "home", "home1", "home12", "base", "base3", "x"]
+
+
+def percentile(latencies: List[float], q: float) -> float:
+    ordered = sorted(latencies)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def time_each(iterations: int, run: Callable[[str], List[str]]) -> List[float]:
+    latencies = []
+    for i in range(iterations):
+        prefix = PREFIXES[i % len(PREFIXES)]
+        start = time.perf_counter()
+        run(prefix)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SimpleTP suggestion latency sweep")
+    parser.add_argument("--counts", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    header = (
+        f"{'waypoints':>10}{'index p50':>12}{'index p99':>12}"
+        f"{'scan p50':>12}{'scan p99':>12}{'speedup':>10}"
+    )
+    print(f"global and personal waypoints each, limit={args.limit}, times in ms")
+    print(header)
+    print("-" * len(header))
+    mismatches = 0
+    for count in args.counts:
+        rng = random.Random(args.seed)
+        folder = tempfile.mkdtemp(prefix="simple_tp_completion_bench_")
+        try:
+            data_manager = DataManager(create_storage("json", folder))
+            for i in range(count):
+                coord = CoordWithDimension(rng.uniform(-5000, 5000), 64, 0, 0)
+                data_manager.put_waypoint(None, f"home{i}", coord)
+                data_manager.put_waypoint(PLAYER, f"base{i}", coord)
+            index = CompletionIndex(data_manager, args.limit)
+
+            def by_index(prefix: str) -> List[str]:
+                return index.search(PLAYER, prefix) + index.search(None, prefix)
+
+            # 旧写法：每次按键复制全部个人和全局传送点，再按前缀过滤
+            def by_scan(prefix: str) -> List[str]:
+                names = list(data_manager.get_personal_waypoints(PLAYER))
+                names += list(data_manager.get_global_waypoints())
+                return [name for name in names if name.startswith(prefix)]
+
+            for prefix in PREFIXES:
+                scanned = by_scan(prefix)
+                for player in (PLAYER, None):
+                    found = index.search(player, prefix)
+                    expected = [
+                        name
+                        for name in scanned
+                        if name.startswith("base" if player else "home")
+                    ]
+                    complete = len(found) == min(args.limit, len(expected))
+                    if not complete or not set(found) <= set(expected):
+                        mismatches += 1
+                        print(f"MISMATCH count={count} prefix={prefix!r}")
+
+            index_latencies = time_each(args.iterations, by_index)
+            scan_latencies = time_each(args.iterations, by_scan)
+            index.close()
+        finally:
+            shutil.rmtree(folder, ignore_errors=True)
+
+        index_p50 = percentile(index_latencies, 0.5)
+        scan_p50 = percentile(scan_latencies, 0.5)
+        print(
+            f"{count:>10}{index_p50 * 1000:>12.3f}"
+            f"{percentile(index_latencies, 0.99) * 1000:>12.3f}"
+            f"{scan_p50 * 1000:>12.3f}{percentile(scan_latencies, 0.99) * 1000:>12.3f}"
+            f"{scan_p50 / index_p50:>9.1f}x"
+        )
+
+    if mismatches:
+        print(f"FAILED: {mismatches} mismatched suggestions")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
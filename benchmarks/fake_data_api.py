@@ -0,0 +1,214 @@
+"""
+minecraft_data_api 的替身，数据来自内存中的玩家表，每次查询前等待 latency 秒以模拟服务器往返
+与真实的 API 一样，查询结果以 SNBT 文本返回后再逐字符解析：不带路径的查询返回完整的玩家数据
+（装满的背包和末影箱、属性、配方书等），因此其解析开销与真实情况接近
+需在导入 simple_tp 之前调用 install()
+"""
+
+import sys
+import threading
+import time
+import types
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+
+class Coordinate(NamedTuple):
+    x: float
+    y: float
+    z: float
+
+
+class ServerPlayerList(NamedTuple):
+    amount: int
+    limit: int
+    players: List[str]
+
+
+def _snbt_key(key: str) -> str:
+    # 只含字母、数字和 _-.+ 的键可以不加引号
+    return key if all(c.isalnum() or c in "_-.+" for c in key) else to_snbt(key)
+
+
+def to_snbt(value: Any) -> str:
+    if isinstance(value, dict):
+        return (
+            "{"
+            + ", ".join(f"{_snbt_key(k)}: {to_snbt(v)}" for k, v in value.items())
+            + "}"
+        )
+    if isinstance(value, list):
+        return "[" + ", ".join(to_snbt(v) for v in value) + "]"
+    if isinstance(value, str):
+        return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+    if isinstance(value, float):
+        return f"{value}d"
+    return str(value)
+
+
+def _skip_spaces(text: str, i: int) -> int:
+    while i < len(text) and text[i] in " \n":
+        i += 1
+    return i
+
+
+def _parse_snbt(text: str, i: int) -> Tuple[Any, int]:
+    i = _skip_spaces(text, i)
+    char = text[i]
+    if char in "{[":
+        is_dict = char == "{"
+        result: Any = {} if is_dict else []
+        i += 1
+        while True:
+            i = _skip_spaces(text, i)
+            if text[i] in "}]":
+                return result, i + 1
+            if is_dict:
+                key, i = _parse_snbt(text, i)
+                i = _skip_spaces(text, i) + 1  # 跳过冒号
+                result[str(key)], i = _parse_snbt(text, i)
+            else:
+                value, i = _parse_snbt(text, i)
+                result.append(value)
+            i = _skip_spaces(text, i)
+            if text[i] == ",":
+                i += 1
+    if char == '"':
+        chars = []
+        i += 1
+        while text[i] != '"':
+            if text[i] == "\\":
+                i += 1
+            chars.append(text[i])
+            i += 1
+        return "".join(chars), i + 1
+    start = i
+    while i < len(text) and text[i] not in ",:}] \n":
+        i += 1
+    token = text[start:i]
+    number = token[:-1] if token[-1:] in "bslfdBSLFD" else token
+    try:
+        return (float(number) if "." in number else int(number)), i
+    except ValueError:
+        return token, i
+
+
+def parse_snbt(text: str) -> Any:
+    return _parse_snbt(text, 0)[0]
+
+
+def _item(slot: int, item_id: str) -> dict:
+    return {
+        "Slot": slot,
+        "id": f"minecraft:{item_id}",
+        "count": 1,
+        "components": {
+            "minecraft:enchantments": {
+                "levels": {
+                    "minecraft:sharpness": 5,
+                    "minecraft:unbreaking": 3,
+                    "minecraft:mending": 1,
+                }
+            },
+            "minecraft:custom_name": f'{{"text":"Item {slot}","italic":false}}',
+            "minecraft:lore": [f'{{"text":"Lore line {n}"}}' for n in range(3)],
+            "minecraft:damage": slot * 7,
+        },
+    }
+
+
+def _build_player_nbt_body() -> str:
+    """
+    玩家数据中除 Pos 和 Dimension 以外的部分，所有玩家共用
+    """
+    items = ["diamond_sword", "netherite_pickaxe", "bow", "shield", "elytra"]
+    nbt = {
+        "Health": 20.0,
+        "foodLevel": 20,
+        "XpLevel": 30,
+        "Rotation": [90.0, 0.0],
+        "Motion": [0.0, -0.0784, 0.0],
+        "abilities": {"flying": 0, "mayfly": 0, "walkSpeed": 0.1, "flySpeed": 0.05},
+        "Attributes": [
+            {
+                "id": f"minecraft:attr_{n}",
+                "base": 1.0,
+                "modifiers": [{"id": f"minecraft:mod_{n}", "amount": 0.1}],
+            }
+            for n in range(12)
+        ],
+        "Inventory": [_item(n, items[n % len(items)]) for n in range(36)],
+        "EnderItems": [_item(n, items[n % len(items)]) for n in range(27)],
+        "recipeBook": {
+            "recipes": [f"minecraft:recipe_{n}" for n in range(800)],
+            "toBeDisplayed": [f"minecraft:recipe_{n}" for n in range(40)],
+        },
+    }
+    return to_snbt(nbt)[1:-1]
+
+
+class FakeDataApi:
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        # 玩家名 -> {"Pos": [x, y, z], "Dimension": "minecraft:overworld"}
+        self.players: Dict[str, dict] = {}
+        self.calls = 0
+        self._lock = threading.Lock()
+        self._nbt_body: Optional[str] = None
+
+    def _query(self):
+        with self._lock:
+            self.calls += 1
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+    def set_player(self, player: str, x: float, y: float, z: float, dimension: str):
+        self.players[player] = {"Pos": [x, y, z], "Dimension": dimension}
+
+    def get_player_info(
+        self, player: str, path: str = "", *, timeout: Optional[float] = None
+    ):
+        self._query()
+        info = self.players.get(player)
+        if info is None:
+            return None
+        if path:
+            return parse_snbt(to_snbt(info.get(path)))
+        if self._nbt_body is None:
+            self._nbt_body = _build_player_nbt_body()
+        text = to_snbt(info)[:-1] + ", " + self._nbt_body + "}"
+        return parse_snbt(text)
+
+    def get_player_coordinate(
+        self, player: str, *, timeout: Optional[float] = None
+    ) -> Coordinate:
+        pos = self.get_player_info(player, "Pos")
+        if pos is None:
+            raise ValueError(f"Player {player} not found")
+        return Coordinate(*pos)
+
+    def get_player_dimension(self, player: str, *, timeout: Optional[float] = None):
+        return self.get_player_info(player, "Dimension")
+
+    def get_server_player_list(
+        self, *, timeout: Optional[float] = None
+    ) -> ServerPlayerList:
+        self._query()
+        return ServerPlayerList(
+            len(self.players), len(self.players), list(self.players)
+        )
+
+
+def install(latency: float = 0.0) -> FakeDataApi:
+    api = FakeDataApi(latency)
+    module = types.ModuleType("minecraft_data_api")
+    for name in (
+        "get_player_info",
+        "get_player_coordinate",
+        "get_player_dimension",
+        "get_server_player_list",
+    ):
+        setattr(module, name, getattr(api, name))
+    module.Coordinate = Coordinate
+    module.ServerPlayerList = ServerPlayerList
+    sys.modules["minecraft_data_api"] = module
+    return api
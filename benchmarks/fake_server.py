@@ -0,0 +1,120 @@
+"""
+PluginServerInterface 与玩家命令源的替身，只实现插件用到的接口
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import IO, Any, Dict, List, Optional
+
+import mcdreforged.api.all as mcdr
+from ruamel.yaml import YAML
+
+PLUGIN_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _flatten(data: dict, prefix: str = "") -> Dict[str, str]:
+    result = {}
+    for key, value in data.items():
+        if isinstance(value, dict):
+            result.update(_flatten(value, prefix + key + "."))
+        else:
+            result[prefix + key] = value
+    return result
+
+
+class FakeServer:
+    def __init__(
+        self,
+        data_folder: str,
+        config: Optional[Dict[str, Any]] = None,
+        language: str = "en_us",
+    ):
+        self.data_folder = data_folder
+        self.config = config or {}
+        self.language = language
+        self.logger = logging.getLogger("SimpleTP-Benchmark")
+        with self.open_bundled_file(f"lang/{language}.yml") as f:
+            self._translations = _flatten(YAML().load(f))
+        self.permission_levels: Dict[str, int] = {}
+        self.command_root: Optional[mcdr.Literal] = None
+        self.event_listeners: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self.told = 0
+        self.executed = 0
+        # 每条命令的执行时间（time.perf_counter），用于统计每刻的命令数
+        self.execute_times: List[float] = []
+
+    def tr(self, key: str, *args, _mcdr_tr_language=None, **kwargs) -> str:
+        text = self._translations.get(key, key).strip("\n\r")
+        return text.format(*args, **kwargs)
+
+    def get_mcdr_language(self) -> str:
+        return self.language
+
+    def open_bundled_file(self, relative_file_path: str) -> IO[bytes]:
+        return open(os.path.join(PLUGIN_FOLDER, relative_file_path), "rb")
+
+    def get_data_folder(self) -> str:
+        return self.data_folder
+
+    def load_config_simple(
+        self, file_name: str = "config.json", *, target_class, **kwargs
+    ):
+        return target_class.deserialize(
+            dict(target_class.get_default().serialize(), **self.config)
+        )
+
+    def save_config_simple(self, config, file_name: str = "config.json", **kwargs):
+        pass
+
+    def is_server_startup(self) -> bool:
+        return True
+
+    def get_permission_level(self, obj) -> int:
+        player = obj if isinstance(obj, str) else getattr(obj, "player", None)
+        return self.permission_levels.get(player, 4)
+
+    def tell(self, player: str, text):
+        str(text)
+        with self._lock:
+            self.told += 1
+
+    def execute(self, command: str):
+        with self._lock:
+            self.executed += 1
+            self.execute_times.append(time.perf_counter())
+
+    def register_command(self, root_node: mcdr.Literal):
+        self.command_root = root_node
+
+    def register_event_listener(self, event: str, callback, *args, **kwargs):
+        self.event_listeners[event] = callback
+
+    def register_help_message(self, *args, **kwargs):
+        pass
+
+
+class FakePlayerSource(mcdr.PlayerCommandSource):
+    def __init__(self, server: FakeServer, player: str):
+        # 不调用父类构造函数，避免依赖真实的 MCDR 服务端
+        self._fake_server = server
+        self.player = player
+        self.replies = 0
+
+    def get_server(self):
+        return self._fake_server
+
+    def get_permission_level(self) -> int:
+        return self._fake_server.get_permission_level(self.player)
+
+    def has_permission(self, level: int) -> bool:
+        return self.get_permission_level() >= level
+
+    def reply(self, message, **kwargs):
+        str(message)
+        self.replies += 1
+
+    def __repr__(self):
+        return f"FakePlayerSource[player={self.player}]"
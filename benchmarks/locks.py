@@ -0,0 +1,128 @@
+"""
+个人传送点锁的压力测试：多个线程以不同顺序并发访问大量不同玩家，检查同一玩家总是得到同一把锁、
+锁的数量有上限以及并发写入后数据完整，并统计锁表的内存占用
+用法：python benchmarks/locks.py [--players N] [--threads N] [--seed N]
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import fake_data_api  # noqa: E402
+
+fake_data_api.install()
+
+from readerwriterlock.rwlock import RWLockFair  # noqa: E402
+
+from simple_tp.data import DataManager  # noqa: E402
+from simple_tp.stats import TimedRWLock  # noqa: E402
+from simple_tp.storage import create_storage  # noqa: E402
+from simple_tp.utils import CoordWithDimension  # noqa: E402
+
+
+def run_threads(count: int, target: Callable[[int], None]) -> float:
+    threads = [threading.Thread(target=target, args=(i,)) for i in range(count)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SimpleTP personal lock stress test")
+    parser.add_argument("--players", type=int, default=100000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    players = [f"Player{i}" for i in range(args.players)]
+    orders = []
+    for i in range(args.threads):
+        order = players.copy()
+        random.Random(args.seed + i).shuffle(order)
+        orders.append(order)
+
+    folder = tempfile.mkdtemp(prefix="simple_tp_lock_bench_")
+    try:
+        data_manager = DataManager(create_storage("json", folder))
+
+        # 并发获取锁：各线程得到的锁必须一致
+        seen: List[Dict[str, RWLockFair]] = [{} for _ in range(args.threads)]
+
+        def acquire(index: int):
+            result = seen[index]
+            for player in orders[index]:
+                result[player] = data_manager.get_personal_lock(player)
+
+        tracemalloc.start()
+        acquire_seconds = run_threads(args.threads, acquire)
+        lock_memory, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        # 只保留锁表本身的占用，去掉记录结果用的字典
+        seen_memory = sum(sys.getsizeof(result) for result in seen)
+        consistent = all(
+            result[player] is seen[0][player]
+            for result in seen[1:]
+            for player in players
+        )
+        distinct_locks = len({id(lock) for lock in seen[0].values()})
+        # acquire 闭包仍引用 seen，只清空记录以释放内存
+        for result in seen:
+            result.clear()
+
+        # 对比：每名玩家一把锁时锁表的内存占用
+        tracemalloc.start()
+        per_player_locks = {player: TimedRWLock("personal") for player in players}
+        per_player_memory, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del per_player_locks
+
+        # 并发写入和读取：每个线程为每名玩家写入一个传送点并立即读回
+        errors = [0] * args.threads
+
+        def write(index: int):
+            name = f"t{index}"
+            for player in orders[index]:
+                coord = CoordWithDimension(index, 64, 0, 0)
+                data_manager.put_waypoint(player, name, coord)
+                if data_manager.get_waypoint(player, name) != coord:
+                    errors[index] += 1
+
+        write_seconds = run_threads(args.threads, write)
+        missing = sum(
+            args.threads - len(data_manager.get_personal_waypoints(player))
+            for player in players
+        )
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+    operations = args.players * args.threads
+    print(f"players={args.players} threads={args.threads}")
+    print(
+        f"get_personal_lock: {operations / acquire_seconds:.0f} ops/s, "
+        f"{distinct_locks} distinct locks (limit {DataManager.PERSONAL_LOCK_STRIPES}), "
+        f"consistent across threads: {consistent}"
+    )
+    print(
+        f"lock table memory: {max(0, lock_memory - seen_memory) / 1024:.1f} KiB "
+        f"(one lock per player: {per_player_memory / 1024 / 1024:.1f} MiB)"
+    )
+    print(
+        f"put+get: {operations / write_seconds:.0f} ops/s, "
+        f"read-back errors: {sum(errors)}, missing waypoints: {missing}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+"""
+传送点修改的并发压力测试：多个线程同时对少量玩家执行 put/remove/record_back，
+检查是否有丢失或重复的修改（有则以非零状态退出），并与旧的复制-修改-替换写法对比，
+同时统计每条命令的 tracemalloc 峰值分配
+用法：python benchmarks/mutations.py [--players N] [--threads N] [--ops N] [--waypoints N]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from typing import Callable, Dict, List, NamedTuple, Optional, Set
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import fake_data_api  # noqa: E402
+
+fake_data_api.install()
+
+from simple_tp import constants  # noqa: E402
+from simple_tp.data import DataManager, WaypointListener  # noqa: E402
+from simple_tp.storage import create_storage  # noqa: E402
+from simple_tp.utils import CoordWithDimension  # noqa: E402
+
+
+class Commands(NamedTuple):
+    put: Callable[[DataManager, str, str, CoordWithDimension], None]
+    remove: Callable[[DataManager, str, str], Optional[CoordWithDimension]]
+    record_back: Callable[[DataManager, str, CoordWithDimension], None]
+
+
+def legacy_put(
+    data_manager: DataManager, player: str, name: str, coord: CoordWithDimension
+):
+    waypoints = data_manager.get_personal_waypoints(player)
+    waypoints[name] = coord
+    data_manager.set_personal_waypoints(player, waypoints)
+
+
+def legacy_remove(
+    data_manager: DataManager, player: str, name: str
+) -> Optional[CoordWithDimension]:
+    waypoints = data_manager.get_personal_waypoints(player)
+    previous = waypoints.pop(name, None)
+    if previous is not None:
+        data_manager.set_personal_waypoints(player, waypoints)
+    return previous
+
+
+def legacy_record_back(
+    data_manager: DataManager, player: str, coord: CoordWithDimension
+):
+    legacy_put(data_manager, player, constants.BACK_WAYPOINT_ID, coord)
+
+
+# 修改前：读出整个字典的副本，修改后整体替换
+LEGACY = Commands(legacy_put, legacy_remove, legacy_record_back)
+# 修改后：在写锁内直接修改单个传送点
+ATOMIC = Commands(
+    lambda data_manager, player, name, coord: data_manager.put_waypoint(
+        player, name, coord
+    ),
+    lambda data_manager, player, name: data_manager.remove_waypoint(player, name),
+    lambda data_manager, player, coord: data_manager.record_back(player, coord),
+)
+
+
+class ChangeCounter(WaypointListener):
+    def __init__(self):
+        self.changes = 0
+        self._lock = threading.Lock()
+
+    def on_waypoint_changed(self, player, name, old_coord, new_coord):
+        with self._lock:
+            self.changes += 1
+
+
+class StressResult(NamedTuple):
+    seconds: float
+    lost: int
+    resurrected: int
+    wrong_back: int
+    # 数据代数和监听器收到的变化次数与实际执行的修改次数之差，非零表示修改被重复或遗漏记录
+    generation_diff: int
+    notify_diff: int
+
+
+def coord_of(thread: int, op: int) -> CoordWithDimension:
+    return CoordWithDimension(thread, op, 0, 0)
+
+
+def stress(
+    commands: Commands, players: List[str], threads: int, ops: int
+) -> StressResult:
+    folder = tempfile.mkdtemp(prefix="simple_tp_mutation_bench_")
+    try:
+        data_manager = DataManager(create_storage("json", folder))
+        counter = ChangeCounter()
+        data_manager.add_listener(counter)
+        for player in players:
+            data_manager.preload_personal_waypoints(player)
+        start_generation = data_manager._generation
+
+        # 每个线程使用自己的传送点名，隔一个删除一个，因此最终结果是确定的
+        kept: List[Dict[str, Dict[str, CoordWithDimension]]] = [
+            {player: {} for player in players} for _ in range(threads)
+        ]
+        backs: List[Dict[str, CoordWithDimension]] = [{} for _ in range(threads)]
+        lost_removes = [0] * threads
+        mutations = [0] * threads
+
+        def work(index: int):
+            for op in range(ops):
+                player = players[op % len(players)]
+                name = f"t{index}-{op}"
+                coord = coord_of(index, op)
+                commands.put(data_manager, player, name, coord)
+                mutations[index] += 1
+                if op % 2:
+                    removed = commands.remove(data_manager, player, name)
+                    if removed != coord:
+                        lost_removes[index] += 1
+                    else:
+                        mutations[index] += 1
+                else:
+                    kept[index][player][name] = coord
+                back = coord_of(index, -op - 1)
+                commands.record_back(data_manager, player, back)
+                backs[index][player] = back
+                mutations[index] += 1
+
+        switch_interval = sys.getswitchinterval()
+        # 缩短线程切换间隔，尽量让各线程的读写交错
+        sys.setswitchinterval(1e-6)
+        threads_list = [
+            threading.Thread(target=work, args=(i,)) for i in range(threads)
+        ]
+        start = time.perf_counter()
+        for thread in threads_list:
+            thread.start()
+        for thread in threads_list:
+            thread.join()
+        seconds = time.perf_counter() - start
+        sys.setswitchinterval(switch_interval)
+
+        lost = sum(lost_removes)
+        resurrected = 0
+        wrong_back = 0
+        for player in players:
+            actual = data_manager.get_personal_waypoints(player)
+            expected: Dict[str, CoordWithDimension] = {}
+            for result in kept:
+                expected.update(result[player])
+            lost += sum(
+                1 for name, coord in expected.items() if actual.get(name) != coord
+            )
+            names: Set[str] = set(actual) - {constants.BACK_WAYPOINT_ID}
+            resurrected += len(names - expected.keys())
+            # 返回点应为某个线程最后一次记录的坐标
+            last_backs = [result[player] for result in backs if player in result]
+            if actual.get(constants.BACK_WAYPOINT_ID) not in last_backs:
+                wrong_back += 1
+        total = sum(mutations)
+        return StressResult(
+            seconds,
+            lost,
+            resurrected,
+            wrong_back,
+            data_manager._generation - start_generation - total,
+            counter.changes - total,
+        )
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def command_allocations(commands: Commands, waypoints: int, samples: int):
+    """
+    玩家已有 waypoints 个传送点时，每条命令的平均 tracemalloc 峰值分配（字节）
+    """
+    folder = tempfile.mkdtemp(prefix="simple_tp_mutation_bench_")
+    try:
+        data_manager = DataManager(create_storage("json", folder))
+        player = "Player"
+        for i in range(waypoints):
+            data_manager.put_waypoint(player, f"base{i}", coord_of(0, i))
+
+        def peak(run: Callable[[], object]) -> int:
+            tracemalloc.start()
+            run()
+            _, result = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            return result
+
+        totals = {"put": 0, "remove": 0, "record_back": 0}
+        for i in range(samples):
+            coord = coord_of(1, i)
+            totals["put"] += peak(
+                lambda: commands.put(data_manager, player, "bench", coord)
+            )
+            totals["remove"] += peak(
+                lambda: commands.remove(data_manager, player, "bench")
+            )
+            totals["record_back"] += peak(
+                lambda: commands.record_back(data_manager, player, coord)
+            )
+        return {name: total / samples for name, total in totals.items()}
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="SimpleTP waypoint mutation stress test"
+    )
+    parser.add_argument("--players", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--ops", type=int, default=500)
+    parser.add_argument("--waypoints", type=int, default=200)
+    parser.add_argument("--samples", type=int, default=200)
+    args = parser.parse_args()
+
+    players = [f"Player{i}" for i in range(args.players)]
+    print(f"players={args.players} threads={args.threads} ops/thread={args.ops}")
+    header = (
+        f"{'api':<22}{'ops/s':>10}{'lost':>7}{'resurrected':>13}"
+        f"{'wrong back':>12}{'gen diff':>10}{'notify diff':>13}"
+    )
+    print(header)
+    print("-" * len(header))
+    results = {}
+    for label, commands in (("copy-modify-replace", LEGACY), ("atomic", ATOMIC)):
+        result = stress(commands, players, args.threads, args.ops)
+        results[label] = result
+        operations = args.threads * args.ops * 3
+        print(
+            f"{label:<22}{operations / result.seconds:>10.0f}{result.lost:>7}"
+            f"{result.resurrected:>13}{result.wrong_back:>12}"
+            f"{result.generation_diff:>10}{result.notify_diff:>13}"
+        )
+
+    print()
+    print(f"peak allocation per command with {args.waypoints} waypoints (bytes)")
+    header = f"{'command':<14}{'copy-modify-replace':>21}{'atomic':>10}"
+    print(header)
+    print("-" * len(header))
+    before = command_allocations(LEGACY, args.waypoints, args.samples)
+    after = command_allocations(ATOMIC, args.waypoints, args.samples)
+    for name in before:
+        print(f"{name:<14}{before[name]:>21.0f}{after[name]:>10.0f}")
+
+    atomic = results["atomic"]
+    if (
+        atomic.lost
+        or atomic.resurrected
+        or atomic.wrong_back
+        or atomic.generation_diff
+        or atomic.notify_diff
+    ):
+        print("FAILED: atomic API lost or duplicated updates")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
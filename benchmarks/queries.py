@@ -0,0 +1,186 @@
+"""
+统计各传送命令对服务器发出的查询次数，与预期不符时以非零状态退出
+关闭玩家状态缓存，分别在合并查询、分开查询和直接传送到玩家几种模式下运行，同时给出模拟延迟下的耗时
+用法：python benchmarks/queries.py [--latency-ms MS]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import fake_data_api  # noqa: E402
+from benchmarks.fake_server import FakePlayerSource, FakeServer  # noqa: E402
+
+# simple_tp 导入后会一直使用同一个替身，因此只安装一次，各模式共用
+api = fake_data_api.install()
+
+# 模式名, 配置, 玩家的权限等级
+MODES: List[Tuple[str, Dict[str, Any], int]] = [
+    ("combined", {"combined_position_query": True}, 4),
+    ("separate", {"combined_position_query": False}, 4),
+    # 关闭了玩家状态缓存，目标玩家的维度总要查询，与跨维度权限无关
+    ("direct", {"direct_entity_tp": True, "combined_position_query": True}, 4),
+    (
+        "direct-nocross",
+        {"direct_entity_tp": True, "combined_position_query": True},
+        0,
+    ),
+]
+
+# 命令 -> 各模式下的查询次数
+# 每名相关玩家的位置只查询一次：合并查询为 1 次，分开查询为坐标和维度各 1 次
+# 直接传送时不查询目标玩家的位置，只查询其维度；权限不足时 easy_tp 改为发送 tpa 请求，不查询
+EXPECTED: Dict[str, Tuple[int, int, int, int]] = {
+    "tp": (2, 4, 2, 2),
+    "tphere": (2, 4, 2, 2),
+    "tpa accept": (2, 4, 2, 2),
+    "tpahere accept": (2, 4, 2, 2),
+    "easy_tp player": (2, 4, 2, 0),
+    "tpg": (1, 2, 1, 1),
+    "back": (1, 2, 1, 1),
+    "bulk here (3 players)": (4, 8, 4, 4),
+}
+
+
+class QueryCounter:
+    def __init__(self, config: Dict[str, Any], permission: int, latency: float):
+        self.api = api
+        api.latency = latency
+        self.folder = tempfile.mkdtemp(prefix="simple_tp_query_bench_")
+        self.server = FakeServer(
+            self.folder,
+            config={
+                "save_interval": 3600,
+                "player_state_cache_ttl": 0,
+                "teleports_per_tick": 0,
+                **config,
+            },
+        )
+        import simple_tp
+
+        self.plugin = simple_tp
+        self.players = ["Alice", "Bob", "Carol", "Dave"]
+        for i, player in enumerate(self.players):
+            self.api.set_player(player, i * 10, 64, 0, "minecraft:overworld")
+            self.server.permission_levels[player] = permission
+        simple_tp.on_load(self.server, None)
+        simple_tp.online_player_counter.query_players(rewrite=True)
+        simple_tp.data_manager.put_waypoint(
+            None, "spawn", simple_tp.utils.CoordWithDimension(0, 64, 0, 0)
+        )
+        self.sources = {
+            player: FakePlayerSource(self.server, player) for player in self.players
+        }
+
+    def _run_task(self, handler: Callable, source: FakePlayerSource, *args, **kwargs):
+        done = threading.Event()
+
+        def task():
+            try:
+                handler.__wrapped__(source, *args, **kwargs)
+            finally:
+                done.set()
+
+        self.plugin.command_executor.submit(source.player, handler.__name__, task)
+        done.wait()
+
+    def count(self, setup: Callable[[], None], run: Callable[[], None]):
+        setup()
+        calls = self.api.calls
+        start = time.perf_counter()
+        run()
+        return self.api.calls - calls, time.perf_counter() - start
+
+    def run_all(self) -> Dict[str, Tuple[int, float]]:
+        plugin = self.plugin
+        alice, bob = self.sources["Alice"], self.sources["Bob"]
+
+        def nothing():
+            pass
+
+        def request(reversed_request: bool):
+            def setup():
+                self._run_task(
+                    plugin.tp_request, alice, "Bob", is_reversed=reversed_request
+                )
+
+            return setup
+
+        cases = {
+            "tp": (nothing, lambda: self._run_task(plugin.tp_to_player, alice, "Bob")),
+            "tphere": (nothing, lambda: self._run_task(plugin.tp_here, alice, "Bob")),
+            "tpa accept": (
+                request(False),
+                lambda: self._run_task(plugin.deal_tp_request, bob, "accept"),
+            ),
+            "tpahere accept": (
+                request(True),
+                lambda: self._run_task(plugin.deal_tp_request, bob, "accept"),
+            ),
+            "easy_tp player": (
+                nothing,
+                lambda: self._run_task(plugin.easy_tp, alice, "Carol"),
+            ),
+            "tpg": (
+                nothing,
+                lambda: self._run_task(
+                    plugin.teleport_to_waypoint, alice, "spawn", is_global=True
+                ),
+            ),
+            "back": (
+                nothing,
+                lambda: self._run_task(plugin.back_to_recorded_position, alice),
+            ),
+            "bulk here (3 players)": (
+                nothing,
+                lambda: self._run_task(plugin.bulk_tp, alice, "all", "here"),
+            ),
+        }
+        return {name: self.count(*case) for name, case in cases.items()}
+
+    def close(self):
+        self.plugin.on_unload(self.server)
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SimpleTP query count check")
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    args = parser.parse_args()
+
+    failures: List[str] = []
+    print(f"latency={args.latency_ms}ms")
+    header = f"{'command':<24}{'mode':<16}{'queries':>9}{'expected':>10}{'ms':>9}"
+    print(header)
+    print("-" * len(header))
+    for mode_index, (mode, config, permission) in enumerate(MODES):
+        counter = QueryCounter(config, permission, args.latency_ms / 1000)
+        try:
+            results = counter.run_all()
+        finally:
+            counter.close()
+        for name, (queries, seconds) in results.items():
+            expected = EXPECTED[name][mode_index]
+            print(
+                f"{name:<24}{mode:<16}{queries:>9}{expected:>10}{seconds * 1000:>9.1f}"
+            )
+            if queries != expected:
+                failures.append(
+                    f"{name} ({mode}): {queries} queries, expected {expected}"
+                )
+
+    if failures:
+        print("FAILED:\n  " + "\n  ".join(failures))
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,475 @@
+"""
+离线性能测试：使用替身服务端和 minecraft_data_api 直接调用插件的命令处理函数
+用法：python benchmarks/run.py [--players N] [--global-waypoints N] [--latency-ms MS] [场景 ...]
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import fake_data_api  # noqa: E402
+from benchmarks.fake_server import FakePlayerSource, FakeServer  # noqa: E402
+
+DIMENSIONS = ["minecraft:overworld", "minecraft:the_nether", "minecraft:the_end"]
+
+
+class Result(NamedTuple):
+    name: str
+    ops: int
+    seconds: float
+    latencies: List[float]
+    peak_memory: int
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _peak_memory(ops: int, run: Callable[[int], None]) -> int:
+    # tracemalloc 会显著拖慢执行，因此与计时分开再运行一遍
+    tracemalloc.start()
+    for i in range(ops):
+        run(i)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def measure(name: str, ops: int, op: Callable[[int], None]) -> Result:
+    latencies = []
+    start = time.perf_counter()
+    for i in range(ops):
+        op_start = time.perf_counter()
+        op(i)
+        latencies.append(time.perf_counter() - op_start)
+    seconds = time.perf_counter() - start
+    return Result(name, ops, seconds, latencies, _peak_memory(ops, op))
+
+
+def measure_concurrent(name: str, ops: int, submit: Callable[[int], bool]) -> Result:
+    """
+    通过插件的线程池提交任务，统计全部执行完毕的吞吐量（不统计单次延迟）
+    """
+    import simple_tp
+
+    def submit_all(_):
+        for i in range(ops):
+            while not submit(i):
+                time.sleep(0.001)
+        while simple_tp.command_executor.pending:
+            time.sleep(0.001)
+
+    start = time.perf_counter()
+    submit_all(0)
+    seconds = time.perf_counter() - start
+    return Result(name, ops, seconds, [], _peak_memory(1, submit_all))
+
+
+class Benchmark:
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.api = fake_data_api.install(args.latency_ms / 1000)
+        self.folder = tempfile.mkdtemp(prefix="simple_tp_bench_")
+        self.server = FakeServer(
+            self.folder,
+            config={
+                "storage": args.storage,
+                "save_interval": 3600,
+                "worker_threads": args.workers,
+                "max_pending_tasks": 256,
+                "teleports_per_tick": args.teleports_per_tick,
+            },
+        )
+        self.rng = random.Random(args.seed)
+
+        import simple_tp
+
+        self.plugin = simple_tp
+        self.players = [f"Player{i}" for i in range(args.players)]
+        for player in self.players:
+            self.api.set_player(
+                player,
+                self.rng.uniform(-2000, 2000),
+                self.rng.uniform(0, 128),
+                self.rng.uniform(-2000, 2000),
+                DIMENSIONS[0],
+            )
+        simple_tp.on_load(self.server, None)
+        simple_tp.online_player_counter.query_players(rewrite=True)
+
+        data_manager = simple_tp.data_manager
+        self.global_names = [f"home{i}" for i in range(args.global_waypoints)]
+        for name in self.global_names:
+            data_manager.put_waypoint(None, name, self._random_coord())
+        self.personal_names = [f"base{i}" for i in range(args.personal_waypoints)]
+        for player in self.players:
+            for name in self.personal_names:
+                data_manager.put_waypoint(player, name, self._random_coord())
+        simple_tp.save_data_task()
+        self.sources = {
+            player: FakePlayerSource(self.server, player) for player in self.players
+        }
+
+    def _random_coord(self):
+        return self.plugin.utils.CoordWithDimension(
+            self.rng.uniform(-5000, 5000),
+            self.rng.uniform(0, 128),
+            self.rng.uniform(-5000, 5000),
+            0,
+        )
+
+    def _source(self, i: int) -> FakePlayerSource:
+        return self.sources[self.players[i % len(self.players)]]
+
+    def _run_task(self, handler: Callable, source: FakePlayerSource, *args, **kwargs):
+        """
+        在插件线程池中以该玩家为 key 执行命令处理函数并等待其完成
+        处理函数内部再提交的同一玩家的任务会直接执行，与实际运行时一致
+        """
+        done = threading.Event()
+
+        def task():
+            try:
+                handler.__wrapped__(source, *args, **kwargs)
+            finally:
+                done.set()
+
+        while not self.plugin.command_executor.submit(
+            source.player, handler.__name__, task
+        ):
+            time.sleep(0.001)
+        done.wait()
+
+    def close(self):
+        self.plugin.on_unload(self.server)
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def bench_suggest(self) -> Result:
+        root = self.server.command_root
+        prefix = self.plugin.plugin_config.command_prefix
+        commands = [
+            f"{prefix} tpg home1",
+            f"{prefix} tpp ba",
+            f"{prefix} tp Player1",
+            f"{prefix} h",
+        ]
+
+        def op(i: int):
+            # noinspection PyProtectedMember
+            root._entry_generate_suggestions(
+                self._source(i), commands[i % len(commands)]
+            )
+
+        return measure("suggest", self.args.iterations, op)
+
+    def bench_list(self) -> Result:
+        pages = max(1, len(self.global_names) // 10)
+
+        def op(i: int):
+            self.plugin.get_waypoints_messages(
+                self._source(i), scope="all", page=i % pages + 1
+            )
+
+        return measure("list", self.args.iterations, op)
+
+    def bench_set_waypoint(self) -> Result:
+        def op(i: int):
+            self._run_task(
+                self.plugin.set_waypoint,
+                self._source(i),
+                f"bench{i % 100}",
+                is_global=False,
+                overwrite=True,
+            )
+
+        return measure("set_waypoint", self.args.iterations, op)
+
+    def bench_easy_tp(self) -> Result:
+        names = self.personal_names[:5] + self.global_names[:5] + self.players[:5]
+
+        def op(i: int):
+            self._run_task(self.plugin.easy_tp, self._source(i), names[i % len(names)])
+
+        return measure("easy_tp", self.args.iterations, op)
+
+    def bench_tp_request(self) -> Result:
+        def op(i: int):
+            sender = self._source(i)
+            receiver = self._source(i + 1)
+            self._run_task(self.plugin.tp_request, sender, receiver.player)
+            self._run_task(self.plugin.deal_tp_request, receiver, action="accept")
+
+        return measure("tpa+accept", self.args.iterations, op)
+
+    def bench_render_tp_request(self) -> Result:
+        # 只统计 tpa 请求消息的生成（一次回复和一次通知），不经过线程池
+        tp_request = self.plugin.tp_request.__wrapped__
+        request_manager = self.plugin.teleport_request_manager
+
+        def op(i: int):
+            sender = self._source(i)
+            tp_request(sender, self._source(i + 1).player)
+            request_manager.remove_player_requests(sender.player)
+
+        return measure("render tp_request", self.args.iterations, op)
+
+    def bench_render_list(self) -> Result:
+        # 每次都丢弃列表缓存，统计完整渲染一页传送点列表的速度
+        pages = max(1, len(self.global_names) // 10)
+        list_cache = self.plugin.list_cache
+
+        def op(i: int):
+            source = self._source(i)
+            list_cache.discard_player(None)
+            list_cache.discard_player(source.player)
+            self.plugin.get_waypoints_messages(source, scope="all", page=i % pages + 1)
+
+        return measure("render list", max(1, self.args.iterations // 10), op)
+
+    def bench_near(self) -> Result:
+        def op(i: int):
+            self._run_task(self.plugin.near_waypoints, self._source(i))
+
+        return measure("near", self.args.iterations, op)
+
+    def _bench_position_query(self, combined: bool) -> Result:
+        # 每次查询前清空玩家状态缓存，使每次都实际向服务端查询，耗时主要取决于 --latency-ms
+        plugin = self.plugin
+        previous = plugin.plugin_config.combined_position_query
+        plugin.plugin_config.combined_position_query = combined
+
+        def op(i: int):
+            plugin.player_state_cache.clear()
+            plugin.utils.get_player_position(self.players[i % len(self.players)])
+
+        try:
+            return measure(
+                f"position ({'combined' if combined else 'separate'})",
+                max(1, self.args.iterations // 10),
+                op,
+            )
+        finally:
+            plugin.plugin_config.combined_position_query = previous
+
+    def bench_position_combined(self) -> Result:
+        return self._bench_position_query(combined=True)
+
+    def bench_position_separate(self) -> Result:
+        return self._bench_position_query(combined=False)
+
+    def bench_save(self) -> Result:
+        data_manager = self.plugin.data_manager
+
+        def op(i: int):
+            for j in range(10):
+                player = self.players[(i + j) % len(self.players)]
+                data_manager.put_waypoint(player, "bench", self._random_coord())
+            data_manager.put_waypoint(None, "bench", self._random_coord())
+            self.plugin.save_data_task()
+
+        return measure("save_data_task", max(1, self.args.iterations // 10), op)
+
+    def bench_save_idle(self) -> Result:
+        # 没有任何修改时应直接跳过保存
+        self.plugin.save_data_task()
+        return measure(
+            "save (idle)", self.args.iterations, lambda i: self.plugin.save_data_task()
+        )
+
+    def bench_save_dirty(self) -> Result:
+        # 每次只修改一名玩家的一个传送点，保存耗时不应随玩家数增长
+        data_manager = self.plugin.data_manager
+
+        def op(i: int):
+            player = self.players[i % len(self.players)]
+            data_manager.put_waypoint(player, "bench", self._random_coord())
+            self.plugin.save_data_task()
+
+        return measure("save (1 dirty)", max(1, self.args.iterations // 10), op)
+
+    def bench_concurrent_easy_tp(self) -> Result:
+        names = self.personal_names[:5] + self.global_names[:5] + self.players[:5]
+        executor = self.plugin.command_executor
+
+        def submit(i: int) -> bool:
+            source = self._source(i)
+            return executor.submit(
+                source.player,
+                "easy_tp",
+                self.plugin.easy_tp.__wrapped__,
+                source,
+                names[i % len(names)],
+            )
+
+        return measure_concurrent("concurrent easy_tp", self.args.iterations, submit)
+
+    def bench_mass_tp(self) -> Result:
+        """
+        所有玩家同时传送到同一个全局传送点，统计全部传送命令发出的耗时和每个游戏刻最多发出的命令数
+        延迟为每名玩家从提交到其传送命令发出的时间
+        """
+        executor = self.plugin.command_executor
+        teleport_queue = self.plugin.teleport_queue
+        target = self.global_names[0]
+        execute_times = self.server.execute_times
+        start = time.perf_counter()
+        first = len(execute_times)
+        for player in self.players:
+            while not executor.submit(
+                player,
+                "easy_tp",
+                self.plugin.easy_tp.__wrapped__,
+                self.sources[player],
+                target,
+            ):
+                time.sleep(0.001)
+        while executor.pending or teleport_queue.get_stats()["depth"]:
+            time.sleep(0.001)
+        seconds = time.perf_counter() - start
+        times = execute_times[first:]
+        latencies = [t - start for t in times]
+        ticks: Dict[int, int] = {}
+        for t in times:
+            tick = int(t / 0.05)
+            ticks[tick] = ticks.get(tick, 0) + 1
+        return Result(
+            f"mass tp ({max(ticks.values(), default=0)}/tick)",
+            len(times),
+            seconds,
+            latencies,
+            0,
+        )
+
+    def bench_tphere_each(self) -> Result:
+        # 对比用：管理员逐个使用 tphere 将所有玩家传送过来
+        admin = self.sources[self.players[0]]
+        others = self.players[1:]
+        player_state_cache = self.plugin.player_state_cache
+
+        def op(i: int):
+            player_state_cache.clear()
+            for player in others:
+                self._run_task(self.plugin.tp_here, admin, player)
+
+        return measure("tphere x players", max(1, self.args.iterations // 100), op)
+
+    def bench_bulk_tp(self) -> Result:
+        admin = self.sources[self.players[0]]
+        player_state_cache = self.plugin.player_state_cache
+
+        def op(i: int):
+            player_state_cache.clear()
+            self._run_task(self.plugin.bulk_tp, admin, "all", "here")
+
+        return measure("bulk here", max(1, self.args.iterations // 100), op)
+
+    def _reload(self, handoff: bool):
+        self.plugin.on_unload(self.server)
+        self.plugin.on_load(self.server, self.plugin if handoff else None)
+        if not handoff:
+            self.plugin.online_player_counter.query_players(rewrite=True)
+
+    def bench_reload_full(self) -> Result:
+        return measure(
+            "reload (full)",
+            max(1, self.args.iterations // 100),
+            lambda i: self._reload(handoff=False),
+        )
+
+    def bench_reload_handoff(self) -> Result:
+        # 旧模块和新模块为同一对象，交接流程与实际热重载相同
+        return measure(
+            "reload (handoff)",
+            max(1, self.args.iterations // 100),
+            lambda i: self._reload(handoff=True),
+        )
+
+    SCENARIOS: Dict[str, str] = {
+        "suggest": "bench_suggest",
+        "list": "bench_list",
+        "set_waypoint": "bench_set_waypoint",
+        "easy_tp": "bench_easy_tp",
+        "tp_request": "bench_tp_request",
+        "render_tp_request": "bench_render_tp_request",
+        "render_list": "bench_render_list",
+        "near": "bench_near",
+        "position_combined": "bench_position_combined",
+        "position_separate": "bench_position_separate",
+        "save": "bench_save",
+        "save_idle": "bench_save_idle",
+        "save_dirty": "bench_save_dirty",
+        "concurrent": "bench_concurrent_easy_tp",
+        "mass_tp": "bench_mass_tp",
+        "tphere_each": "bench_tphere_each",
+        "bulk_tp": "bench_bulk_tp",
+        "reload_full": "bench_reload_full",
+        "reload_handoff": "bench_reload_handoff",
+    }
+
+    def run(self, scenarios: List[str]) -> List[Result]:
+        results = []
+        for scenario in scenarios:
+            results.append(getattr(self, self.SCENARIOS[scenario])())
+        return results
+
+
+def format_ms(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value * 1000:.3f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SimpleTP offline benchmarks")
+    parser.add_argument(
+        "scenarios",
+        nargs="*",
+        help=f"scenarios to run, all by default: {', '.join(Benchmark.SCENARIOS)}",
+    )
+    parser.add_argument("--players", type=int, default=50)
+    parser.add_argument("--global-waypoints", type=int, default=2000)
+    parser.add_argument("--personal-waypoints", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=1.0)
+    parser.add_argument("--iterations", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--storage", default="json")
+    parser.add_argument("--teleports-per-tick", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    for scenario in args.scenarios:
+        if scenario not in Benchmark.SCENARIOS:
+            parser.error(f"unknown scenario: {scenario}")
+
+    benchmark = Benchmark(args)
+    try:
+        results = benchmark.run(args.scenarios or list(Benchmark.SCENARIOS))
+    finally:
+        benchmark.close()
+
+    print(
+        f"players={args.players} global_waypoints={args.global_waypoints} "
+        f"personal_waypoints={args.personal_waypoints} latency={args.latency_ms}ms "
+        f"storage={args.storage}"
+    )
+    header = f"{'scenario':<20}{'ops':>8}{'ops/s':>12}{'p50 ms':>10}{'p99 ms':>10}{'peak KiB':>11}"
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        print(
+            f"{result.name:<20}{result.ops:>8}{result.ops / result.seconds:>12.1f}"
+            f"{format_ms(result.percentile(0.5)):>10}{format_ms(result.percentile(0.99)):>10}"
+            f"{result.peak_memory / 1024:>11.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+空间索引与线性扫描的对比：在大量传送点（默认 10 万个全局传送点）中查询最近的 k 个和半径内的传送点，
+检查两者的结果完全一致（不一致时以非零状态退出），并输出各自的延迟
+用法：python benchmarks/spatial.py [--waypoints N] [--personal N] [--queries N] [--k N] [--radius R]
+"""
+
+import argparse
+import math
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from typing import Callable, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import fake_data_api  # noqa: E402
+
+fake_data_api.install()
+
+from simple_tp.data import DataManager  # noqa: E402
+from simple_tp.spatial import NearbyWaypoint, SpatialIndex  # noqa: E402
+from simple_tp.storage import create_storage  # noqa: E402
+from simple_tp.utils import CoordWithDimension  # noqa: E402
+
+PLAYER = "Player"
+DIMENSIONS = 3
+
+
+def scan(
+    data_manager: DataManager,
+    coord: CoordWithDimension,
+    keep: Callable[[float], bool],
+) -> List[NearbyWaypoint]:
+    """
+    线性扫描全局传送点和 PLAYER 的个人传送点，按距离排序
+    """
+    result = []
+    for owner in (None, PLAYER):
+
+        def run(waypoints) -> List[Tuple[float, str, CoordWithDimension]]:
+            found = []
+            for name, waypoint in waypoints.items():
+                if waypoint.dimension != coord.dimension:
+                    continue
+                distance = math.sqrt(
+                    (waypoint.x - coord.x) ** 2
+                    + (waypoint.y - coord.y) ** 2
+                    + (waypoint.z - coord.z) ** 2
+                )
+                if keep(distance):
+                    found.append((distance, name, waypoint))
+            return found
+
+        for distance, name, waypoint in data_manager.view_waypoints(owner, run):
+            result.append(NearbyWaypoint(distance, owner, name, waypoint))
+    result.sort(key=lambda item: item.distance)
+    return result
+
+
+def percentile(latencies: List[float], q: float) -> float:
+    ordered = sorted(latencies)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def timed(run: Callable[[], List[NearbyWaypoint]], latencies: List[float]):
+    start = time.perf_counter()
+    result = run()
+    latencies.append(time.perf_counter() - start)
+    return result
+
+
+def keys(result: List[NearbyWaypoint]) -> List[Tuple[Optional[str], str]]:
+    return [(item.owner, item.name) for item in result]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SimpleTP spatial index benchmark")
+    parser.add_argument("--waypoints", type=int, default=100000)
+    parser.add_argument("--personal", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--radius", type=float, default=500.0)
+    parser.add_argument("--extent", type=float, default=30000.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+
+    def random_coord() -> CoordWithDimension:
+        return CoordWithDimension(
+            rng.uniform(-args.extent, args.extent),
+            rng.uniform(0, 256),
+            rng.uniform(-args.extent, args.extent),
+            rng.randrange(DIMENSIONS),
+        )
+
+    folder = tempfile.mkdtemp(prefix="simple_tp_spatial_bench_")
+    try:
+        data_manager = DataManager(create_storage("json", folder))
+        for i in range(args.waypoints):
+            data_manager.put_waypoint(None, f"home{i}", random_coord())
+        for i in range(args.personal):
+            data_manager.put_waypoint(PLAYER, f"base{i}", random_coord())
+        start = time.perf_counter()
+        index = SpatialIndex(data_manager)
+        build_seconds = time.perf_counter() - start
+
+        latencies = {
+            name: []
+            for name in ("grid near", "scan near", "grid within", "scan within")
+        }
+        mismatches = 0
+        for _ in range(args.queries):
+            coord = random_coord()
+            grid_near = timed(
+                lambda: index.nearest(PLAYER, coord, args.k), latencies["grid near"]
+            )
+            scan_near = timed(
+                lambda: scan(data_manager, coord, lambda distance: True)[: args.k],
+                latencies["scan near"],
+            )
+            grid_within = timed(
+                lambda: index.within(PLAYER, coord, args.radius),
+                latencies["grid within"],
+            )
+            scan_within = timed(
+                lambda: scan(
+                    data_manager, coord, lambda distance: distance <= args.radius
+                ),
+                latencies["scan within"],
+            )
+            if keys(grid_near) != keys(scan_near):
+                mismatches += 1
+                print(f"MISMATCH nearest at {coord}")
+            if keys(grid_within) != keys(scan_within):
+                mismatches += 1
+                print(f"MISMATCH within at {coord}")
+        index.close()
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+    print(
+        f"waypoints={args.waypoints} personal={args.personal} "
+        f"dimensions={DIMENSIONS} k={args.k} radius={args.radius}"
+    )
+    print(f"index build: {build_seconds * 1000:.1f} ms")
+    header = f"{'query':<14}{'p50 ms':>10}{'p99 ms':>10}"
+    print(header)
+    print("-" * len(header))
+    for name, values in latencies.items():
+        print(
+            f"{name:<14}{percentile(values, 0.5) * 1000:>10.3f}"
+            f"{percentile(values, 0.99) * 1000:>10.3f}"
+        )
+
+    if mismatches:
+        print(f"FAILED: {mismatches} queries differ from the linear scan")
+        sys.exit(1)
+    print(f"OK: {args.queries * 2} queries identical to the linear scan")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""
+存储格式性能测试：生成指定数量的传送点，比较各存储格式的加载、保存、查询耗时和文件大小，
+并检查二进制格式、SQLite 与 JSON 的往返转换是否无损
+用法：python benchmarks/storage.py [--waypoints N] [--players N] [--lookups N] [--seed N]
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, List, NamedTuple, Tuple, TypeVar
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import fake_data_api  # noqa: E402
+
+fake_data_api.install()
+
+from simple_tp.data import DataChanges, DataManager  # noqa: E402
+from simple_tp.spatial import SpatialIndex  # noqa: E402
+from simple_tp.storage import (  # noqa: E402
+    BinaryStorage,
+    SqliteStorage,
+    _dump_json,
+    create_storage,
+)
+from simple_tp.utils import CoordWithDimension  # noqa: E402
+
+DIMENSIONS = ["minecraft:overworld", "minecraft:the_nether", "minecraft:the_end"]
+
+T = TypeVar("T")
+
+
+class Result(NamedTuple):
+    storage: str
+    convert: float
+    load: float
+    full_save: float
+    incremental_save: float
+    lookup: float
+    size: int
+    load_peak: int
+    retained: int
+
+
+def timed(func: Callable[[], T]) -> Tuple[T, float]:
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def generate(args: argparse.Namespace) -> dict:
+    rng = random.Random(args.seed)
+
+    def waypoints(prefix: str, count: int) -> dict:
+        return {
+            f"{prefix}{i}": [
+                rng.uniform(-10000, 10000),
+                rng.uniform(-64, 320),
+                rng.uniform(-10000, 10000),
+                rng.randrange(len(DIMENSIONS)),
+            ]
+            for i in range(count)
+        }
+
+    global_count = args.waypoints // 10
+    per_player = (args.waypoints - global_count) // args.players
+    return {
+        "personal_waypoints": {
+            f"Player{i}": waypoints("base", per_player) for i in range(args.players)
+        },
+        "global_waypoints": waypoints("home", global_count),
+        "dimension_str2sid": {dim: sid for sid, dim in enumerate(DIMENSIONS)},
+    }
+
+
+def data_size(storage: str, folder: str) -> int:
+    path = os.path.join(
+        folder,
+        {"json": "data.json", "binary": "data.bin", "sqlite": "data.db"}[storage],
+    )
+    # SQLite 在检查点之前，最近的修改保存在 -wal 文件中
+    return sum(
+        os.path.getsize(file) for file in (path, path + "-wal") if os.path.isfile(file)
+    )
+
+
+def measure_memory(storage: str, folder: str) -> Tuple[int, int]:
+    """
+    返回加载时的内存峰值，以及加载完成并建立空间索引后仍占用的内存
+    tracemalloc 会显著拖慢执行，因此与计时分开运行
+    """
+    tracemalloc.start()
+    data_manager = DataManager(create_storage(storage, folder))
+    _, peak = tracemalloc.get_traced_memory()
+    spatial_index = SpatialIndex(data_manager)
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    spatial_index.close()
+    data_manager.storage.close()
+    return peak, retained
+
+
+def run_storage(
+    storage: str, folder: str, convert: float, players: List[str], lookups: List[str]
+) -> Result:
+    load_peak, retained = measure_memory(storage, folder)
+    data_manager, load = timed(lambda: DataManager(create_storage(storage, folder)))
+    # 启动后第一次访问玩家的个人传送点，按需加载的存储格式此时才读取
+    _, lookup = timed(
+        lambda: [data_manager.get_personal_waypoints(player) for player in lookups]
+    )
+    changes = DataChanges(
+        1,
+        dict(data_manager.dimension_str2sid),
+        data_manager.get_global_waypoints(),
+        {player: data_manager.get_personal_waypoints(player) for player in players},
+    )
+    # 新建的存储后端没有缓存的片段，第一次保存会编码全部数据
+    _, full_save = timed(lambda: data_manager.storage.save(changes, data_manager))
+    data_manager.put_waypoint(players[0], "bench", CoordWithDimension(0, 64, 0, 0))
+    changes = data_manager.collect_changes()
+    _, incremental_save = timed(
+        lambda: data_manager.storage.save(changes, data_manager)
+    )
+    # 关闭后 SQLite 会把 -wal 文件中的修改写回数据库
+    data_manager.storage.close()
+    size = data_size(storage, folder)
+    return Result(
+        storage,
+        convert,
+        load,
+        full_save,
+        incremental_save,
+        lookup / len(lookups),
+        size,
+        load_peak,
+        retained,
+    )
+
+
+def exported_equals(json_path: str, raw: dict) -> bool:
+    with open(json_path, "r", encoding="utf8") as f:
+        exported = json.load(f)
+    for player in exported["personal_waypoints"]:
+        exported["personal_waypoints"][player].pop("bench", None)
+    return exported == raw
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SimpleTP storage benchmarks")
+    parser.add_argument("--waypoints", type=int, default=1000000)
+    parser.add_argument("--players", type=int, default=1000)
+    parser.add_argument("--lookups", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    folder = tempfile.mkdtemp(prefix="simple_tp_storage_bench_")
+    results: List[Result] = []
+    try:
+        raw = generate(args)
+        players = list(raw["personal_waypoints"])
+        lookups = random.Random(args.seed).sample(
+            players, min(args.lookups, len(players))
+        )
+        json_path = os.path.join(folder, "data.json")
+        with open(json_path, "w", encoding="utf8") as f:
+            f.write(_dump_json(raw))
+        results.append(run_storage("json", folder, 0.0, players, lookups))
+
+        # 往返转换：转换为各格式再导出为 data.json 后应与原始数据完全一致
+        lossless = {}
+        bin_path = os.path.join(folder, "data.bin")
+        _, convert = timed(lambda: BinaryStorage.migrate_from_json(json_path, bin_path))
+        results.append(run_storage("binary", folder, convert, players, lookups))
+        BinaryStorage.export_json(bin_path, json_path)
+        lossless["binary"] = exported_equals(json_path, raw)
+
+        db_path = os.path.join(folder, "data.db")
+        _, convert = timed(lambda: SqliteStorage.migrate_from_json(json_path, db_path))
+        results.append(run_storage("sqlite", folder, convert, players, lookups))
+        SqliteStorage.export_json(db_path, json_path)
+        lossless["sqlite"] = exported_equals(json_path, raw)
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+    print(f"waypoints={args.waypoints} players={args.players}")
+    header = (
+        f"{'storage':<10}{'convert s':>11}{'load s':>10}{'full save s':>13}"
+        f"{'incr save s':>13}{'lookup ms':>11}{'size MiB':>11}{'load peak MiB':>15}"
+        f"{'retained MiB':>14}"
+    )
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        print(
+            f"{result.storage:<10}{result.convert:>11.3f}{result.load:>10.3f}"
+            f"{result.full_save:>13.3f}{result.incremental_save:>13.3f}"
+            f"{result.lookup * 1000:>11.3f}{result.size / 1024 / 1024:>11.1f}{result.load_peak / 1024 / 1024:>15.1f}"
+            f"{result.retained / 1024 / 1024:>14.1f}"
+        )
+    for storage, equal in lossless.items():
+        print(f"{storage} <-> json round trip lossless: {equal}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,8 @@
 import json
-from typing import List, Literal, Optional, Dict
-from dataclasses import dataclass
-import threading
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Literal, Optional, Tuple, Union
 import time
 
 import mcdreforged.api.all as mcdr
@@ -9,62 +10,26 @@ import mcdreforged.api.all as mcdr
 import simple_tp.constants as constants
 import simple_tp.utils as utils
 
-from simple_tp.data import SimpleTPData, DataManager
+from simple_tp.completion import CompletionIndex
+from simple_tp.data import DataManager
+from simple_tp.executor import CommandExecutor, player_task
+from simple_tp.journal import WaypointJournal
+from simple_tp.list_cache import RenderedLine, WaypointListCache
 from simple_tp.config import Config
 from simple_tp.online_player import OnlinePlayerCounter
-
-
-@dataclass(frozen=True)
-class TeleportRequest:
-    player: str
-    target_player: str
-    timestamp: float
-    is_reversed: bool  # 是否是反向传送请求
-
-
-class TeleportRequestManager:
-    def __init__(self):
-        self._request_sender_dict: Dict[str, TeleportRequest] = {}
-        self._request_receiver_dict: Dict[str, Dict[str, TeleportRequest]] = {}
-        self._lock = threading.RLock()
-
-    def set_request(
-        self,
-        tp_request: TeleportRequest,
-        fail_if_exists: bool = True,
-    ) -> Optional[TeleportRequest]:
-        player = tp_request.player
-        target_player = tp_request.target_player
-        with self._lock:
-            previous_request = self._request_sender_dict.get(player)
-            if previous_request:
-                if fail_if_exists:
-                    return previous_request
-                else:
-                    self.remove_request(previous_request)
-            self._request_receiver_dict.setdefault(target_player, {})[player] = (
-                tp_request
-            )
-            self._request_sender_dict[player] = tp_request
-            return previous_request
-
-    def remove_request(self, tp_request: TeleportRequest):
-        with self._lock:
-            if tp_request.player in self._request_sender_dict:
-                del self._request_sender_dict[tp_request.player]
-            if tp_request.target_player not in self._request_receiver_dict:
-                return
-            receiver_requests = self._request_receiver_dict[tp_request.target_player]
-            if tp_request.player in receiver_requests:
-                del receiver_requests[tp_request.player]
-
-    def get_sender_request(self, player: str) -> Optional[TeleportRequest]:
-        with self._lock:
-            return self._request_sender_dict.get(player)
-
-    def get_receiver_requests(self, player: str) -> Dict[str, TeleportRequest]:
-        with self._lock:
-            return self._request_receiver_dict.get(player, {})
+from simple_tp.planner import TeleportPlan, plan_teleport
+from simple_tp.player_cache import PlayerStateCache
+from simple_tp.spatial import SpatialIndex
+from simple_tp.stats import StatsCollector, format_stats
+from simple_tp.templates import MessageTemplates
+from simple_tp.storage import (
+    STORAGE_TYPES,
+    can_migrate,
+    create_storage,
+    storage_exists,
+)
+from simple_tp.teleport_queue import TeleportQueue
+from simple_tp.teleport_request import TeleportRequest, TeleportRequestManager
 
 
 data_manager: DataManager
@@ -72,8 +37,17 @@ plugin_server: mcdr.PluginServerInterface
 plugin_config: Config
 save_loop: utils.LoopManager
 teleport_request_manager: TeleportRequestManager
-prev_data_str: str
 online_player_counter: OnlinePlayerCounter
+player_state_cache: PlayerStateCache
+command_executor: CommandExecutor
+completion_index: CompletionIndex
+list_cache: WaypointListCache
+spatial_index: SpatialIndex
+stats_collector: StatsCollector
+message_templates: MessageTemplates
+stats_dump_loop: Optional[utils.LoopManager] = None
+teleport_queue: TeleportQueue
+query_pool: ThreadPoolExecutor
 
 
 def on_load(server: mcdr.PluginServerInterface, prev_module: any):
@@ -83,67 +57,188 @@ def on_load(server: mcdr.PluginServerInterface, prev_module: any):
         plugin_server, \
         save_loop, \
         teleport_request_manager, \
-        prev_data_str, \
-        online_player_counter
+        online_player_counter, \
+        player_state_cache, \
+        command_executor, \
+        completion_index, \
+        list_cache, \
+        spatial_index, \
+        stats_collector, \
+        stats_dump_loop, \
+        message_templates, \
+        teleport_queue, \
+        query_pool
 
     plugin_server = server
+    # 需在替换全局变量之前取出，prev_module 可能就是当前模块
+    handoff = _take_handoff_state(prev_module)
     plugin_config = plugin_server.load_config_simple("config.json", target_class=Config)
-    simple_tp_data = plugin_server.load_config_simple(
-        "data.json", target_class=SimpleTPData
+    if handoff is not None and handoff["storage"] != plugin_config.storage:
+        plugin_server.logger.info(
+            "Storage type changed, reloading SimpleTP data from storage."
+        )
+        handoff = None
+    stats_collector = StatsCollector(plugin_config.stats)
+    message_templates = MessageTemplates(plugin_server, plugin_config.command_prefix)
+    player_state_cache = PlayerStateCache(plugin_config.player_state_cache_ttl)
+    teleport_queue = TeleportQueue(
+        plugin_config.teleports_per_tick,
+        plugin_server.execute,
+        on_executed=player_state_cache.invalidate,
+    )
+    command_executor = CommandExecutor(
+        plugin_config.worker_threads, plugin_config.max_pending_tasks
+    )
+    query_pool = ThreadPoolExecutor(
+        constants.BATCH_QUERY_CONCURRENCY, thread_name_prefix="SimpleTPQuery"
     )
-    # 转换旧版配置
-    need_update = False
-    for dim in plugin_config.worlds:
-        if dim not in simple_tp_data.dimension_str2sid:
-            simple_tp_data.dimension_str2sid[dim] = (
-                max(simple_tp_data.dimension_str2sid.values(), default=-1) + 1
-            )
-            need_update = True
-    if need_update:
-        plugin_server.save_config_simple(simple_tp_data, "data.json")
-
     online_player_counter = OnlinePlayerCounter()
-    if plugin_server.is_server_startup():
+    if handoff is not None and handoff["online_players"] is not None:
+        online_player_counter.restore(handoff["online_players"])
+    elif plugin_server.is_server_startup():
         online_player_counter.on_server_startup()
 
-    data_manager = DataManager(simple_tp_data)
-    prev_data_str = json.dumps(
-        data_manager.get_simple_tp_data().serialize(), sort_keys=True
+    data_manager = DataManager(
+        create_storage(
+            plugin_config.storage,
+            plugin_server.get_data_folder(),
+            load=handoff is None,
+        ),
+        handoff["data"] if handoff is not None else None,
     )
+    # 转换旧版配置
+    if data_manager.register_dimensions(plugin_config.worlds):
+        save_data_task()
+    journal = WaypointJournal(
+        os.path.join(plugin_server.get_data_folder(), "data.journal"),
+        fsync=plugin_config.journal_fsync,
+    )
+    # 关闭日志后也要重放上次残留的日志，避免丢失其中尚未写入快照的修改
+    replayed = journal.replay(data_manager)
+    if replayed:
+        plugin_server.logger.info(
+            f"Replayed {replayed} waypoint changes from the journal."
+        )
+    if plugin_config.journal:
+        journal.open()
+        data_manager.journal = journal
+    else:
+        # 写入快照后删除残留的日志，否则之后重新开启日志时会用过期的记录覆盖新数据
+        # 保存失败时保留日志，它是重放出的修改唯一的持久副本，下次加载时会再次重放
+        try:
+            save_data_task()
+        except Exception as e:
+            plugin_server.logger.warning(
+                f"Failed to save changes replayed from the journal, keeping it: {e}"
+            )
+        if not data_manager.is_dirty():
+            journal.discard()
+    completion_index = CompletionIndex(data_manager, plugin_config.max_suggestions)
+    list_cache = WaypointListCache(data_manager)
+    spatial_index = SpatialIndex(data_manager)
     plugin_server.logger.debug(f"SimpleTP plugin loaded with config: {plugin_config}")
 
-    if plugin_config.back_on_death:
-        plugin_server.register_event_listener("PlayerDeathEvent", on_player_death)
+    plugin_server.register_event_listener("PlayerDeathEvent", on_player_death)
 
     save_loop = utils.LoopManager(save_data_task, plugin_config.save_interval)
     save_loop.start()
+    stats_dump_loop = None
+    if plugin_config.stats and plugin_config.stats_dump_interval > 0:
+        stats_dump_loop = utils.LoopManager(
+            dump_stats, plugin_config.stats_dump_interval
+        )
+        stats_dump_loop.start()
 
-    teleport_request_manager = TeleportRequestManager()
+    teleport_request_manager = TeleportRequestManager(
+        plugin_config.tp_request_timeout, on_expire=on_tp_request_expired
+    )
+    if handoff is not None:
+        teleport_request_manager.restore_requests(handoff["tp_requests"])
+        plugin_server.logger.info(
+            f"Took over SimpleTP state from the previous instance: "
+            f"{len(data_manager.get_loaded_players())} players' waypoints, "
+            f"{len(handoff['tp_requests'])} teleport requests."
+        )
+    teleport_request_manager.start()
 
     need_player_kwargs = {
         "requirement": lambda src: src.is_player,
         "failure_message_getter": lambda: utils.tr("not_player_tip"),
     }
 
-    def get_player_suggestion(src: mcdr.CommandSource) -> List[str]:
-        return online_player_counter.get_player_list(try_query=False) or []
+    def get_player_suggestion(
+        src: mcdr.CommandSource, ctx: mcdr.CommandContext
+    ) -> List[str]:
+        return online_player_counter.search_prefix(
+            utils.get_typed_argument(ctx), limit=completion_index.limit
+        )
 
-    def get_waypoint_suggestion(src: mcdr.CommandSource, is_global: bool) -> List[str]:
+    def get_waypoint_suggestion(
+        src: mcdr.CommandSource, ctx: mcdr.CommandContext, is_global: bool
+    ) -> List[str]:
+        prefix = utils.get_typed_argument(ctx)
         if is_global:
-            return list(data_manager.get_global_waypoints().keys())
+            return completion_index.search(None, prefix)
         if not src.is_player:
             return []
         assert isinstance(src, mcdr.PlayerCommandSource)
-        waypoints = data_manager.get_personal_waypoints(src.player)
-        return [name for name in waypoints.keys() if name != constants.BACK_WAYPOINT_ID]
+        return completion_index.search(src.player, prefix)
 
-    def get_all_names_suggestion(src: mcdr.CommandSource) -> List[str]:
-        suggestions = set()
+    def get_all_names_suggestion(
+        src: mcdr.CommandSource, ctx: mcdr.CommandContext
+    ) -> List[str]:
+        suggestions = {}
         if src.is_player:
-            suggestions.update(get_waypoint_suggestion(src, is_global=False))
-        suggestions.update(get_waypoint_suggestion(src, is_global=True))
-        suggestions.update(get_player_suggestion(src))
-        return list(suggestions)
+            suggestions.update(
+                dict.fromkeys(get_waypoint_suggestion(src, ctx, is_global=False))
+            )
+        suggestions.update(
+            dict.fromkeys(get_waypoint_suggestion(src, ctx, is_global=True))
+        )
+        suggestions.update(dict.fromkeys(get_player_suggestion(src, ctx)))
+        return list(suggestions)[: completion_index.limit]
+
+    def get_dimension_suggestion() -> List[str]:
+        return list(data_manager.dimension_str2sid.keys())
+
+    def get_bulk_selection_suggestion(
+        src: mcdr.CommandSource, ctx: mcdr.CommandContext
+    ) -> List[str]:
+        return [
+            "all",
+            *("@" + dimension for dimension in data_manager.dimension_str2sid),
+            *get_player_suggestion(src, ctx),
+        ]
+
+    def list_command(
+        literal: Union[str, List[str]], scope: Literal["personal", "global", "all"]
+    ) -> mcdr.Literal:
+        def reply_list(src: mcdr.CommandSource, ctx: mcdr.CommandContext):
+            src.reply(
+                get_waypoints_messages(
+                    src,
+                    scope=scope,
+                    page=ctx.get("page", 1),
+                    dimension=ctx.get("dimension"),
+                )
+            )
+
+        def page_node() -> mcdr.Integer:
+            return mcdr.Integer("page").at_min(1).runs(reply_list)
+
+        return (
+            mcdr.Literal(literal)
+            .runs(reply_list)
+            .then(page_node())
+            .then(
+                mcdr.Literal("-d").then(
+                    mcdr.Text("dimension")
+                    .suggests(get_dimension_suggestion)
+                    .runs(reply_list)
+                    .then(page_node())
+                )
+            )
+        )
 
     plugin_server.register_command(
         mcdr.Literal(plugin_config.command_prefix)
@@ -167,7 +262,11 @@ def on_load(server: mcdr.PluginServerInterface, prev_module: any):
             .then(
                 mcdr.Literal("-f").then(
                     mcdr.Text("waypoint_name")
-                    .suggests(lambda src: get_waypoint_suggestion(src, is_global=False))
+                    .suggests(
+                        lambda src, ctx: get_waypoint_suggestion(
+                            src, ctx, is_global=False
+                        )
+                    )
                     .runs(
                         lambda src, ctx: set_waypoint(
                             src,
@@ -197,7 +296,11 @@ def on_load(server: mcdr.PluginServerInterface, prev_module: any):
             .then(
                 mcdr.Literal("-f").then(
                     mcdr.Text("waypoint_name")
-                    .suggests(lambda src: get_waypoint_suggestion(src, is_global=True))
+                    .suggests(
+                        lambda src, ctx: get_waypoint_suggestion(
+                            src, ctx, is_global=True
+                        )
+                    )
                     .runs(
                         lambda src, ctx: set_waypoint(
                             src,
@@ -214,7 +317,9 @@ def on_load(server: mcdr.PluginServerInterface, prev_module: any):
             .requires(**need_player_kwargs)
             .then(
                 mcdr.Text("waypoint_name")
-                .suggests(lambda src: get_waypoint_suggestion(src, is_global=False))
+                .suggests(
+                    lambda src, ctx: get_waypoint_suggestion(src, ctx, is_global=False)
+                )
                 .runs(
                     lambda src, ctx: teleport_to_waypoint(
                         src, ctx.get("waypoint_name"), is_global=False
@@ -227,7 +332,9 @@ def on_load(server: mcdr.PluginServerInterface, prev_module: any):
             .requires(**need_player_kwargs)
             .then(
                 mcdr.Text("waypoint_name")
-                .suggests(lambda: get_waypoint_suggestion(None, is_global=True))
+                .suggests(
+                    lambda src, ctx: get_waypoint_suggestion(src, ctx, is_global=True)
+                )
                 .runs(
                     lambda src, ctx: teleport_to_waypoint(
                         src, ctx.get("waypoint_name"), is_global=True
@@ -245,7 +352,9 @@ def on_load(server: mcdr.PluginServerInterface, prev_module: any):
             )
             .then(
                 mcdr.Text("waypoint_name")
-                .suggests(lambda src: get_waypoint_suggestion(src, is_global=False))
+                .suggests(
+                    lambda src, ctx: get_waypoint_suggestion(src, ctx, is_global=False)
+                )
                 .runs(
                     lambda src, ctx: delete_waypoint(
                         src, ctx.get("waypoint_name"), is_global=False
@@ -262,7 +371,9 @@ def on_load(server: mcdr.PluginServerInterface, prev_module: any):
             )
             .then(
                 mcdr.Text("waypoint_name")
-                .suggests(lambda: get_waypoint_suggestion(None, is_global=True))
+                .suggests(
+                    lambda src, ctx: get_waypoint_suggestion(src, ctx, is_global=True)
+                )
                 .runs(
                     lambda src, ctx: delete_waypoint(
                         src, ctx.get("waypoint_name"), is_global=True
@@ -270,19 +381,30 @@ def on_load(server: mcdr.PluginServerInterface, prev_module: any):
                 )
             )
         )
+        .then(list_command("list", scope="all"))
         .then(
-            mcdr.Literal("list").runs(
-                lambda src: src.reply(get_waypoints_messages(src))
+            list_command(["listp", "listpersonal"], scope="personal").requires(
+                **need_player_kwargs
             )
         )
+        .then(list_command(["listg", "listglobal"], scope="global"))
         .then(
-            mcdr.Literal(["listp", "listpersonal"])
+            mcdr.Literal("near")
             .requires(**need_player_kwargs)
-            .runs(lambda src: src.reply(get_waypoints_messages(src, scope="personal")))
-        )
-        .then(
-            mcdr.Literal(["listg", "listglobal"]).runs(
-                lambda src: src.reply(get_waypoints_messages(src, scope="global"))
+            .runs(lambda src: near_waypoints(src))
+            .then(
+                mcdr.Integer("count")
+                .at_min(1)
+                .runs(lambda src, ctx: near_waypoints(src, count=ctx.get("count")))
+            )
+            .then(
+                mcdr.Literal("-r").then(
+                    mcdr.Number("radius")
+                    .at_min(0)
+                    .runs(
+                        lambda src, ctx: near_waypoints(src, radius=ctx.get("radius"))
+                    )
+                )
             )
         )
         .then(
@@ -295,6 +417,25 @@ def on_load(server: mcdr.PluginServerInterface, prev_module: any):
             )
             .runs(back_to_recorded_position)
         )
+        .then(
+            mcdr.Literal("stats")
+            .precondition(
+                lambda src: src.has_permission(plugin_config.permissions.stats)
+            )
+            .runs(show_stats)
+            .then(mcdr.Literal("reset").runs(reset_stats))
+        )
+        .then(
+            mcdr.Literal("migrate")
+            .precondition(
+                lambda src: src.has_permission(plugin_config.permissions.migrate)
+            )
+            .then(
+                mcdr.Text("storage")
+                .suggests(lambda: STORAGE_TYPES)
+                .runs(lambda src, ctx: migrate_storage(src, ctx.get("storage")))
+            )
+        )
         .then(
             mcdr.Literal("tp")
             .requires(**need_player_kwargs)
@@ -317,6 +458,54 @@ def on_load(server: mcdr.PluginServerInterface, prev_module: any):
                 .runs(lambda src, ctx: tp_here(src, ctx.get("target_player")))
             )
         )
+        .then(
+            mcdr.Literal("bulk")
+            .requires(**need_player_kwargs)
+            .precondition(
+                lambda src: src.has_permission(plugin_config.permissions.bulk_tp)
+            )
+            .then(
+                mcdr.Text("selection")
+                .suggests(get_bulk_selection_suggestion)
+                .then(
+                    mcdr.Literal("here").runs(
+                        lambda src, ctx: bulk_tp(src, ctx.get("selection"), "here")
+                    )
+                )
+                .then(
+                    mcdr.Literal("player").then(
+                        mcdr.Text("target_player")
+                        .suggests(get_player_suggestion)
+                        .runs(
+                            lambda src, ctx: bulk_tp(
+                                src,
+                                ctx.get("selection"),
+                                "player",
+                                ctx.get("target_player"),
+                            )
+                        )
+                    )
+                )
+                .then(
+                    mcdr.Literal("waypoint").then(
+                        mcdr.Text("waypoint_name")
+                        .suggests(
+                            lambda src, ctx: get_waypoint_suggestion(
+                                src, ctx, is_global=True
+                            )
+                        )
+                        .runs(
+                            lambda src, ctx: bulk_tp(
+                                src,
+                                ctx.get("selection"),
+                                "waypoint",
+                                ctx.get("waypoint_name"),
+                            )
+                        )
+                    )
+                )
+            )
+        )
         .then(
             mcdr.Literal("tpa")
             .requires(**need_player_kwargs)
@@ -405,58 +594,45 @@ def get_help_message():
     return utils.tr("help.content", prefix=plugin_config.command_prefix)
 
 
+def get_tp_command(player: str, target_coord: utils.CoordWithDimension) -> str:
+    target_dim_name = data_manager.dimension_sid2str[target_coord.dimension]
+    return f"execute in {target_dim_name} run tp {player} {target_coord.x} {target_coord.y} {target_coord.z}"
+
+
+def get_plan_command(plan: TeleportPlan) -> str:
+    if plan.target_coord is None:
+        # 直接把被传送者传送到目标玩家处，可跨维度
+        return f"tp {plan.player} {plan.target_player}"
+    return get_tp_command(plan.player, plan.target_coord)
+
+
 def teleport_to_coord(
     main_body: str,
     target_coord: utils.CoordWithDimension,
     player: Optional[str] = None,
     record_back: bool = True,
 ) -> bool:
-    if player is None:
-        player = main_body
-    target_dim_name = data_manager.dimension_sid2str[target_coord.dimension]
-
-    if record_back:
-        cur_position = utils.get_player_position(player)
-        if cur_position is None:
-            plugin_server.tell(
-                player,
-                mcdr.RText(
-                    utils.tr(
-                        "api.failed_get_position." + "you"
-                        if player == main_body
-                        else "other",
-                        player=player,
-                    ),
-                    constants.ERROR_COLOR,
-                ),
-            )
-            return False
+    plan = plan_teleport(
+        main_body, player=player, target_coord=target_coord, record_back=record_back
+    )
+    if plan is None:
+        return False
+    execute_teleport(plan)
+    return True
 
-        if not utils.teleport_check(
-            main_body,
-            player=player,
-            player_coord=cur_position,
-            target_coord=target_coord,
-            check_flags=utils.TpCheckFlags.WORLD | utils.TpCheckFlags.PERMISSION,
-        ):
-            return False
 
-        personal_waypoints = data_manager.get_personal_waypoints(player)
-        personal_waypoints[constants.BACK_WAYPOINT_ID] = cur_position
-        data_manager.set_personal_waypoints(player, personal_waypoints)
-    else:
-        if not utils.teleport_check(
-            main_body,
-            player=player,
-            target_coord=target_coord,
-            check_flags=utils.TpCheckFlags.WORLD | utils.TpCheckFlags.PERMISSION,
-        ):
-            return False
-
-    plugin_server.execute(
-        f"execute in {target_dim_name} run tp {player} {target_coord.x} {target_coord.y} {target_coord.z}"
-    )
-    if record_back:
+def execute_teleport(plan: TeleportPlan):
+    player = plan.player
+    cur_position = plan.player_coord
+    if cur_position is not None:
+        data_manager.record_back(player, cur_position)
+    if not teleport_queue.submit(plan.main_body, player, get_plan_command(plan)):
+        # 排队中的传送尚未执行，此时提示已记录原位置会误导玩家
+        plugin_server.tell(
+            player, mcdr.RText(utils.tr("tp.queued"), color=constants.TIP_COLOR)
+        )
+        return
+    if cur_position is not None:
         plugin_server.tell(
             player,
             mcdr.RText(
@@ -468,36 +644,27 @@ def teleport_to_coord(
                 color=constants.TIP_COLOR,
             )
             + "  "
-            + utils.get_command_button(
-                utils.tr("button.back.text"),
-                plugin_config.command_prefix + " back",
-                hover_text=utils.tr("button.back.hover"),
-            ),
+            + message_templates.static_button("back"),
         )
 
-    return True
-
 
-@mcdr.new_thread("easy_tp")
+@player_task("easy_tp")
 def easy_tp(source: mcdr.PlayerCommandSource, name: str):
     # 优先级：个人传送点 > 全局传送点 > 在线玩家（权限足够优先tp，否则tpa）
-    personal_waypoints = data_manager.get_personal_waypoints(source.player)
-    if name in personal_waypoints:
+    if data_manager.get_waypoint(source.player, name) is not None:
         teleport_to_waypoint(source, name, is_global=False)
         return
-    global_waypoints = data_manager.get_global_waypoints()
-    if name in global_waypoints:
+    if data_manager.get_waypoint(None, name) is not None:
         teleport_to_waypoint(source, name, is_global=True)
         return
-    player_list = online_player_counter.get_player_list()
-    if player_list is None:
+    if online_player_counter.get_player_list() is None:
         source.reply(
             mcdr.RText(
                 utils.tr("api.failed_get_player_list"), color=constants.ERROR_COLOR
             )
         )
         return
-    target_player = utils.search_for_player(name, player_list or [])
+    target_player = online_player_counter.search_player(name)
     if target_player is None:
         source.reply(
             mcdr.RText(
@@ -519,7 +686,7 @@ def easy_tp(source: mcdr.PlayerCommandSource, name: str):
     )
 
 
-@mcdr.new_thread("deal_tp_request")
+@player_task("deal_tp_request")
 def deal_tp_request(
     source: mcdr.PlayerCommandSource,
     action: Literal["accept", "deny"],
@@ -550,34 +717,24 @@ def deal_tp_request(
 
     teleport_request_manager.remove_request(tp_request)
     if action == "accept":
-        if not utils.teleport_check(
-            source.player,
-            target_player=tp_request.player,
-            check_flags=utils.TpCheckFlags.ONLINE,
-        ):
-            return
-        if tp_request.is_reversed:
-            target_coord = utils.get_player_position(tp_request.player)
-            if target_coord is None:
-                source.reply(
-                    mcdr.RText(
-                        utils.tr(
-                            "api.failed_get_position.other", player=tp_request.player
-                        ),
-                        color=constants.ERROR_COLOR,
-                    )
-                )
-                return
-        else:
-            target_coord = utils.get_player_position(source.player)
-            if target_coord is None:
-                source.reply(
-                    mcdr.RText(
-                        utils.tr("api.failed_get_position.you"),
-                        color=constants.ERROR_COLOR,
-                    )
+        # 在线状态和双方的位置都由 plan_teleport 一次确定，检查失败时原因发送给请求者
+        plan = plan_teleport(
+            tp_request.player,
+            player=tp_request.target_player
+            if tp_request.is_reversed
+            else tp_request.player,
+            target_player=tp_request.player
+            if tp_request.is_reversed
+            else tp_request.target_player,
+        )
+        if plan is None:
+            source.reply(
+                mcdr.RText(
+                    utils.tr("tp_request.failed_teleport", player=tp_request.player),
+                    color=constants.ERROR_COLOR,
                 )
-                return
+            )
+            return
         source.reply(
             mcdr.RText(
                 utils.tr("tp_request.accepted", player=tp_request.player),
@@ -591,20 +748,7 @@ def deal_tp_request(
                 color=constants.SUCCESS_COLOR,
             ),
         )
-        if not teleport_to_coord(
-            tp_request.player,
-            player=tp_request.player
-            if not tp_request.is_reversed
-            else tp_request.target_player,
-            target_coord=target_coord,
-        ):
-            source.reply(
-                mcdr.RText(
-                    utils.tr("tp_request.failed_teleport", player=tp_request.player),
-                    color=constants.ERROR_COLOR,
-                )
-            )
-            return
+        execute_teleport(plan)
     else:  # action == "deny"
         source.reply(
             mcdr.RText(
@@ -621,7 +765,7 @@ def deal_tp_request(
         )
 
 
-@mcdr.new_thread("tp_request")
+@player_task("tp_request")
 def tp_request(
     source: mcdr.PlayerCommandSource,
     target_player: str,
@@ -649,11 +793,7 @@ def tp_request(
                 color=constants.ERROR_COLOR,
             )
             + "  "
-            + utils.get_command_button(
-                utils.tr("button.cancel.text"),
-                f"{plugin_config.command_prefix} cancel",
-                hover_text=utils.tr("button.cancel.hover"),
-            )
+            + message_templates.static_button("cancel")
         )
         return
     source.reply(
@@ -662,11 +802,7 @@ def tp_request(
             color=constants.TIP_COLOR,
         )
         + "  "
-        + utils.get_command_button(
-            utils.tr("button.cancel.text"),
-            f"{plugin_config.command_prefix} cancel",
-            hover_text=utils.tr("button.cancel.hover"),
-        )
+        + message_templates.static_button("cancel")
     )
     plugin_server.tell(
         target_player,
@@ -682,21 +818,34 @@ def tp_request(
             )
         )
         + "  "
-        + utils.get_command_button(
-            utils.tr("button.accept.text"),
-            f"{plugin_config.command_prefix} accept {source.player}",
-            hover_text=utils.tr("button.accept.hover"),
+        + message_templates.button(
+            "accept", f"{plugin_config.command_prefix} accept {source.player}"
         )
         + " "
-        + utils.get_command_button(
-            utils.tr("button.deny.text"),
-            f"{plugin_config.command_prefix} deny {source.player}",
-            hover_text=utils.tr("button.deny.hover"),
+        + message_templates.button(
+            "deny", f"{plugin_config.command_prefix} deny {source.player}"
         ),
     )
 
 
-@mcdr.new_thread("cancel_tpa_request")
+def on_tp_request_expired(tp_request: TeleportRequest):
+    plugin_server.tell(
+        tp_request.player,
+        mcdr.RText(
+            utils.tr("tp_request.expired.sender", player=tp_request.target_player),
+            color=constants.WARNING_COLOR,
+        ),
+    )
+    plugin_server.tell(
+        tp_request.target_player,
+        mcdr.RText(
+            utils.tr("tp_request.expired.receiver", player=tp_request.player),
+            color=constants.WARNING_COLOR,
+        ),
+    )
+
+
+@player_task("cancel_tpa_request")
 def cancel_tpa_request(source: mcdr.PlayerCommandSource):
     tp_request = teleport_request_manager.get_sender_request(source.player)
     if tp_request is None:
@@ -723,7 +872,7 @@ def cancel_tpa_request(source: mcdr.PlayerCommandSource):
     )
 
 
-@mcdr.new_thread("tp_to_user")
+@player_task("tp_to_user")
 def tp_to_player(
     source: mcdr.PlayerCommandSource,
     target_player: str,
@@ -737,82 +886,234 @@ def tp_to_player(
         )
         return
 
-    if not utils.teleport_check(
-        source.player,
-        target_player=target_player,
-        check_flags=utils.TpCheckFlags.ONLINE,
-    ):
+    plan = plan_teleport(source.player, target_player=target_player)
+    if plan is None:
         return
 
-    coord = utils.get_player_position(target_player)
+    coord = plan.target_coord
     if coord is None:
+        message = utils.tr("tp_user.teleporting_to_player", player=plan.target_player)
+    else:
+        message = utils.tr(
+            "tp_user.teleporting_to",
+            player=plan.target_player,
+            coord=f"{coord.x:.2f}, {coord.y:.2f}, {coord.z:.2f}",
+            dim=data_manager.dimension_sid2str[coord.dimension],
+        )
+    source.reply(mcdr.RText(message, color=constants.SUCCESS_COLOR))
+    execute_teleport(plan)
+
+
+@player_task("tphere")
+def tp_here(
+    source: mcdr.PlayerCommandSource,
+    target_player: str,
+):
+    if not target_player:
         source.reply(
             mcdr.RText(
-                utils.tr("api.failed_get_position.other", player=target_player),
+                utils.tr("tp_here.no_target_player_provided"),
                 color=constants.ERROR_COLOR,
             )
         )
         return
 
+    plan = plan_teleport(
+        source.player, player=target_player, target_player=source.player
+    )
+    if plan is None:
+        return
+
     source.reply(
         mcdr.RText(
-            utils.tr(
-                "tp_user.teleporting_to",
-                player=target_player,
-                coord=f"{coord.x:.2f}, {coord.y:.2f}, {coord.z:.2f}",
-                dim=data_manager.dimension_sid2str[coord.dimension],
-            ),
+            utils.tr("tp_here.teleporting_player", player=plan.player),
             color=constants.SUCCESS_COLOR,
         )
     )
-    teleport_to_coord(source.player, target_coord=coord)
+    plugin_server.tell(
+        plan.player,
+        mcdr.RText(utils.tr("tp_here.being_teleported", player=source.player)),
+    )
+    execute_teleport(plan)
+
+
+def parse_bulk_selection(
+    source: mcdr.CommandSource, selection: str
+) -> Optional[Tuple[List[str], Optional[str], List[str]]]:
+    """
+    解析批量传送的玩家选择：all 为所有在线玩家，@<维度> 为该维度中的在线玩家，
+    否则为以逗号分隔的玩家列表
+    返回 (候选玩家, 需筛选的维度, 不在线的玩家)，出错时回复并返回 None
+    """
+    online_players = online_player_counter.get_player_list()
+    if online_players is None:
+        source.reply(
+            mcdr.RText(
+                utils.tr("api.failed_get_player_list"), color=constants.ERROR_COLOR
+            )
+        )
+        return None
+    if selection == "all":
+        return sorted(online_players), None, []
+    if selection.startswith("@"):
+        dimension = selection[1:]
+        if ":" not in dimension:
+            dimension = "minecraft:" + dimension
+        if dimension not in data_manager.dimension_str2sid:
+            source.reply(
+                mcdr.RText(
+                    utils.tr("bulk_tp.unknown_dimension", dim=dimension),
+                    color=constants.ERROR_COLOR,
+                )
+            )
+            return None
+        return sorted(online_players), dimension, []
+    players = {}
+    offline = []
+    for name in selection.split(","):
+        if not name:
+            continue
+        online_name = online_player_counter.search_player(name)
+        if online_name is None:
+            offline.append(name)
+        else:
+            players[online_name] = None
+    return list(players), None, offline
 
 
-@mcdr.new_thread("tphere")
-def tp_here(
+@player_task("bulk_tp")
+def bulk_tp(
     source: mcdr.PlayerCommandSource,
-    target_player: str,
+    selection: str,
+    target_type: Literal["here", "player", "waypoint"],
+    target: Optional[str] = None,
 ):
-    if not target_player:
+    """
+    将选中的在线玩家一起传送到玩家或全局传送点
+    所有玩家的位置并发查询一次，维度和权限检查、记录返回点都基于这一次查询的结果，
+    传送命令作为一批提交到传送队列
+    """
+    parsed = parse_bulk_selection(source, selection)
+    if parsed is None:
+        return
+    players, dimension_filter, offline = parsed
+
+    target_player = None
+    target_coord = None
+    if target_type == "waypoint":
+        target_coord = data_manager.get_waypoint(None, target)
+        if target_coord is None:
+            source.reply(
+                mcdr.RText(
+                    utils.tr("waypoint.tp.not_found.global", name=target),
+                    color=constants.ERROR_COLOR,
+                )
+            )
+            return
+        target_name = target
+    else:
+        target_player = (
+            source.player
+            if target_type == "here"
+            else online_player_counter.search_player(target)
+        )
+        if target_player is None:
+            source.reply(
+                mcdr.RText(
+                    utils.tr("player_not_online", player=target),
+                    color=constants.ERROR_COLOR,
+                )
+            )
+            return
+        target_name = target_player
+        players = [player for player in players if player != target_player]
+
+    positions = utils.get_player_positions(
+        players + [target_player] if target_player is not None else players
+    )
+    if target_player is not None:
+        target_coord = positions.pop(target_player)
+        if target_coord is None:
+            source.reply(
+                mcdr.RText(
+                    utils.tr(
+                        "api.failed_get_position."
+                        + ("you" if target_player == source.player else "other"),
+                        player=target_player,
+                    ),
+                    color=constants.ERROR_COLOR,
+                )
+            )
+            return
+    target_dim = data_manager.dimension_sid2str[target_coord.dimension]
+    if target_dim not in plugin_config.worlds:
         source.reply(
             mcdr.RText(
-                utils.tr("tp_here.no_target_player_provided"),
+                utils.tr("config.dim_not_allowed.target", dim=target_dim),
                 color=constants.ERROR_COLOR,
             )
         )
         return
+    cross_world = utils.check_permission(
+        source.player, plugin_config.permissions.cross_world_tp
+    )
 
-    coord = utils.get_player_position(source.player)
-    if coord is None:
+    skipped = [(player, "offline") for player in offline]
+    moving = []
+    for player, position in positions.items():
+        if position is None:
+            skipped.append((player, "no_position"))
+            continue
+        player_dim = data_manager.dimension_sid2str[position.dimension]
+        if dimension_filter is not None and player_dim != dimension_filter:
+            continue
+        if player_dim not in plugin_config.worlds:
+            skipped.append((player, "dim_not_allowed"))
+        elif player_dim != target_dim and not cross_world:
+            skipped.append((player, "cross_dim"))
+        else:
+            moving.append((player, position))
+
+    if not moving and not skipped:
         source.reply(
-            mcdr.RText(
-                utils.tr("api.failed_get_position.you"),
-                color=constants.ERROR_COLOR,
-            )
+            mcdr.RText(utils.tr("bulk_tp.no_players"), color=constants.WARNING_COLOR)
         )
         return
 
-    if not utils.teleport_check(
+    being_teleported = mcdr.RText(
+        utils.tr("bulk_tp.being_teleported", target=target_name, player=source.player)
+    )
+    for player, position in moving:
+        data_manager.record_back(player, position)
+        plugin_server.tell(player, being_teleported)
+    teleport_queue.submit_many(
         source.player,
-        target_player=target_player,
-        check_flags=utils.TpCheckFlags.ONLINE,
-    ):
-        return
+        [(player, get_tp_command(player, target_coord)) for player, _ in moving],
+    )
 
     source.reply(
         mcdr.RText(
-            utils.tr("tp_here.teleporting_player", player=target_player),
+            utils.tr("bulk_tp.teleporting", count=len(moving), target=target_name),
             color=constants.SUCCESS_COLOR,
         )
     )
-    plugin_server.tell(
-        target_player,
-        mcdr.RText(utils.tr("tp_here.being_teleported", player=source.player)),
-    )
-    teleport_to_coord(source.player, target_coord=coord, player=target_player)
+    if skipped:
+        source.reply(
+            mcdr.RText(
+                utils.tr(
+                    "bulk_tp.skipped",
+                    count=len(skipped),
+                    players=", ".join(
+                        f"{player} ({utils.tr('bulk_tp.reason.' + reason)})"
+                        for player, reason in skipped
+                    ),
+                ),
+                color=constants.WARNING_COLOR,
+            )
+        )
 
 
-@mcdr.new_thread("delete_waypoint")
+@player_task("delete_waypoint")
 def delete_waypoint(
     source: mcdr.CommandSource,
     waypoint_name: str,
@@ -839,7 +1140,7 @@ def delete_waypoint(
         return
 
     if is_global:
-        waypoint_dict = data_manager.get_global_waypoints()
+        owner = None
     else:
         if not source.is_player:
             source.reply(
@@ -850,9 +1151,9 @@ def delete_waypoint(
             )
             return
         assert isinstance(source, mcdr.PlayerCommandSource)
-        waypoint_dict = data_manager.get_personal_waypoints(source.player)
+        owner = source.player
 
-    if waypoint_name not in waypoint_dict:
+    if data_manager.remove_waypoint(owner, waypoint_name) is None:
         source.reply(
             mcdr.RText(
                 utils.tr(
@@ -864,12 +1165,6 @@ def delete_waypoint(
         )
         return
 
-    del waypoint_dict[waypoint_name]
-    if is_global:
-        data_manager.set_global_waypoints(waypoint_dict)
-    else:
-        assert isinstance(source, mcdr.PlayerCommandSource)
-        data_manager.set_personal_waypoints(source.player, waypoint_dict)
     source.reply(
         mcdr.RText(
             utils.tr(
@@ -881,7 +1176,7 @@ def delete_waypoint(
     )
 
 
-@mcdr.new_thread("teleport_to_waypoint")
+@player_task("teleport_to_waypoint")
 def teleport_to_waypoint(
     source: mcdr.PlayerCommandSource, waypoint_name: str, is_global: bool
 ):
@@ -905,14 +1200,10 @@ def teleport_to_waypoint(
         )
         return
 
-    player = source.player
-
-    if is_global:
-        waypoint_dict = data_manager.get_global_waypoints()
-    else:
-        waypoint_dict = data_manager.get_personal_waypoints(player)
-
-    if waypoint_name not in waypoint_dict:
+    position = data_manager.get_waypoint(
+        None if is_global else source.player, waypoint_name
+    )
+    if position is None:
         source.reply(
             mcdr.RText(
                 utils.tr(
@@ -924,7 +1215,6 @@ def teleport_to_waypoint(
         )
         return
 
-    position = waypoint_dict[waypoint_name]
     source.reply(
         mcdr.RText(
             utils.tr(
@@ -939,7 +1229,7 @@ def teleport_to_waypoint(
     teleport_to_coord(source.player, target_coord=position)
 
 
-@mcdr.new_thread("create_waypoint")
+@player_task("create_waypoint")
 def set_waypoint(
     source: mcdr.PlayerCommandSource,
     waypoint_name: str,
@@ -989,12 +1279,10 @@ def set_waypoint(
         )
         return
 
-    if is_global:
-        waypoint_dict = data_manager.get_global_waypoints()
-    else:
-        waypoint_dict = data_manager.get_personal_waypoints(player)
-    if waypoint_name in waypoint_dict:
-        old_position = waypoint_dict[waypoint_name]
+    old_position = data_manager.put_waypoint(
+        None if is_global else player, waypoint_name, position, overwrite=overwrite
+    )
+    if old_position is not None:
         if not overwrite:
             source.reply(
                 mcdr.RText(
@@ -1019,11 +1307,6 @@ def set_waypoint(
                 color=constants.WARNING_COLOR,
             )
         )
-    waypoint_dict[waypoint_name] = position
-    if is_global:
-        data_manager.set_global_waypoints(waypoint_dict)
-    else:
-        data_manager.set_personal_waypoints(player, waypoint_dict)
     source.reply(
         mcdr.RText(
             utils.tr(
@@ -1037,11 +1320,10 @@ def set_waypoint(
     )
 
 
-@mcdr.new_thread("back_to_recorded_position")
+@player_task("back_to_recorded_position")
 def back_to_recorded_position(source: mcdr.PlayerCommandSource):
-    player = source.player
-    personal_waypoints = data_manager.get_personal_waypoints(player)
-    if constants.BACK_WAYPOINT_ID not in personal_waypoints:
+    position = data_manager.get_waypoint(source.player, constants.BACK_WAYPOINT_ID)
+    if position is None:
         source.reply(
             mcdr.RText(
                 utils.tr("back.no_recorded_position"),
@@ -1050,7 +1332,6 @@ def back_to_recorded_position(source: mcdr.PlayerCommandSource):
         )
         return
 
-    position = personal_waypoints[constants.BACK_WAYPOINT_ID]
     source.reply(
         mcdr.RText(
             utils.tr(
@@ -1064,87 +1345,219 @@ def back_to_recorded_position(source: mcdr.PlayerCommandSource):
     teleport_to_coord(source.player, target_coord=position)
 
 
+@player_task("near_waypoints")
+def near_waypoints(
+    source: mcdr.PlayerCommandSource,
+    count: Optional[int] = None,
+    radius: Optional[float] = None,
+):
+    position = utils.get_player_position(source.player)
+    if position is None:
+        source.reply(
+            mcdr.RText(
+                utils.tr("api.failed_get_position.you"),
+                color=constants.ERROR_COLOR,
+            )
+        )
+        return
+
+    max_results = plugin_config.near_max_results
+    if radius is not None:
+        nearby = spatial_index.within(source.player, position, radius)[:max_results]
+    else:
+        nearby = spatial_index.nearest(
+            source.player,
+            position,
+            min(count or constants.NEAR_DEFAULT_COUNT, max_results),
+        )
+
+    dim_name = data_manager.dimension_sid2str[position.dimension]
+    replyTextLines: List[mcdr.RTextBase] = [
+        mcdr.RText(
+            utils.tr("near.header", dim=dim_name), color=mcdr.RColor.light_purple
+        )
+    ]
+    if not nearby:
+        replyTextLines.append(mcdr.RText(utils.tr("near.none"), color=mcdr.RColor.gray))
+    for item in nearby:
+        is_global = item.owner is None
+        replyTextLines.append(
+            mcdr.RText(
+                utils.tr("near.global_tag" if is_global else "near.personal_tag"),
+                color=mcdr.RColor.gray,
+            )
+            + " "
+            + mcdr.RText(item.name, color=mcdr.RColor.aqua)
+            + mcdr.RText(
+                f": ({item.coord.x:.2f}, {item.coord.y:.2f}, {item.coord.z:.2f}) ",
+                color=mcdr.RColor.gray,
+            )
+            + mcdr.RText(
+                utils.tr("near.distance", distance=f"{item.distance:.1f}"),
+                color=constants.TIP_COLOR,
+            )
+            + "  "
+            + message_templates.button(
+                "tp",
+                f"{plugin_config.command_prefix} {'tpg' if is_global else 'tpp'} {item.name}",
+            )
+        )
+    source.reply(mcdr.RTextBase.join("\n", replyTextLines))
+
+
+LIST_COMMANDS = {"all": "list", "personal": "listp", "global": "listg"}
+
+
 def get_waypoints_messages(
-    source: mcdr.CommandSource, scope: Literal["personal", "global", "all"] = "all"
-) -> mcdr.RText:
-    def get_dim_color(dim_sid: int) -> mcdr.RColor:
-        dim_name = data_manager.dimension_sid2str[dim_sid]
+    source: mcdr.CommandSource,
+    scope: Literal["personal", "global", "all"] = "all",
+    page: int = 1,
+    dimension: Optional[str] = None,
+) -> mcdr.RTextBase:
+    dim_filter = None
+    if dimension is not None:
+        dim_filter = data_manager.dimension_str2sid.get(
+            dimension, data_manager.dimension_str2sid.get("minecraft:" + dimension)
+        )
+        if dim_filter is None:
+            return mcdr.RText(
+                utils.tr("list.unknown_dimension", dim=dimension),
+                color=constants.ERROR_COLOR,
+            )
+
+    # 预先计算各维度的颜色，避免每行都在 worlds 中查找
+    dim_colors = {}
+    for dim_sid, dim_name in data_manager.dimension_sid2str.items():
         index = (
             plugin_config.worlds.index(dim_name)
             if dim_name in plugin_config.worlds
             else -1
         )
-        if index >= len(constants.DIM_COLORS):
-            return constants.DIM_COLORS[-1]
-        return constants.DIM_COLORS[index]
+        dim_colors[dim_sid] = constants.DIM_COLORS[
+            min(index, len(constants.DIM_COLORS) - 1)
+        ]
 
-    def waypoint_item_to_rtext(
-        name: str, pos: utils.CoordWithDimension, is_global: bool
-    ) -> mcdr.RText:
-        rtext = mcdr.RText(name, color=get_dim_color(pos.dimension)) + mcdr.RText(
-            f": {data_manager.dimension_sid2str[pos.dimension]}({pos.x:.2f}, {pos.y:.2f}, {pos.z:.2f})",
-            color=mcdr.RColor.gray,
-        )
-        if source.is_player:
-            rtext += "  " + utils.get_command_button(
-                utils.tr("button.tp.text"),
-                f"{plugin_config.command_prefix} tpg {name}"
-                if is_global
-                else f"{plugin_config.command_prefix} tpp {name}",
-            )
-            if not is_global or source.has_permission(
-                plugin_config.permissions.global_waypoint
-            ):
-                rtext += " " + utils.get_command_button(
-                    utils.tr("button.del.text"),
-                    f"{plugin_config.command_prefix} delg {name}"
+    def get_item_renderer(is_global: bool, show_buttons: bool, can_delete: bool):
+        def waypoint_item_to_rtext(
+            name: str, pos: utils.CoordWithDimension
+        ) -> Optional[RenderedLine]:
+            if name == constants.BACK_WAYPOINT_ID:
+                return None
+            rtext = mcdr.RText(name, color=dim_colors.get(pos.dimension)) + mcdr.RText(
+                f": {data_manager.dimension_sid2str[pos.dimension]}({pos.x:.2f}, {pos.y:.2f}, {pos.z:.2f})",
+                color=mcdr.RColor.gray,
+            )
+            if show_buttons:
+                rtext += "  " + message_templates.button(
+                    "tp",
+                    f"{plugin_config.command_prefix} tpg {name}"
                     if is_global
-                    else f"{plugin_config.command_prefix} delp {name}",
-                    hover_text=utils.tr("button.del.hover"),
-                    color=mcdr.RColor.red,
+                    else f"{plugin_config.command_prefix} tpp {name}",
                 )
-        return rtext
+                if can_delete:
+                    rtext += " " + message_templates.button(
+                        "del",
+                        f"{plugin_config.command_prefix} delg {name}"
+                        if is_global
+                        else f"{plugin_config.command_prefix} delp {name}",
+                    )
+            return pos.dimension, rtext
 
-    replyTextLines: List[mcdr.RText] = []
+        return waypoint_item_to_rtext
+
+    # (标题, 无传送点时的提示, 渲染好的行)
+    sections = []
     if source.is_player and scope != "global":
         assert isinstance(source, mcdr.PlayerCommandSource)
-        replyTextLines.append(
-            mcdr.RText(
-                utils.tr("list.personal_waypoints_header"),
-                color=mcdr.RColor.light_purple,
+        sections.append(
+            (
+                "list.personal_waypoints_header",
+                "list.no_personal_waypoints",
+                list_cache.get_lines(
+                    source.player, True, get_item_renderer(False, True, True)
+                ),
             )
         )
-        waypoints = data_manager.get_personal_waypoints(source.player)
-        if not waypoints:
-            replyTextLines.append(
-                mcdr.RText(
-                    utils.tr("list.no_personal_waypoints"), color=mcdr.RColor.gray
-                )
+    if scope != "personal":
+        show_buttons = source.is_player
+        can_delete = show_buttons and source.has_permission(
+            plugin_config.permissions.global_waypoint
+        )
+        sections.append(
+            (
+                "list.global_waypoints_header",
+                "list.no_global_waypoints",
+                list_cache.get_lines(
+                    None,
+                    (show_buttons, can_delete),
+                    get_item_renderer(True, show_buttons, can_delete),
+                ),
             )
-        for name, pos in waypoints.items():
-            if name == constants.BACK_WAYPOINT_ID:
-                continue
-            replyTextLines.append(waypoint_item_to_rtext(name, pos, is_global=False))
+        )
 
-    if scope != "personal":
-        replyTextLines.append(
-            mcdr.RText(
-                utils.tr("list.global_waypoints_header"), color=mcdr.RColor.light_purple
+    entries = [
+        (section_index, rtext)
+        for section_index, (_, _, lines) in enumerate(sections)
+        for dim_sid, rtext in lines
+        if dim_filter is None or dim_sid == dim_filter
+    ]
+    page_size = plugin_config.list_page_size
+    if page_size > 0:
+        total_pages = max(1, math.ceil(len(entries) / page_size))
+        if page > total_pages:
+            return mcdr.RText(
+                utils.tr("list.page_out_of_range", page=page, total=total_pages),
+                color=constants.ERROR_COLOR,
             )
+        page_entries = entries[(page - 1) * page_size : page * page_size]
+    else:
+        total_pages = 1
+        page_entries = entries
+
+    replyTextLines: List[mcdr.RTextBase] = []
+    for section_index, (header_key, empty_key, _) in enumerate(sections):
+        section_lines = [rtext for i, rtext in page_entries if i == section_index]
+        has_entries = any(i == section_index for i, _ in entries)
+        if not section_lines and (has_entries or page > 1):
+            continue
+        replyTextLines.append(
+            mcdr.RText(utils.tr(header_key), color=mcdr.RColor.light_purple)
         )
-        waypoints = data_manager.get_global_waypoints()
-        if not waypoints:
+        if not section_lines:
             replyTextLines.append(
-                mcdr.RText(utils.tr("list.no_global_waypoints"), color=mcdr.RColor.gray)
+                mcdr.RText(utils.tr(empty_key), color=mcdr.RColor.gray)
+            )
+        replyTextLines.extend(section_lines)
+
+    if total_pages > 1:
+        command = f"{plugin_config.command_prefix} {LIST_COMMANDS[scope]}"
+        if dimension is not None:
+            command += f" -d {dimension}"
+        footer = mcdr.RText(
+            utils.tr("list.page", page=page, total=total_pages),
+            color=mcdr.RColor.gray,
+        )
+        if page > 1:
+            footer += "  " + message_templates.button(
+                "prev_page", f"{command} {page - 1}", type="run"
+            )
+        if page < total_pages:
+            footer += "  " + message_templates.button(
+                "next_page", f"{command} {page + 1}", type="run"
             )
-        for name, pos in waypoints.items():
-            replyTextLines.append(waypoint_item_to_rtext(name, pos, is_global=True))
+        replyTextLines.append(footer)
 
     return mcdr.RTextBase.join("\n", replyTextLines)
 
 
-@mcdr.new_thread("on_player_death")
 def on_player_death(server: mcdr.PluginServerInterface, player: str, event: str, _):
+    player_state_cache.invalidate(player)
+    if plugin_config.back_on_death:
+        record_death_position(server, player)
+
+
+@player_task("on_player_death", key_getter=lambda server, player: player)
+def record_death_position(server: mcdr.PluginServerInterface, player: str):
     death_position = utils.get_player_position(player)
     if death_position is None:
         server.tell(
@@ -1169,11 +1582,7 @@ def on_player_death(server: mcdr.PluginServerInterface, player: str, event: str,
         )
         return
 
-    personal_waypoints = data_manager.get_personal_waypoints(player)
-    personal_waypoints[constants.BACK_WAYPOINT_ID] = utils.CoordWithDimension(
-        death_position.x, death_position.y, death_position.z, death_position.dimension
-    )
-    data_manager.set_personal_waypoints(player, personal_waypoints)
+    data_manager.record_back(player, death_position)
     server.tell(
         player,
         mcdr.RText(
@@ -1185,40 +1594,224 @@ def on_player_death(server: mcdr.PluginServerInterface, player: str, event: str,
             color=constants.TIP_COLOR,
         )
         + "  "
-        + utils.get_command_button(
-            utils.tr("button.death_back.text"),
-            plugin_config.command_prefix + " back",
-            hover_text=utils.tr("button.death_back.hover"),
-        ),
+        + message_templates.static_button("death_back"),
     )
 
 
+def get_stats_snapshot() -> dict:
+    snapshot = stats_collector.snapshot()
+    snapshot["gauges"] = {
+        "executor.pending": command_executor.pending,
+        "data.loaded_players": len(data_manager.get_loaded_players()),
+        **{
+            f"player_cache.{key}": value
+            for key, value in player_state_cache.get_stats().items()
+        },
+        **{
+            f"tp_request.{key}": value
+            for key, value in teleport_request_manager.get_stats().items()
+        },
+        **{
+            f"tp_queue.{key}": value
+            for key, value in teleport_queue.get_stats().items()
+        },
+    }
+    return snapshot
+
+
+def show_stats(source: mcdr.CommandSource):
+    if not stats_collector.enabled:
+        source.reply(
+            mcdr.RText(utils.tr("stats.disabled"), color=constants.WARNING_COLOR)
+        )
+        return
+    snapshot = get_stats_snapshot()
+    replyTextLines: List[mcdr.RTextBase] = [
+        mcdr.RText(
+            utils.tr(
+                "stats.header",
+                since=time.strftime(
+                    "%Y-%m-%d %H:%M:%S", time.localtime(snapshot["since"])
+                ),
+            ),
+            color=mcdr.RColor.light_purple,
+        )
+    ]
+    replyTextLines.extend(
+        mcdr.RText(line, color=mcdr.RColor.gray) for line in format_stats(snapshot)
+    )
+    source.reply(mcdr.RTextBase.join("\n", replyTextLines))
+
+
+def reset_stats(source: mcdr.CommandSource):
+    stats_collector.reset()
+    source.reply(mcdr.RText(utils.tr("stats.reset"), color=constants.SUCCESS_COLOR))
+
+
+def migrate_storage(source: mcdr.CommandSource, storage_type: str):
+    """
+    切换存储格式：写入配置后重载插件，卸载时保存的数据在加载时由 create_storage 迁移
+    """
+    current = plugin_config.storage
+    data_folder = plugin_server.get_data_folder()
+    error = None
+    if storage_type not in STORAGE_TYPES:
+        error = utils.tr(
+            "migrate.unknown_storage",
+            storage=storage_type,
+            storages=", ".join(STORAGE_TYPES),
+        )
+    elif storage_type == current:
+        error = utils.tr("migrate.already_using", storage=storage_type)
+    elif not can_migrate(current, storage_type):
+        error = utils.tr("migrate.unsupported", source=current, target=storage_type)
+    elif storage_exists(storage_type, data_folder):
+        # 目标格式的数据已存在时加载时会直接使用它，而不是迁移当前数据
+        error = utils.tr("migrate.target_exists", storage=storage_type)
+    if error is not None:
+        source.reply(mcdr.RText(error, color=constants.ERROR_COLOR))
+        return
+
+    source.reply(
+        mcdr.RText(
+            utils.tr("migrate.reloading", source=current, target=storage_type),
+            color=constants.SUCCESS_COLOR,
+        )
+    )
+    plugin_server.logger.info(
+        f"Migrating SimpleTP data from '{current}' to '{storage_type}' storage."
+    )
+    plugin_config.storage = storage_type
+    plugin_server.save_config_simple(plugin_config)
+    plugin_server.reload_plugin(plugin_server.get_self_metadata().id)
+
+
+def dump_stats():
+    try:
+        utils.write_file_atomic(
+            os.path.join(plugin_server.get_data_folder(), "stats.json"),
+            json.dumps(get_stats_snapshot(), indent=4),
+        )
+    except Exception as e:
+        plugin_server.logger.error(f"Error dumping SimpleTP stats: {e}")
+
+
 def save_data_task():
-    global prev_data_str
-    cur_data = data_manager.get_simple_tp_data()
-    cur_data_str = json.dumps(cur_data.serialize(), sort_keys=True)
-    if cur_data_str == prev_data_str:
+    with stats_collector.timed("save_data_task"):
+        _save_data()
+
+
+def _save_data():
+    if not data_manager.is_dirty():
         plugin_server.logger.debug(
             "No changes detected in SimpleTP data, skipping save."
         )
-        return
-    plugin_server.logger.debug("Performing scheduled save of SimpleTP data.")
-    plugin_server.save_config_simple(cur_data, "data.json")
-    prev_data_str = cur_data_str
+    else:
+        plugin_server.logger.debug("Performing scheduled save of SimpleTP data.")
+        journal = data_manager.journal
+        # 先轮换日志，保证旧日志中的修改都包含在本次快照中
+        if journal is not None:
+            journal.rotate()
+        changes = data_manager.collect_changes()
+        if changes is not None:
+            data_manager.storage.save(changes, data_manager)
+            data_manager.mark_saved(changes.generation)
+        if journal is not None:
+            journal.discard_rotated()
+
+    online_players = online_player_counter.get_player_list(try_query=False)
+    if online_players is not None:
+        evicted = data_manager.evict_idle_players(
+            online_players, plugin_config.evict_idle_seconds
+        )
+        if evicted:
+            plugin_server.logger.debug(
+                f"Evicted personal waypoints of {evicted} idle offline players."
+            )
+
+
+def get_handoff_state() -> dict:
+    """
+    热重载时由新加载的模块调用，导出需要交接的运行时状态（只包含内置类型）
+    在 on_unload 之后调用，此时各组件均已停止
+    """
+    return {
+        "version": constants.HANDOFF_VERSION,
+        "storage": plugin_config.storage,
+        "data": data_manager.export_state(),
+        "tp_requests": teleport_request_manager.export_requests(),
+        "online_players": online_player_counter.get_player_list(try_query=False),
+    }
+
+
+def _take_handoff_state(prev_module: any) -> Optional[dict]:
+    get_state = getattr(prev_module, "get_handoff_state", None)
+    if get_state is None:
+        return None
+    try:
+        state = get_state()
+    except Exception as e:
+        plugin_server.logger.warning(
+            f"Failed to take over state from the previous instance: {e}"
+        )
+        return None
+    if state.get("version") != constants.HANDOFF_VERSION:
+        plugin_server.logger.info(
+            f"State version changed ({state.get('version')} -> "
+            f"{constants.HANDOFF_VERSION}), reloading SimpleTP data from storage."
+        )
+        return None
+    return state
 
 
 def on_unload(server: mcdr.PluginServerInterface):
     save_loop.stop()
+    if stats_dump_loop is not None:
+        stats_dump_loop.stop()
+        dump_stats()
+    teleport_request_manager.stop()
+    online_player_counter.close()
+    command_executor.shutdown()
+    query_pool.shutdown()
+    teleport_queue.stop()
+    completion_index.close()
+    list_cache.close()
+    spatial_index.close()
     plugin_server.logger.info("Saving SimpleTP data on unload.")
     save_data_task()
+    data_manager.storage.close()
+    if data_manager.journal is not None:
+        data_manager.journal.close()
 
 
 def on_player_joined(server: mcdr.PluginServerInterface, player: str, info: mcdr.Info):
+    player_state_cache.invalidate(player)
     online_player_counter.on_player_joined(player)
+    data_manager.preload_personal_waypoints(player)
 
 
 def on_player_left(server: mcdr.PluginServerInterface, player: str):
+    player_state_cache.invalidate(player)
+    list_cache.discard_player(player)
     online_player_counter.on_player_left(player)
+    teleport_queue.discard(player)
+    for tp_request in teleport_request_manager.remove_player_requests(player):
+        if tp_request.player == player:
+            server.tell(
+                tp_request.target_player,
+                mcdr.RText(
+                    utils.tr("tp_request.sender_left", player=player),
+                    color=constants.WARNING_COLOR,
+                ),
+            )
+        else:
+            server.tell(
+                tp_request.player,
+                mcdr.RText(
+                    utils.tr("tp_request.target_left", player=player),
+                    color=constants.WARNING_COLOR,
+                ),
+            )
 
 
 def on_server_startup(server: mcdr.PluginServerInterface):
@@ -0,0 +1,158 @@
+import threading
+from typing import Dict, List, Optional
+
+import simple_tp.constants as constants
+
+from simple_tp.data import DataManager, WaypointListener
+from simple_tp.utils import CoordWithDimension
+
+
+class _TrieNode:
+    __slots__ = ("children", "terminal")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        self.terminal = False
+
+
+class PrefixTrie:
+    """
+    按字符组织的前缀树，用于按前缀查找名称
+    """
+
+    def __init__(self):
+        self._root = _TrieNode()
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, name: str) -> bool:
+        node = self._root
+        for char in name:
+            child = node.children.get(char)
+            if child is None:
+                child = node.children[char] = _TrieNode()
+            node = child
+        if node.terminal:
+            return False
+        node.terminal = True
+        self._size += 1
+        return True
+
+    def discard(self, name: str) -> bool:
+        path = [self._root]
+        for char in name:
+            child = path[-1].children.get(char)
+            if child is None:
+                return False
+            path.append(child)
+        if not path[-1].terminal:
+            return False
+        path[-1].terminal = False
+        self._size -= 1
+        # 删除不再通向任何名称的节点
+        for index in range(len(name), 0, -1):
+            node = path[index]
+            if node.terminal or node.children:
+                break
+            del path[index - 1].children[name[index - 1]]
+        return True
+
+    def search(self, prefix: str, limit: Optional[int] = None) -> List[str]:
+        node = self._root
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return []
+        result = []
+        stack = [(node, prefix)]
+        while stack:
+            if limit is not None and len(result) >= limit:
+                break
+            node, name = stack.pop()
+            if node.terminal:
+                result.append(name)
+            for char, child in node.children.items():
+                stack.append((child, name + char))
+        return result
+
+
+class CompletionIndex(WaypointListener):
+    """
+    传送点名称的补全索引，通过 DataManager 的监听器增量更新
+    全局传送点在创建时建立索引，个人传送点在玩家首次查询时建立，玩家数据卸载时丢弃
+    """
+
+    def __init__(self, data_manager: DataManager, limit: int):
+        self.limit = limit if limit > 0 else None
+        self._data_manager = data_manager
+        self._lock = threading.Lock()
+        self._global = PrefixTrie()
+        self._personal: Dict[str, PrefixTrie] = {}
+        # 先注册监听器再建立索引，避免遗漏建立期间的修改
+        data_manager.add_listener(self)
+        data_manager.view_waypoints(None, self._build_global)
+
+    def close(self):
+        self._data_manager.remove_listener(self)
+
+    def _build_global(self, waypoints: Dict[str, CoordWithDimension]):
+        # 在全局传送点的读锁内调用
+        with self._lock:
+            for name in waypoints:
+                self._global.add(name)
+
+    def _build_personal(
+        self, player: str, waypoints: Dict[str, CoordWithDimension]
+    ) -> PrefixTrie:
+        # 在玩家传送点的读锁内调用，期间不会有修改，建立后由监听器保持同步
+        with self._lock:
+            trie = self._personal.get(player)
+            if trie is None:
+                trie = PrefixTrie()
+                for name in waypoints:
+                    if name != constants.BACK_WAYPOINT_ID:
+                        trie.add(name)
+                self._personal[player] = trie
+            return trie
+
+    def on_waypoint_changed(
+        self,
+        player: Optional[str],
+        name: str,
+        old_coord: Optional[CoordWithDimension],
+        new_coord: Optional[CoordWithDimension],
+    ):
+        if name == constants.BACK_WAYPOINT_ID:
+            return
+        with self._lock:
+            trie = self._global if player is None else self._personal.get(player)
+            # 尚未建立索引的玩家在首次查询时再读取
+            if trie is None:
+                return
+            if new_coord is None:
+                trie.discard(name)
+            else:
+                trie.add(name)
+
+    def on_player_unloaded(self, player: str):
+        with self._lock:
+            self._personal.pop(player, None)
+
+    def search(self, player: Optional[str], prefix: str) -> List[str]:
+        """
+        返回以 prefix 开头的传送点名称，最多 limit 个
+        player 为 None 时查询全局传送点
+        """
+        if player is None:
+            trie = self._global
+        else:
+            with self._lock:
+                trie = self._personal.get(player)
+            if trie is None:
+                trie = self._data_manager.view_waypoints(
+                    player, lambda waypoints: self._build_personal(player, waypoints)
+                )
+        with self._lock:
+            return trie.search(prefix, self.limit)
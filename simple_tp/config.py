@@ -17,6 +17,9 @@ class Config(mcdr.Serializable):
         personal_waypoint: int = 1
         global_waypoint: int = 2
         cross_world_tp: int = 1
+        stats: int = 3
+        bulk_tp: int = 3
+        migrate: int = 4
 
     permissions: __Permissions = __Permissions()
 
@@ -28,3 +31,19 @@ class Config(mcdr.Serializable):
 
     extra_dimensions: Dict[int, str] = {}
     easy_tp: bool = True
+    combined_position_query: bool = False
+    direct_entity_tp: bool = False
+    player_state_cache_ttl: float = 1.0  # seconds, 0 to disable
+    storage: str = "json"  # json / sharded / binary / sqlite
+    evict_idle_seconds: int = 600  # only for sharded / sqlite storage
+    journal: bool = True
+    journal_fsync: bool = False
+    worker_threads: int = 4
+    max_pending_tasks: int = 256
+    tp_request_timeout: int = 120  # seconds, 0 to never expire
+    teleports_per_tick: int = 4  # 0 for unlimited
+    max_suggestions: int = 100  # 0 for unlimited
+    list_page_size: int = 10  # 0 to disable paging
+    near_max_results: int = 20
+    stats: bool = False
+    stats_dump_interval: int = 0  # seconds, 0 to disable
@@ -1,6 +1,9 @@
 from mcdreforged.api.rtext import RColor
 
 BACK_WAYPOINT_ID = "__back__"
+NEAR_DEFAULT_COUNT = 5
+# 批量查询玩家位置时最多同时进行的查询数
+BATCH_QUERY_CONCURRENCY = 16
 
 SUCCESS_COLOR = RColor.green
 WARNING_COLOR = RColor.yellow
@@ -19,3 +22,7 @@ DIM_COLORS = [
     RColor.light_purple,  # End
     RColor.gold,  # Custom dimensions
 ]
+
+# 热重载时交接的运行时状态的格式版本，交接的数据结构发生变化时需递增
+# 新旧版本不一致时不进行交接，重新从存储中加载
+HANDOFF_VERSION = 1
@@ -1,100 +1,621 @@
-from typing import Dict, List, Union
+import sys
+import threading
+import time
+from array import array
+from dataclasses import dataclass
+from typing import (
+    TYPE_CHECKING,
+    AbstractSet,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    MutableMapping,
+    Optional,
+    Tuple,
+    TypeVar,
+    Union,
+)
 from readerwriterlock.rwlock import RWLockFair
 
-import mcdreforged.api.all as mcdr
+import simple_tp.constants as constants
 
+from simple_tp.stats import TimedRWLock
 from simple_tp.utils import CoordWithDimension
 
+if TYPE_CHECKING:
+    from simple_tp.journal import WaypointJournal
+    from simple_tp.storage import WaypointStorage
 
-class SimpleTPData(mcdr.Serializable):
-    personal_waypoints: Dict[str, Dict[str, List[Union[float, int]]]] = {}
-    global_waypoints: Dict[str, List[Union[float, int]]] = {}
-    dimension_str2sid: Dict[str, int] = {}
+_T = TypeVar("_T")
 
 
-class DataManager:
-    def __init__(self, data: SimpleTPData):
-        self._global_waypoints: Dict[str, CoordWithDimension] = {
-            name: CoordWithDimension(
-                coords[0],
-                coords[1],
-                coords[2],
-                int(coords[3]) if len(coords) > 3 else 0,
+class WaypointTable(MutableMapping[str, CoordWithDimension]):
+    """
+    紧凑的传送点表，接口与 Dict[str, CoordWithDimension] 相同
+    坐标和维度 ID 按槽位保存在 array 中，读取时才构造 CoordWithDimension，名称会被驻留
+    """
+
+    __slots__ = ("_slots", "_coords", "_dimensions", "_free")
+
+    def __init__(self, waypoints: Optional[Mapping[str, CoordWithDimension]] = None):
+        self._slots: Dict[str, int] = {}
+        # 第 i 个槽位的坐标为 _coords[3 * i : 3 * i + 3]
+        self._coords = array("d")
+        self._dimensions = array("H")
+        # 删除后空出的槽位，新增时优先复用
+        self._free: List[int] = []
+        if waypoints:
+            for name, coord in waypoints.items():
+                self[name] = coord
+
+    def _coord(self, slot: int) -> CoordWithDimension:
+        index = 3 * slot
+        coords = self._coords
+        return CoordWithDimension(
+            coords[index], coords[index + 1], coords[index + 2], self._dimensions[slot]
+        )
+
+    def __getitem__(self, name: str) -> CoordWithDimension:
+        return self._coord(self._slots[name])
+
+    def get(self, name: str, default=None):
+        slot = self._slots.get(name)
+        return default if slot is None else self._coord(slot)
+
+    def __setitem__(self, name: str, coord: CoordWithDimension):
+        slot = self._slots.get(name)
+        if slot is None:
+            if self._free:
+                slot = self._free.pop()
+            else:
+                slot = len(self._dimensions)
+                self._coords.extend((0.0, 0.0, 0.0))
+                self._dimensions.append(0)
+            self._slots[sys.intern(name)] = slot
+        index = 3 * slot
+        coords = self._coords
+        coords[index], coords[index + 1], coords[index + 2] = coord[:3]
+        self._dimensions[slot] = coord[3]
+
+    def __delitem__(self, name: str):
+        self._free.append(self._slots.pop(name))
+
+    def __contains__(self, name) -> bool:
+        return name in self._slots
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._slots)
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def rows(self) -> Iterator[Tuple[str, float, float, float, int]]:
+        """
+        依次返回 (名称, x, y, z, 维度 ID)，不构造 CoordWithDimension，用于批量序列化
+        """
+        # 一次性转换为列表比逐个读取数组元素快
+        coords = self._coords.tolist()
+        dimensions = self._dimensions.tolist()
+        for name, slot in self._slots.items():
+            index = 3 * slot
+            yield (
+                name,
+                coords[index],
+                coords[index + 1],
+                coords[index + 2],
+                dimensions[slot],
             )
-            for name, coords in data.global_waypoints.items()
+
+    def copy(self) -> "WaypointTable":
+        table = WaypointTable()
+        table._slots = self._slots.copy()
+        table._coords = self._coords[:]
+        table._dimensions = self._dimensions[:]
+        table._free = self._free.copy()
+        return table
+
+    def export_state(self) -> tuple:
+        """
+        导出内部的字典和数组，不复制数据，导出后不应再修改本对象
+        """
+        return self._slots, self._coords, self._dimensions, self._free
+
+    @classmethod
+    def from_state(cls, state: tuple) -> "WaypointTable":
+        table = cls()
+        slots, coords, dimensions, free = state
+        table._slots = slots
+        table._coords = coords
+        table._dimensions = dimensions
+        table._free = free
+        return table
+
+    def __repr__(self) -> str:
+        return f"WaypointTable({dict(self.items())!r})"
+
+
+def waypoints_from_raw(
+    raw_waypoints: Dict[str, List[Union[float, int]]],
+) -> WaypointTable:
+    table = WaypointTable()
+    slots = table._slots
+    coords = table._coords
+    dimensions = table._dimensions
+    for name, raw in raw_waypoints.items():
+        slots[sys.intern(name)] = len(dimensions)
+        coords.extend(raw[:3])
+        dimensions.append(int(raw[3]) if len(raw) > 3 else 0)
+    return table
+
+
+def waypoints_to_raw(
+    waypoints: Mapping[str, CoordWithDimension],
+) -> Dict[str, List[Union[float, int]]]:
+    if isinstance(waypoints, WaypointTable):
+        return {
+            name: [x, y, z, dimension] for name, x, y, z, dimension in waypoints.rows()
         }
-        self._personal_waypoints: Dict[str, Dict[str, CoordWithDimension]] = {}
-        for player, waypoints in data.personal_waypoints.items():
-            self._personal_waypoints[player] = {
-                name: CoordWithDimension(
-                    coords[0],
-                    coords[1],
-                    coords[2],
-                    int(coords[3]) if len(coords) > 3 else 0,
-                )
-                for name, coords in waypoints.items()
-            }
-        self.dimension_str2sid = data.dimension_str2sid
+    return {
+        name: [coord.x, coord.y, coord.z, coord.dimension]
+        for name, coord in waypoints.items()
+    }
+
+
+@dataclass
+class DataChanges:
+    generation: int
+    dimension_str2sid: Dict[str, int]
+    # 全局传送点或维度映射未变化时为 None
+    global_waypoints: Optional[WaypointTable]
+    personal_waypoints: Dict[str, WaypointTable]
+
+
+# 非按需加载模式下没有传送点的玩家读取时共用的空表，不能修改
+_EMPTY_WAYPOINTS = WaypointTable()
+
+
+class WaypointListener:
+    """
+    传送点变化的监听器，回调在对应数据的写锁内执行，应尽快返回且不能再调用 DataManager
+    """
+
+    def on_waypoint_changed(
+        self,
+        player: Optional[str],
+        name: str,
+        old_coord: Optional[CoordWithDimension],
+        new_coord: Optional[CoordWithDimension],
+    ):
+        """
+        player 为 None 表示全局传送点，old_coord 为 None 表示新增，new_coord 为 None 表示删除
+        """
+
+    def on_player_loaded(
+        self, player: Optional[str], waypoints: Mapping[str, CoordWithDimension]
+    ):
+        """
+        玩家的个人传送点被读入内存，waypoints 不能修改
+        """
+
+    def on_player_unloaded(self, player: str):
+        """
+        玩家的个人传送点被移出内存
+        """
+
+
+class DataManager:
+    # 个人传送点读写锁的数量
+    PERSONAL_LOCK_STRIPES = 64
+
+    def __init__(self, storage: "WaypointStorage", state: Optional[dict] = None):
+        """
+        state 为旧实例 export_state 的结果时直接接管其数据，不再从存储中加载
+        """
+        self._storage = storage
+        self._personal_waypoints: Dict[str, WaypointTable] = {}
+        if state is not None:
+            self.dimension_str2sid = dict(state["dimension_str2sid"])
+            self._global_waypoints = WaypointTable.from_state(state["global_waypoints"])
+            for player, table_state in state["personal_waypoints"].items():
+                self._personal_waypoints[player] = WaypointTable.from_state(table_state)
+        else:
+            self.dimension_str2sid = storage.load_dimensions()
+            self._global_waypoints = waypoints_from_raw(storage.load_global_waypoints())
         self.dimension_sid2str = {v: k for k, v in self.dimension_str2sid.items()}
-        self._global_rwlock = RWLockFair()
-        self._personal_rwlock: Dict[str, RWLockFair] = {}
-        self._personal_locks_rwlock = RWLockFair()
+        if state is None and not storage.lazy:
+            personal_waypoints = storage.load_all_personal_waypoints()
+            # 边转换边释放原始数据，避免同时保留两份完整数据
+            for player in list(personal_waypoints):
+                self._personal_waypoints[player] = waypoints_from_raw(
+                    personal_waypoints.pop(player)
+                )
+        self._last_access: Dict[str, float] = {}
+        self._global_rwlock = TimedRWLock("global")
+        # 玩家的读写锁按名称的哈希分配到固定数量的锁上：内存占用不随玩家数量增长，
+        # 且获取时无需插入新锁，同一玩家总是得到同一把锁
+        # 同一线程不能同时持有两名玩家的锁，它们可能是同一把锁
+        self._personal_locks = [
+            TimedRWLock("personal") for _ in range(self.PERSONAL_LOCK_STRIPES)
+        ]
+        # 保护 _personal_waypoints 字典本身的增删
+        self._personal_locks_rwlock = TimedRWLock("personal_table")
+
+        # 脏数据追踪：每次修改递增全局代数，并记录对应玩家（或全局传送点）最后修改时的代数
+        self._generation_lock = threading.Lock()
+        self._generation = 0
+        self._saved_generation = 0
+        self._global_generation = 0
+        self._personal_generation: Dict[str, int] = {}
+        if state is not None:
+            # 保留未保存的修改记录，接管后的第一次保存会写入这些修改
+            self._last_access = dict(state["last_access"])
+            self._generation = state["generation"]
+            self._saved_generation = state["saved_generation"]
+            self._global_generation = state["global_generation"]
+            self._personal_generation = dict(state["personal_generation"])
+
+        self.journal: Optional["WaypointJournal"] = None
+        self._listeners: List[WaypointListener] = []
+
+    @property
+    def storage(self) -> "WaypointStorage":
+        return self._storage
+
+    def _mark_dirty(self, player: Optional[str] = None):
+        # 需在对应数据的写锁内调用，保证代数与数据一致
+        with self._generation_lock:
+            self._generation += 1
+            if player is None:
+                self._global_generation = self._generation
+            else:
+                self._personal_generation[player] = self._generation
+
+    def add_listener(self, listener: WaypointListener):
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: WaypointListener):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _notify(
+        self,
+        player: Optional[str],
+        name: str,
+        old_coord: Optional[CoordWithDimension],
+        new_coord: Optional[CoordWithDimension],
+        journal: bool,
+    ):
+        # 需持有对应的写锁
+        if journal and self.journal is not None:
+            if new_coord is None:
+                self.journal.record_delete(player, name)
+            else:
+                self.journal.record_put(player, name, new_coord)
+        for listener in self._listeners:
+            listener.on_waypoint_changed(player, name, old_coord, new_coord)
+
+    def _notify_diff(
+        self,
+        player: Optional[str],
+        old_waypoints: Mapping[str, CoordWithDimension],
+        new_waypoints: Mapping[str, CoordWithDimension],
+    ):
+        for name in old_waypoints.keys() - new_waypoints.keys():
+            self._notify(player, name, old_waypoints[name], None, True)
+        for name, coord in new_waypoints.items():
+            old_coord = old_waypoints.get(name)
+            if old_coord != coord:
+                self._notify(player, name, old_coord, coord, True)
+
+    def apply_journal_record(
+        self, player: Optional[str], name: str, coord: Optional[CoordWithDimension]
+    ):
+        """
+        重放日志记录，coord 为 None 表示删除，不会再次写入日志
+        """
+        if player is None:
+            with self._global_rwlock.gen_wlock():
+                if coord is None:
+                    self._remove(None, self._global_waypoints, name, False)
+                else:
+                    self._put(None, self._global_waypoints, name, coord, True, False)
+            return
+        with self.get_personal_lock(player).gen_wlock():
+            waypoints = self._load_personal(player)
+            if coord is None:
+                self._remove(player, waypoints, name, False)
+            else:
+                self._put(player, waypoints, name, coord, True, False)
+
+    def is_dirty(self) -> bool:
+        return self._generation != self._saved_generation
+
+    def get_version(self, player: Optional[str]) -> int:
+        """
+        传送点的版本号，每次修改后增大，player 为 None 时为全局传送点
+        玩家数据卸载后版本号重新从 0 开始
+        """
+        with self._generation_lock:
+            if player is None:
+                return self._global_generation
+            return self._personal_generation.get(player, 0)
+
+    def register_dimensions(self, dimensions: Iterable[str]) -> bool:
+        with self._global_rwlock.gen_wlock():
+            changed = False
+            for dim in dimensions:
+                if dim not in self.dimension_str2sid:
+                    sid = max(self.dimension_str2sid.values(), default=-1) + 1
+                    self.dimension_str2sid[dim] = sid
+                    self.dimension_sid2str[sid] = dim
+                    changed = True
+            if changed:
+                self._mark_dirty()
+            return changed
 
     def get_personal_lock(self, player: str) -> RWLockFair:
-        with self._personal_locks_rwlock.gen_rlock():
-            if player in self._personal_rwlock:
-                return self._personal_rwlock[player]
+        return self._personal_locks[hash(player) % self.PERSONAL_LOCK_STRIPES]
 
-        lock = RWLockFair()
-        with self._personal_locks_rwlock.gen_wlock():
-            self._personal_rwlock[player] = lock
-        return lock
+    def _touch(self, player: str):
+        # 需持有玩家的锁；新增键时还需持有 _personal_locks_rwlock 的写锁，与遍历互斥
+        now = time.monotonic()
+        if player in self._last_access:
+            self._last_access[player] = now
+        else:
+            with self._personal_locks_rwlock.gen_wlock():
+                self._last_access[player] = now
 
-    def get_global_waypoints(self) -> Dict[str, CoordWithDimension]:
-        with self._global_rwlock.gen_rlock():
-            return self._global_waypoints.copy()
+    def _load_personal(self, player: str) -> WaypointTable:
+        # 需持有玩家的写锁，用于修改：玩家没有传送点时创建空表并保存
+        self._touch(player)
+        waypoints = self._personal_waypoints.get(player)
+        if waypoints is None:
+            waypoints = (
+                waypoints_from_raw(self._storage.load_personal_waypoints(player))
+                if self._storage.lazy
+                else WaypointTable()
+            )
+            with self._personal_locks_rwlock.gen_wlock():
+                self._personal_waypoints[player] = waypoints
+            for listener in self._listeners:
+                listener.on_player_loaded(player, waypoints)
+        return waypoints
 
-    def get_personal_waypoints(self, player: str) -> Dict[str, CoordWithDimension]:
+    def _get_loaded_personal(self, player: str) -> WaypointTable:
+        # 用于读取，返回的表不能修改
         lock = self.get_personal_lock(player)
         with lock.gen_rlock():
-            return self._personal_waypoints.get(player, {}).copy()
+            waypoints = self._personal_waypoints.get(player)
+            if waypoints is not None:
+                self._touch(player)
+                return waypoints
+            # 全部数据已在内存中，不存在即没有传送点，不为查询的名称保存空表
+            if not self._storage.lazy:
+                return _EMPTY_WAYPOINTS
+        with lock.gen_wlock():
+            return self._load_personal(player)
+
+    def preload_personal_waypoints(self, player: str):
+        self._get_loaded_personal(player)
+
+    def get_global_waypoints(self) -> WaypointTable:
+        with self._global_rwlock.gen_rlock():
+            return self._global_waypoints.copy()
+
+    def get_personal_waypoints(self, player: str) -> WaypointTable:
+        waypoints = self._get_loaded_personal(player)
+        with self.get_personal_lock(player).gen_rlock():
+            return waypoints.copy()
 
-    def set_global_waypoints(self, waypoints: Dict[str, CoordWithDimension]):
+    def view_waypoints(
+        self,
+        player: Optional[str],
+        func: Callable[[WaypointTable], _T],
+    ) -> _T:
+        """
+        在读锁内以传送点字典（不复制）调用 func 并返回其结果，func 不能修改字典
+        player 为 None 时为全局传送点
+        """
+        if player is None:
+            with self._global_rwlock.gen_rlock():
+                return func(self._global_waypoints)
+        waypoints = self._get_loaded_personal(player)
+        with self.get_personal_lock(player).gen_rlock():
+            return func(waypoints)
+
+    def set_global_waypoints(self, waypoints: Mapping[str, CoordWithDimension]):
+        waypoints = WaypointTable(waypoints)
         with self._global_rwlock.gen_wlock():
+            self._notify_diff(None, self._global_waypoints, waypoints)
             self._global_waypoints = waypoints
+            self._mark_dirty()
 
     def set_personal_waypoints(
-        self, player: str, waypoints: Dict[str, CoordWithDimension]
+        self, player: str, waypoints: Mapping[str, CoordWithDimension]
     ):
+        waypoints = WaypointTable(waypoints)
         lock = self.get_personal_lock(player)
         with lock.gen_wlock():
+            self._notify_diff(player, self._load_personal(player), waypoints)
             self._personal_waypoints[player] = waypoints
+            self._mark_dirty(player)
 
-    def delete_global_waypoint(self, waypoint_name: str):
-        with self._global_rwlock.gen_wlock():
-            if waypoint_name in self._global_waypoints:
-                del self._global_waypoints[waypoint_name]
+    def _put(
+        self,
+        player: Optional[str],
+        waypoints: WaypointTable,
+        name: str,
+        coord: CoordWithDimension,
+        overwrite: bool,
+        journal: bool,
+    ) -> Optional[CoordWithDimension]:
+        # 需持有对应的写锁
+        previous = waypoints.get(name)
+        if previous is not None and not overwrite:
+            return previous
+        waypoints[name] = coord
+        self._mark_dirty(player)
+        self._notify(player, name, previous, coord, journal)
+        return previous
 
-    def delete_personal_waypoint(self, player: str, waypoint_name: str):
-        lock = self.get_personal_lock(player)
-        with lock.gen_wlock():
-            if waypoint_name in self._personal_waypoints[player]:
-                del self._personal_waypoints[player][waypoint_name]
+    def _remove(
+        self,
+        player: Optional[str],
+        waypoints: WaypointTable,
+        name: str,
+        journal: bool,
+    ) -> Optional[CoordWithDimension]:
+        # 需持有对应的写锁
+        previous = waypoints.pop(name, None)
+        if previous is None:
+            return None
+        self._mark_dirty(player)
+        self._notify(player, name, previous, None, journal)
+        return previous
+
+    def get_waypoint(
+        self, player: Optional[str], name: str
+    ) -> Optional[CoordWithDimension]:
+        """
+        player 为 None 时查询全局传送点，否则查询该玩家的个人传送点
+        """
+        if player is None:
+            with self._global_rwlock.gen_rlock():
+                return self._global_waypoints.get(name)
+        waypoints = self._get_loaded_personal(player)
+        with self.get_personal_lock(player).gen_rlock():
+            return waypoints.get(name)
 
-    def get_simple_tp_data(self) -> SimpleTPData:
-        data = SimpleTPData()
+    def put_waypoint(
+        self,
+        player: Optional[str],
+        name: str,
+        coord: CoordWithDimension,
+        overwrite: bool = True,
+    ) -> Optional[CoordWithDimension]:
+        """
+        设置传送点并返回原有的坐标，overwrite 为 False 且已存在时不做修改
+        player 为 None 时操作全局传送点
+        """
+        if player is None:
+            with self._global_rwlock.gen_wlock():
+                return self._put(
+                    None, self._global_waypoints, name, coord, overwrite, True
+                )
+        with self.get_personal_lock(player).gen_wlock():
+            return self._put(
+                player, self._load_personal(player), name, coord, overwrite, True
+            )
+
+    def remove_waypoint(
+        self, player: Optional[str], name: str
+    ) -> Optional[CoordWithDimension]:
+        """
+        删除传送点并返回被删除的坐标，不存在时返回 None
+        player 为 None 时操作全局传送点
+        """
+        if player is None:
+            with self._global_rwlock.gen_wlock():
+                return self._remove(None, self._global_waypoints, name, True)
+        with self.get_personal_lock(player).gen_wlock():
+            return self._remove(player, self._load_personal(player), name, True)
+
+    def record_back(self, player: str, coord: CoordWithDimension):
+        self.put_waypoint(player, constants.BACK_WAYPOINT_ID, coord)
+
+    def get_loaded_players(self) -> List[str]:
+        with self._personal_locks_rwlock.gen_rlock():
+            return list(self._personal_waypoints.keys())
+
+    def collect_changes(self) -> Optional[DataChanges]:
+        """
+        返回自上次保存以来发生变化的数据，无变化时返回 None
+        仅复制发生变化的部分，保存成功后需调用 mark_saved
+        """
+        generation = self._generation
+        since = self._saved_generation
+        if generation == since:
+            return None
+
+        global_waypoints = None
         with self._global_rwlock.gen_rlock():
-            data.global_waypoints = {
-                name: [coord.x, coord.y, coord.z, coord.dimension]
-                for name, coord in self._global_waypoints.items()
-            }
+            dimension_str2sid = self.dimension_str2sid.copy()
+            if self._global_generation > since:
+                global_waypoints = self._global_waypoints.copy()
+
+        with self._generation_lock:
+            dirty_players = [
+                player
+                for player, player_generation in self._personal_generation.items()
+                if player_generation > since
+            ]
+        personal_waypoints = {}
+        for player in dirty_players:
+            with self.get_personal_lock(player).gen_rlock():
+                personal_waypoints[player] = self._personal_waypoints[player].copy()
+
+        return DataChanges(
+            generation, dimension_str2sid, global_waypoints, personal_waypoints
+        )
+
+    def mark_saved(self, generation: int):
+        with self._generation_lock:
+            self._saved_generation = max(self._saved_generation, generation)
+
+    def export_state(self) -> dict:
+        """
+        导出内存中的全部数据和修改记录，用于热重载时交接给新加载的模块
+        只包含内置类型，传送点表不复制数据，需在所有修改停止后调用，导出后不应再使用本对象
+        """
+        with self._global_rwlock.gen_rlock():
+            dimension_str2sid = dict(self.dimension_str2sid)
+            global_waypoints = self._global_waypoints.export_state()
         with self._personal_locks_rwlock.gen_rlock():
-            data.personal_waypoints = {
-                player: {
-                    name: [coord.x, coord.y, coord.z, coord.dimension]
-                    for name, coord in waypoints.items()
-                }
+            personal_waypoints = {
+                player: waypoints.export_state()
                 for player, waypoints in self._personal_waypoints.items()
             }
-        data.dimension_str2sid = self.dimension_str2sid
-        return data
+            last_access = dict(self._last_access)
+        with self._generation_lock:
+            return {
+                "dimension_str2sid": dimension_str2sid,
+                "global_waypoints": global_waypoints,
+                "personal_waypoints": personal_waypoints,
+                "last_access": last_access,
+                "generation": self._generation,
+                "saved_generation": self._saved_generation,
+                "global_generation": self._global_generation,
+                "personal_generation": dict(self._personal_generation),
+            }
+
+    def evict_idle_players(
+        self, online_players: AbstractSet[str], idle_seconds: float
+    ) -> int:
+        """
+        卸载长时间未访问的离线玩家的个人传送点，仅在按需加载的存储模式下生效
+        """
+        if not self._storage.lazy:
+            return 0
+        deadline = time.monotonic() - idle_seconds
+        evicted = 0
+        for player in self.get_loaded_players():
+            if player in online_players:
+                continue
+            with self.get_personal_lock(player).gen_wlock():
+                if self._last_access.get(player, 0) > deadline:
+                    continue
+                # 尚未保存的修改不能卸载
+                if self._personal_generation.get(player, 0) > self._saved_generation:
+                    continue
+                with self._personal_locks_rwlock.gen_wlock():
+                    self._personal_waypoints.pop(player, None)
+                    self._last_access.pop(player, None)
+                with self._generation_lock:
+                    self._personal_generation.pop(player, None)
+                for listener in self._listeners:
+                    listener.on_player_unloaded(player)
+            evicted += 1
+        return evicted
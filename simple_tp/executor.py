@@ -0,0 +1,145 @@
+import functools
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Hashable, List, Optional, Tuple
+
+import mcdreforged.api.all as mcdr
+
+import simple_tp
+import simple_tp.constants as constants
+import simple_tp.utils as utils
+
+# (名称, 函数, 位置参数, 关键字参数, 提交时间)
+_Task = Tuple[str, Callable, tuple, dict, float]
+
+
+class CommandExecutor:
+    """
+    固定大小的线程池，同一个 key（通常是玩家名）的任务按提交顺序依次执行
+    不同 key 之间轮流调度，排队任务数超过上限时拒绝新任务
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self.max_pending = max_pending
+        self._cond = threading.Condition()
+        self._queues: Dict[Hashable, Deque[_Task]] = {}
+        self._ready: Deque[Hashable] = deque()
+        self._pending = 0
+        self._shutdown = False
+        self._local = threading.local()
+        self._threads: List[threading.Thread] = [
+            threading.Thread(
+                target=self._worker, daemon=True, name=f"SimpleTPWorker-{i}"
+            )
+            for i in range(max(1, workers))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def submit(
+        self, key: Optional[Hashable], name: str, func: Callable, *args, **kwargs
+    ) -> bool:
+        # 在执行同一个 key 的任务的线程中再次提交时直接执行，保证顺序且不占用队列
+        if key is not None and getattr(self._local, "key", None) == key:
+            self._run(name, func, args, kwargs)
+            return True
+        if key is None:
+            key = object()
+        with self._cond:
+            if self._shutdown or self._pending >= self.max_pending:
+                simple_tp.stats_collector.incr("executor.rejected")
+                return False
+            queue = self._queues.get(key)
+            if queue is None:
+                queue = self._queues[key] = deque()
+                self._ready.append(key)
+                self._cond.notify()
+            queue.append((name, func, args, kwargs, time.perf_counter()))
+            self._pending += 1
+        return True
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._ready and not self._shutdown:
+                    self._cond.wait()
+                if not self._ready:
+                    return
+                key = self._ready.popleft()
+                name, func, args, kwargs, submitted_at = self._queues[key].popleft()
+
+            simple_tp.stats_collector.record(
+                "executor.queue_wait", time.perf_counter() - submitted_at
+            )
+            self._local.key = key
+            try:
+                self._run(name, func, args, kwargs)
+            finally:
+                self._local.key = None
+
+            with self._cond:
+                self._pending -= 1
+                if self._queues[key]:
+                    # 放回队尾，让其他玩家的任务先执行
+                    self._ready.append(key)
+                    self._cond.notify()
+                else:
+                    del self._queues[key]
+
+    @staticmethod
+    def _run(name: str, func: Callable, args: tuple, kwargs: dict):
+        try:
+            with simple_tp.stats_collector.timed("command." + name):
+                func(*args, **kwargs)
+        except Exception:
+            simple_tp.plugin_server.logger.exception(f"Error running task {name}")
+
+    def shutdown(self, timeout: float = 5):
+        """
+        停止接收新任务，等待已提交的任务执行完毕
+        """
+        with self._cond:
+            self._shutdown = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join(timeout)
+
+
+def _default_task_key(*args, **kwargs) -> Optional[str]:
+    if args and isinstance(args[0], mcdr.PlayerCommandSource):
+        return args[0].player
+    return None
+
+
+def player_task(
+    name: str, key_getter: Callable[..., Optional[Hashable]] = _default_task_key
+):
+    """
+    替代 mcdr.new_thread，将函数调用提交到插件的线程池中执行
+    key_getter 从调用参数中取得串行执行的 key，默认为命令执行者的玩家名
+    """
+
+    def decorator(func: Callable) -> Callable[..., None]:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs) -> None:
+            if simple_tp.command_executor.submit(
+                key_getter(*args, **kwargs), name, func, *args, **kwargs
+            ):
+                return
+            simple_tp.plugin_server.logger.warning(
+                f"Task queue is full, dropping task {name}"
+            )
+            if args and isinstance(args[0], mcdr.CommandSource):
+                args[0].reply(
+                    mcdr.RText(utils.tr("server_busy"), color=constants.ERROR_COLOR)
+                )
+
+        return wrapper
+
+    return decorator
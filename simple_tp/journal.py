@@ -0,0 +1,132 @@
+import json
+import os
+import threading
+from typing import TYPE_CHECKING, Optional, TextIO
+
+import simple_tp
+
+from simple_tp.utils import CoordWithDimension
+
+if TYPE_CHECKING:
+    from simple_tp.data import DataManager
+
+
+class WaypointJournal:
+    """
+    传送点修改的追加式日志，每行一条 JSON 记录：
+    {"p": 玩家名（全局传送点为 null）, "n": 传送点名, "c": [x, y, z, dim]}，不含 "c" 表示删除
+    保存快照前先轮换日志，快照写入成功后再删除旧日志，崩溃后可通过重放恢复
+    """
+
+    def __init__(self, path: str, fsync: bool = False):
+        self.path = path
+        self.rotated_path = path + ".old"
+        self.fsync = fsync
+        self._file: Optional[TextIO] = None
+        self._lock = threading.Lock()
+
+    def open(self):
+        with self._lock:
+            if self._file is not None:
+                return
+            # 上次崩溃时最后一行可能不完整，补上换行避免与新记录粘连
+            needs_newline = False
+            if os.path.isfile(self.path) and os.path.getsize(self.path) > 0:
+                with open(self.path, "rb") as f:
+                    f.seek(-1, os.SEEK_END)
+                    needs_newline = f.read(1) != b"\n"
+            self._file = open(self.path, "a", encoding="utf8")
+            if needs_newline:
+                self._file.write("\n")
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _write(self, record: dict):
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(line)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+
+    def record_put(self, player: Optional[str], name: str, coord: CoordWithDimension):
+        self._write(
+            {
+                "p": player,
+                "n": name,
+                "c": [coord.x, coord.y, coord.z, coord.dimension],
+            }
+        )
+
+    def record_delete(self, player: Optional[str], name: str):
+        self._write({"p": player, "n": name})
+
+    def replay(self, data_manager: "DataManager") -> int:
+        count = 0
+        for path in (self.rotated_path, self.path):
+            if not os.path.isfile(path):
+                continue
+            with open(path, "r", encoding="utf8") as f:
+                for line_no, line in enumerate(f, 1):
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        record = json.loads(line)
+                        coords = record.get("c")
+                        coord = (
+                            CoordWithDimension(
+                                coords[0], coords[1], coords[2], int(coords[3])
+                            )
+                            if coords is not None
+                            else None
+                        )
+                        data_manager.apply_journal_record(
+                            record["p"], record["n"], coord
+                        )
+                    except Exception as e:
+                        # 崩溃时最后一行可能只写了一半，跳过即可
+                        simple_tp.plugin_server.logger.warning(
+                            f"Skipping broken journal record at {path}:{line_no}: {e}"
+                        )
+                        continue
+                    count += 1
+        return count
+
+    def rotate(self):
+        """
+        将当前日志转为旧日志，之后的修改写入新日志
+        若上一次的旧日志尚未删除（快照保存失败），则将当前日志追加到旧日志之后
+        """
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.close()
+            if os.path.isfile(self.rotated_path):
+                with open(self.rotated_path, "a", encoding="utf8") as rotated:
+                    with open(self.path, "r", encoding="utf8") as current:
+                        for line in current:
+                            rotated.write(line)
+            else:
+                os.replace(self.path, self.rotated_path)
+            self._file = open(self.path, "w", encoding="utf8")
+
+    def discard_rotated(self):
+        with self._lock:
+            if os.path.isfile(self.rotated_path):
+                os.remove(self.rotated_path)
+
+    def discard(self):
+        """
+        删除当前日志和旧日志，仅在日志未打开时使用
+        """
+        with self._lock:
+            for path in (self.rotated_path, self.path):
+                if os.path.isfile(path):
+                    os.remove(path)
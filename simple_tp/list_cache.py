@@ -0,0 +1,74 @@
+import threading
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+import mcdreforged.api.all as mcdr
+
+from simple_tp.data import DataManager, WaypointListener
+from simple_tp.utils import CoordWithDimension
+
+# (维度 sid, 渲染好的一行)
+RenderedLine = Tuple[int, mcdr.RTextBase]
+
+
+class WaypointListCache(WaypointListener):
+    """
+    list 命令渲染结果的缓存，按 (玩家, 渲染变体) 存放，传送点版本号变化后重新渲染
+    玩家数据卸载或玩家离开时丢弃其个人传送点的缓存
+    """
+
+    def __init__(self, data_manager: DataManager):
+        self._data_manager = data_manager
+        self._lock = threading.Lock()
+        self._entries: Dict[
+            Tuple[Optional[str], Hashable], Tuple[int, List[RenderedLine]]
+        ] = {}
+        data_manager.add_listener(self)
+
+    def close(self):
+        self._data_manager.remove_listener(self)
+
+    def get_lines(
+        self,
+        player: Optional[str],
+        variant: Hashable,
+        render: Callable[[str, CoordWithDimension], Optional[RenderedLine]],
+    ) -> List[RenderedLine]:
+        """
+        返回渲染好的传送点列表，player 为 None 时为全局传送点
+        variant 区分同一份数据的不同渲染方式（如是否显示按钮），缓存失效时对每个传送点调用 render
+        render 返回 None 的传送点不显示
+        """
+        key = (player, variant)
+        version = self._data_manager.get_version(player)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+
+        # 在读锁内同时取得版本号和数据，保证二者一致，渲染在锁外进行
+        version, waypoints = self._data_manager.view_waypoints(
+            player,
+            lambda waypoints: (
+                self._data_manager.get_version(player),
+                waypoints.copy(),
+            ),
+        )
+        lines = [
+            line
+            for line in (render(name, coord) for name, coord in waypoints.items())
+            if line is not None
+        ]
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= version:
+                self._entries[key] = (version, lines)
+        return lines
+
+    def discard_player(self, player: str):
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == player]:
+                del self._entries[key]
+
+    def on_player_unloaded(self, player: str):
+        # 卸载后版本号会重新计数，必须丢弃旧缓存
+        self.discard_player(player)
@@ -1,28 +1,132 @@
+import bisect
 import threading
-from typing import List, Optional, Set
+from typing import Dict, FrozenSet, List, NamedTuple, Optional, Tuple
 import minecraft_data_api as mc_data_api
-from readerwriterlock.rwlock import RWLockFair
 import simple_tp
 
 
+class _PlayerSnapshot(NamedTuple):
+    players: FrozenSet[str]
+    # 小写名 -> 实际名
+    lower_index: Dict[str, str]
+    # 排序后的小写名，用于前缀搜索
+    sorted_lower: List[str]
+
+    @classmethod
+    def build(cls, players: FrozenSet[str]) -> "_PlayerSnapshot":
+        lower_index = {player.lower(): player for player in sorted(players)}
+        return cls(players, lower_index, sorted(lower_index))
+
+    def add(self, player: str) -> "_PlayerSnapshot":
+        lower_name = player.lower()
+        lower_index = self.lower_index.copy()
+        sorted_lower = self.sorted_lower
+        if lower_name not in lower_index:
+            sorted_lower = sorted_lower.copy()
+            bisect.insort(sorted_lower, lower_name)
+        lower_index[lower_name] = player
+        return _PlayerSnapshot(self.players | {player}, lower_index, sorted_lower)
+
+    def remove(self, player: str) -> "_PlayerSnapshot":
+        players = self.players - {player}
+        lower_name = player.lower()
+        lower_index = self.lower_index.copy()
+        sorted_lower = self.sorted_lower
+        # 可能存在仅大小写不同的其他玩家
+        other = next((p for p in players if p.lower() == lower_name), None)
+        if other is not None:
+            lower_index[lower_name] = other
+        else:
+            lower_index.pop(lower_name, None)
+            sorted_lower = sorted_lower.copy()
+            index = bisect.bisect_left(sorted_lower, lower_name)
+            if index < len(sorted_lower) and sorted_lower[index] == lower_name:
+                del sorted_lower[index]
+        return _PlayerSnapshot(players, lower_index, sorted_lower)
+
+
 class OnlinePlayerCounter:
+    # 数据不一致时的刷新延迟（秒），期间的多次刷新请求会被合并
+    REFRESH_DEBOUNCE = 1.0
+
     def __init__(self):
-        self._players: Optional[Set[str]] = None
-        self.lock = RWLockFair()
+        # 不可变快照，读取时无需加锁，修改时整体替换
+        self._snapshot: Optional[_PlayerSnapshot] = None
+        self._lock = threading.Lock()
+        # 正在进行的查询，其他线程等待其完成而不是重复查询
+        self._query_done: Optional[threading.Event] = None
+        # 查询期间发生的加入/离开事件，查询完成后在结果上重放
+        self._pending_events: List[Tuple[bool, str]] = []
+        self._refresh_timer: Optional[threading.Timer] = None
 
     def query_players(self, rewrite: bool = False):
+        with self._lock:
+            if self._snapshot is not None and not rewrite:
+                return
+            query_done = self._query_done
+            if query_done is None:
+                query_done = self._query_done = threading.Event()
+                self._pending_events = []
+                is_leader = True
+            else:
+                is_leader = False
+        if not is_leader:
+            query_done.wait()
+            return
+
         try:
-            with self.lock.gen_wlock():
-                # 防止重复查询
-                if self._players is not None and not rewrite:
-                    return
+            with simple_tp.stats_collector.timed("data_api.get_server_player_list"):
                 player_list = mc_data_api.get_server_player_list().players
-                self._players = set(player_list)
-                simple_tp.plugin_server.logger.info(
-                    f"Queried online players successfully: {player_list}"
-                )
         except Exception as e:
             simple_tp.plugin_server.logger.error(f"Error getting player list: {e}")
+            with self._lock:
+                self._query_done = None
+            query_done.set()
+            return
+
+        players = set(player_list)
+        with self._lock:
+            for joined, player in self._pending_events:
+                if joined:
+                    players.add(player)
+                else:
+                    players.discard(player)
+            self._pending_events = []
+            self._snapshot = _PlayerSnapshot.build(frozenset(players))
+            self._query_done = None
+        query_done.set()
+        simple_tp.plugin_server.logger.info(
+            f"Queried online players successfully: {player_list}"
+        )
+
+    def restore(self, players: FrozenSet[str]):
+        """
+        使用旧实例的在线玩家列表，热重载时无需重新查询
+        """
+        with self._lock:
+            self._snapshot = _PlayerSnapshot.build(frozenset(players))
+
+    def request_refresh(self):
+        with self._lock:
+            if self._refresh_timer is not None:
+                return
+            self._refresh_timer = threading.Timer(
+                self.REFRESH_DEBOUNCE, self._debounced_refresh
+            )
+            self._refresh_timer.daemon = True
+            self._refresh_timer.name = "OnlinePlayersRefresh"
+            self._refresh_timer.start()
+
+    def _debounced_refresh(self):
+        with self._lock:
+            self._refresh_timer = None
+        self.query_players(rewrite=True)
+
+    def close(self):
+        with self._lock:
+            if self._refresh_timer is not None:
+                self._refresh_timer.cancel()
+                self._refresh_timer = None
 
     def on_server_startup(self):
         threading.Thread(
@@ -32,48 +136,78 @@ class OnlinePlayerCounter:
             name="OnlinePlayersInit",
         ).start()
 
-    def get_player_list(self, try_query: bool = True) -> Optional[List[str]]:
-        with self.lock.gen_rlock():
-            if self._players is not None:
-                return list(self._players)
-        if not try_query:
-            return None
+    def _get_snapshot(self, try_query: bool) -> Optional[_PlayerSnapshot]:
+        snapshot = self._snapshot
+        if snapshot is not None or not try_query:
+            return snapshot
         self.query_players()
-        with self.lock.gen_rlock():
-            if self._players is not None:
-                return list(self._players)
-        return None
+        return self._snapshot
+
+    def get_player_list(self, try_query: bool = True) -> Optional[FrozenSet[str]]:
+        snapshot = self._get_snapshot(try_query)
+        return snapshot.players if snapshot is not None else None
+
+    def search_player(
+        self, name: str, ignore_case: bool = True, try_query: bool = True
+    ) -> Optional[str]:
+        """
+        返回在线玩家的实际名称，不在线时返回 None
+        """
+        snapshot = self._get_snapshot(try_query)
+        if snapshot is None:
+            return None
+        if name in snapshot.players:
+            return name
+        if not ignore_case:
+            return None
+        return snapshot.lower_index.get(name.lower())
+
+    def search_prefix(
+        self, prefix: str, limit: Optional[int] = None, try_query: bool = False
+    ) -> List[str]:
+        """
+        返回名称以 prefix 开头（忽略大小写）的在线玩家
+        """
+        snapshot = self._get_snapshot(try_query)
+        if snapshot is None:
+            return []
+        lower_prefix = prefix.lower()
+        sorted_lower = snapshot.sorted_lower
+        result = []
+        index = bisect.bisect_left(sorted_lower, lower_prefix)
+        while index < len(sorted_lower) and sorted_lower[index].startswith(
+            lower_prefix
+        ):
+            if limit is not None and len(result) >= limit:
+                break
+            result.append(snapshot.lower_index[sorted_lower[index]])
+            index += 1
+        return result
 
     def on_player_joined(self, player: str):
-        with self.lock.gen_wlock():
-            if self._players is None:
+        with self._lock:
+            if self._query_done is not None:
+                self._pending_events.append((True, player))
+            if self._snapshot is None:
                 return
-            if player in self._players:
-                simple_tp.plugin_server.logger.warning(
-                    f"Player {player} already in online players set when joining, data may be inconsistent, refreshing..."
-                )
-                threading.Thread(
-                    target=self.query_players,
-                    kwargs={"rewrite": True},
-                    daemon=True,
-                    name="OnlinePlayersRefresh",
-                ).start()
+            if player not in self._snapshot.players:
+                self._snapshot = self._snapshot.add(player)
                 return
-            self._players.add(player)
+        simple_tp.plugin_server.logger.warning(
+            f"Player {player} already in online players set when joining, data may be inconsistent, refreshing..."
+        )
+        self.request_refresh()
 
     def on_player_left(self, player: str):
-        with self.lock.gen_wlock():
-            if self._players is None:
+        with self._lock:
+            if self._query_done is not None:
+                self._pending_events.append((False, player))
+            if self._snapshot is None:
+                return
+            if player in self._snapshot.players:
+                self._snapshot = self._snapshot.remove(player)
                 return
-            try:
-                self._players.remove(player)
-            except KeyError:
-                simple_tp.plugin_server.logger.warning(
-                    f"Player {player} not in online players set when leaving, data may be inconsistent, refreshing..."
-                )
-                threading.Thread(
-                    target=self.query_players,
-                    kwargs={"rewrite": True},
-                    daemon=True,
-                    name="OnlinePlayersRefresh",
-                ).start()
+        simple_tp.plugin_server.logger.warning(
+            f"Player {player} not in online players set when leaving, data may be inconsistent, refreshing..."
+        )
+        self.request_refresh()
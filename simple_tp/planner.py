@@ -0,0 +1,166 @@
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Tuple
+
+import mcdreforged.api.all as mcdr
+
+import simple_tp
+import simple_tp.constants as constants
+import simple_tp.utils as utils
+from simple_tp.utils import CoordWithDimension
+
+
+@dataclass(frozen=True)
+class TeleportPlan:
+    main_body: str  # 命令执行者，按其权限检查，错误信息发送给他
+    player: str  # 被传送者
+    player_dim: str
+    # 被传送者当前的位置，不记录返回点时为 None
+    player_coord: Optional[CoordWithDimension]
+    # 直接传送到目标玩家时为 None，此时不查询目标玩家的位置
+    target_coord: Optional[CoordWithDimension]
+    target_player: Optional[str]
+
+
+def _failure_key(prefix: str, player: str, main_body: str) -> str:
+    return prefix + ("you" if player == main_body else "other")
+
+
+def plan_teleport(
+    main_body: str,
+    player: Optional[str] = None,
+    target_player: Optional[str] = None,
+    target_coord: Optional[CoordWithDimension] = None,
+    record_back: bool = True,
+) -> Optional[TeleportPlan]:
+    """
+    预先确定一次传送所需的全部信息：在线状态、双方的位置和维度、跨维度权限
+    每项信息只获取一次，需要查询服务器的信息并发查询
+    target_player 和 target_coord 只能提供一个，player 为 None 时传送命令执行者
+    开启 direct_entity_tp 时传送到玩家不查询目标玩家的位置，目标维度取自缓存，
+    缓存中没有时与其他信息一同并发查询，目标维度总会被检查
+    检查不通过时告知命令执行者并返回 None
+    """
+    assert (target_player is None) != (target_coord is None), (
+        "Exactly one of target_player and target_coord must be provided."
+    )
+    if player is None:
+        player = main_body
+
+    def reply_error(msg: str):
+        simple_tp.plugin_server.tell(
+            main_body, mcdr.RText(msg, color=constants.ERROR_COLOR)
+        )
+
+    # 在线状态：命令执行者之外的玩家均从同一个在线玩家快照中查找
+    online_player_counter = simple_tp.online_player_counter
+    names = [player] if target_player is None else [player, target_player]
+    if any(name != main_body for name in names):
+        if online_player_counter.get_player_list() is None:
+            reply_error(utils.tr("api.failed_get_player_list"))
+            return None
+        for index, name in enumerate(names):
+            if name == main_body:
+                continue
+            online_name = online_player_counter.search_player(name)
+            if online_name is None:
+                reply_error(utils.tr("player_not_online", player=name))
+                return None
+            names[index] = online_name
+    player = names[0]
+    if target_player is not None:
+        target_player = names[1]
+
+    # 位置和维度：记录返回点时查询被传送者的位置（同时得到维度），否则只查询维度
+    queries: Dict[Tuple[str, str], Callable] = {}
+    if record_back:
+        queries[("position", player)] = lambda: utils.get_player_position(player)
+    else:
+        queries[("dimension", player)] = lambda: utils.get_player_dimension(player)
+    direct = target_player is not None and simple_tp.plugin_config.direct_entity_tp
+    cross_world = utils.check_permission(
+        main_body, simple_tp.plugin_config.permissions.cross_world_tp
+    )
+    target_dim: Optional[str] = None
+    if direct:
+        target_dim = simple_tp.player_state_cache.get_dimension(target_player)
+        if target_dim is None:
+            queries[("dimension", target_player)] = lambda: utils.get_player_dimension(
+                target_player
+            )
+    elif target_player is not None:
+        queries[("position", target_player)] = lambda: utils.get_player_position(
+            target_player
+        )
+    results = utils.run_concurrently(queries)
+
+    player_coord = None
+    if record_back:
+        player_coord = results[("position", player)]
+        if player_coord is None:
+            reply_error(
+                utils.tr(
+                    _failure_key("api.failed_get_position.", player, main_body),
+                    player=player,
+                )
+            )
+            return None
+        player_dim = simple_tp.data_manager.dimension_sid2str[player_coord.dimension]
+    else:
+        player_dim = results[("dimension", player)]
+        if player_dim is None:
+            reply_error(
+                utils.tr(
+                    _failure_key("api.failed_get_dimension.", player, main_body),
+                    player=player,
+                )
+            )
+            return None
+    if ("dimension", target_player) in results:
+        target_dim = results[("dimension", target_player)]
+        if target_dim is None:
+            reply_error(
+                utils.tr(
+                    _failure_key("api.failed_get_dimension.", target_player, main_body),
+                    player=target_player,
+                )
+            )
+            return None
+    elif ("position", target_player) in results:
+        target_coord = results[("position", target_player)]
+        if target_coord is None:
+            reply_error(
+                utils.tr(
+                    _failure_key("api.failed_get_position.", target_player, main_body),
+                    player=target_player,
+                )
+            )
+            return None
+    if target_coord is not None:
+        target_dim = simple_tp.data_manager.dimension_sid2str[target_coord.dimension]
+
+    worlds = simple_tp.plugin_config.worlds
+    if player_dim not in worlds:
+        reply_error(
+            utils.tr(
+                _failure_key("config.dim_not_allowed.", player, main_body),
+                player=player,
+                dim=player_dim,
+            )
+        )
+        return None
+    if target_dim not in worlds:
+        reply_error(utils.tr("config.dim_not_allowed.target", dim=target_dim))
+        return None
+    if player_dim != target_dim and not cross_world:
+        reply_error(
+            utils.tr(
+                "no_permission.cross_dim_tp.you",
+                source_dim=player_dim,
+                target_dim=target_dim,
+            )
+        )
+        return None
+
+    return TeleportPlan(
+        main_body, player, player_dim, player_coord, target_coord, target_player
+    )
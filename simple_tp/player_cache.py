@@ -0,0 +1,94 @@
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from simple_tp.utils import CoordWithDimension
+
+
+@dataclass
+class _PlayerState:
+    position: Optional[CoordWithDimension]
+    dimension: Optional[str]
+    expire_at: float
+
+
+class PlayerStateCache:
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._states: Dict[str, _PlayerState] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def _get_state(self, player: str) -> Optional[_PlayerState]:
+        state = self._states.get(player)
+        if state is not None and state.expire_at <= time.monotonic():
+            del self._states[player]
+            return None
+        return state
+
+    def get_position(self, player: str) -> Optional[CoordWithDimension]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            state = self._get_state(player)
+            if state is None or state.position is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return state.position
+
+    def get_dimension(self, player: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            state = self._get_state(player)
+            if state is None or state.dimension is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return state.dimension
+
+    def put_position(self, player: str, position: CoordWithDimension, dimension: str):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._states[player] = _PlayerState(
+                position, dimension, time.monotonic() + self.ttl
+            )
+
+    def put_dimension(self, player: str, dimension: str):
+        if not self.enabled:
+            return
+        with self._lock:
+            state = self._get_state(player)
+            if state is not None:
+                # 只更新维度，保留原有的过期时间；维度变化时坐标已失效
+                if state.dimension != dimension:
+                    state.position = None
+                state.dimension = dimension
+                return
+            self._states[player] = _PlayerState(
+                None, dimension, time.monotonic() + self.ttl
+            )
+
+    def invalidate(self, player: str):
+        with self._lock:
+            self._states.pop(player, None)
+
+    def clear(self):
+        with self._lock:
+            self._states.clear()
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._states),
+            }
@@ -0,0 +1,269 @@
+import heapq
+import math
+import threading
+from typing import (
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
+
+import simple_tp.constants as constants
+
+from simple_tp.data import DataManager, WaypointListener
+from simple_tp.utils import CoordWithDimension
+
+
+class NearbyWaypoint(NamedTuple):
+    distance: float
+    owner: Optional[str]  # None 表示全局传送点
+    name: str
+    coord: CoordWithDimension
+
+
+def _distance(coord: CoordWithDimension, x: float, y: float, z: float) -> float:
+    return math.sqrt((coord.x - x) ** 2 + (coord.y - y) ** 2 + (coord.z - z) ** 2)
+
+
+Waypoints = Mapping[str, CoordWithDimension]
+_Candidate = Tuple[float, str, CoordWithDimension]
+
+
+class _Grid:
+    """
+    同一维度内按 x/z 划分的均匀网格，每个格子只保存其中的传送点名称列表
+    坐标在查询时从 DataManager 的传送点表中读取，不额外保存一份
+    格子通常很小，用列表比集合占用的内存少得多
+    """
+
+    def __init__(self, cell_size: float):
+        self.cell_size = cell_size
+        self.cells: Dict[Tuple[int, int], List[str]] = {}
+        self.size = 0
+
+    def _cell_of(self, x: float, z: float) -> Tuple[int, int]:
+        return math.floor(x / self.cell_size), math.floor(z / self.cell_size)
+
+    def add(self, name: str, coord: CoordWithDimension):
+        key = self._cell_of(coord.x, coord.z)
+        cell = self.cells.get(key)
+        if cell is None:
+            self.cells[key] = [name]
+        elif name not in cell:
+            cell.append(name)
+        else:
+            return
+        self.size += 1
+
+    def remove(self, name: str, coord: CoordWithDimension):
+        key = self._cell_of(coord.x, coord.z)
+        cell = self.cells.get(key)
+        if cell is None or name not in cell:
+            return
+        cell.remove(name)
+        self.size -= 1
+        if not cell:
+            del self.cells[key]
+
+    def _ring(self, cx: int, cz: int, r: int) -> Iterator[List[str]]:
+        if r == 0:
+            cell = self.cells.get((cx, cz))
+            if cell is not None:
+                yield cell
+            return
+        for dx in range(-r, r + 1):
+            for dz in (-r, r) if abs(dx) != r else range(-r, r + 1):
+                cell = self.cells.get((cx + dx, cz + dz))
+                if cell is not None:
+                    yield cell
+
+    def nearest(
+        self, waypoints: Waypoints, x: float, y: float, z: float, k: int
+    ) -> List[_Candidate]:
+        """
+        返回距离最近的 k 个传送点，按距离升序排列，坐标从 waypoints 中读取
+        由内向外逐圈扫描格子，已找到 k 个且第 k 个不比未扫描的格子更远时停止
+        """
+        if k <= 0 or not self.cells:
+            return []
+        # 大顶堆，保存目前最近的 k 个
+        heap: List[_Candidate] = []
+
+        def consider(cell: List[str]):
+            for name in cell:
+                coord = waypoints[name]
+                distance = _distance(coord, x, y, z)
+                if len(heap) < k:
+                    heapq.heappush(heap, (-distance, name, coord))
+                elif distance < -heap[0][0]:
+                    heapq.heapreplace(heap, (-distance, name, coord))
+
+        cx, cz = self._cell_of(x, z)
+        r = 0
+        while True:
+            # 圈内格子数超过非空格子数时，直接遍历剩余的非空格子更快
+            if 8 * r > len(self.cells):
+                for (gx, gz), cell in self.cells.items():
+                    if max(abs(gx - cx), abs(gz - cz)) >= r:
+                        consider(cell)
+                break
+            for cell in self._ring(cx, cz, r):
+                consider(cell)
+            # 第 r + 1 圈之外的格子与查询点的水平距离至少为 r 个格子
+            if len(heap) == k and -heap[0][0] <= r * self.cell_size:
+                break
+            r += 1
+        return sorted((-d, name, coord) for d, name, coord in heap)
+
+    def within(
+        self, waypoints: Waypoints, x: float, y: float, z: float, radius: float
+    ) -> List[_Candidate]:
+        """
+        返回距离不超过 radius 的所有传送点，按距离升序排列，坐标从 waypoints 中读取
+        """
+        (min_cx, min_cz), (max_cx, max_cz) = (
+            self._cell_of(x - radius, z - radius),
+            self._cell_of(x + radius, z + radius),
+        )
+        if (max_cx - min_cx + 1) * (max_cz - min_cz + 1) > len(self.cells):
+            cells = [
+                cell
+                for (gx, gz), cell in self.cells.items()
+                if min_cx <= gx <= max_cx and min_cz <= gz <= max_cz
+            ]
+        else:
+            cells = [
+                self.cells[(gx, gz)]
+                for gx in range(min_cx, max_cx + 1)
+                for gz in range(min_cz, max_cz + 1)
+                if (gx, gz) in self.cells
+            ]
+        result = []
+        for cell in cells:
+            for name in cell:
+                coord = waypoints[name]
+                distance = _distance(coord, x, y, z)
+                if distance <= radius:
+                    result.append((distance, name, coord))
+        result.sort()
+        return result
+
+
+class SpatialIndex(WaypointListener):
+    """
+    全局传送点和已加载的个人传送点的空间索引，每个 (所有者, 维度) 一个网格
+    通过 DataManager 的监听器增量更新
+    """
+
+    CELL_SIZE = 64
+
+    def __init__(self, data_manager: DataManager):
+        self._data_manager = data_manager
+        self._lock = threading.Lock()
+        self._grids: Dict[Tuple[Optional[str], int], _Grid] = {}
+        # 先注册监听器再建立索引，避免遗漏建立期间的修改
+        data_manager.add_listener(self)
+        data_manager.view_waypoints(
+            None, lambda waypoints: self.on_player_loaded(None, waypoints)
+        )
+        for player in data_manager.get_loaded_players():
+            data_manager.view_waypoints(
+                player, lambda waypoints: self.on_player_loaded(player, waypoints)
+            )
+
+    def close(self):
+        self._data_manager.remove_listener(self)
+
+    def _add(self, owner: Optional[str], name: str, coord: CoordWithDimension):
+        # 需持有 self._lock
+        grid = self._grids.get((owner, coord.dimension))
+        if grid is None:
+            grid = self._grids[(owner, coord.dimension)] = _Grid(self.CELL_SIZE)
+        grid.add(name, coord)
+
+    def _remove(self, owner: Optional[str], name: str, coord: CoordWithDimension):
+        # 需持有 self._lock
+        grid = self._grids.get((owner, coord.dimension))
+        if grid is None:
+            return
+        grid.remove(name, coord)
+        if grid.size == 0:
+            del self._grids[(owner, coord.dimension)]
+
+    def on_player_loaded(self, player: Optional[str], waypoints: Waypoints):
+        with self._lock:
+            for name, coord in waypoints.items():
+                if name != constants.BACK_WAYPOINT_ID:
+                    self._add(player, name, coord)
+
+    def on_waypoint_changed(
+        self,
+        player: Optional[str],
+        name: str,
+        old_coord: Optional[CoordWithDimension],
+        new_coord: Optional[CoordWithDimension],
+    ):
+        if name == constants.BACK_WAYPOINT_ID:
+            return
+        with self._lock:
+            if old_coord is not None:
+                self._remove(player, name, old_coord)
+            if new_coord is not None:
+                self._add(player, name, new_coord)
+
+    def on_player_unloaded(self, player: str):
+        with self._lock:
+            for key in [key for key in self._grids if key[0] == player]:
+                del self._grids[key]
+
+    def _query(
+        self,
+        player: Optional[str],
+        dimension: int,
+        query: Callable[[_Grid, Waypoints], List[_Candidate]],
+    ) -> List[NearbyWaypoint]:
+        # 先取得 DataManager 的读锁再取得自身的锁，与监听器回调的加锁顺序一致
+        result = []
+        for owner in (None, player) if player is not None else (None,):
+
+            def run(waypoints: Waypoints) -> List[_Candidate]:
+                with self._lock:
+                    grid = self._grids.get((owner, dimension))
+                    return query(grid, waypoints) if grid is not None else []
+
+            for distance, name, coord in self._data_manager.view_waypoints(owner, run):
+                result.append(NearbyWaypoint(distance, owner, name, coord))
+        result.sort(key=lambda item: item.distance)
+        return result
+
+    def nearest(
+        self, player: Optional[str], coord: CoordWithDimension, k: int
+    ) -> List[NearbyWaypoint]:
+        """
+        返回与 coord 同一维度中距离最近的 k 个全局传送点及 player 的个人传送点
+        """
+        return self._query(
+            player,
+            coord.dimension,
+            lambda grid, waypoints: grid.nearest(
+                waypoints, coord.x, coord.y, coord.z, k
+            ),
+        )[:k]
+
+    def within(
+        self, player: Optional[str], coord: CoordWithDimension, radius: float
+    ) -> List[NearbyWaypoint]:
+        """
+        返回与 coord 同一维度中距离不超过 radius 的全局传送点及 player 的个人传送点
+        """
+        return self._query(
+            player,
+            coord.dimension,
+            lambda grid, waypoints: grid.within(
+                waypoints, coord.x, coord.y, coord.z, radius
+            ),
+        )
@@ -0,0 +1,234 @@
+import bisect
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from readerwriterlock.rwlock import RWLockFair
+
+import simple_tp
+
+# 直方图各桶的上界（毫秒），最后一个桶收集所有更慢的记录
+BUCKET_BOUNDS_MS = (
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    25,
+    50,
+    100,
+    250,
+    500,
+    1000,
+    2500,
+    5000,
+)
+
+
+class Histogram:
+    """
+    固定分桶的耗时直方图，分位数取所在桶的上界
+    """
+
+    __slots__ = ("buckets", "count", "total", "max")
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKET_BOUNDS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, milliseconds: float):
+        self.buckets[bisect.bisect_left(BUCKET_BOUNDS_MS, milliseconds)] += 1
+        self.count += 1
+        self.total += milliseconds
+        if milliseconds > self.max:
+            self.max = milliseconds
+
+    def percentile(self, q: float) -> float:
+        target = q * self.count
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= target and count:
+                return (
+                    BUCKET_BOUNDS_MS[index]
+                    if index < len(BUCKET_BOUNDS_MS)
+                    else self.max
+                )
+        return 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "mean_ms": self.total / self.count if self.count else 0.0,
+            "p50_ms": self.percentile(0.5),
+            "p99_ms": self.percentile(0.99),
+            "max_ms": self.max,
+            "buckets": {
+                (f"<={bound}" if index < len(BUCKET_BOUNDS_MS) else "inf"): count
+                for index, (bound, count) in enumerate(
+                    zip(BUCKET_BOUNDS_MS + (None,), self.buckets)
+                )
+                if count
+            },
+        }
+
+
+class _Timer:
+    __slots__ = ("_collector", "_name", "_start")
+
+    def __init__(self, collector: "StatsCollector", name: str):
+        self._collector = collector
+        self._name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._collector.record(self._name, time.perf_counter() - self._start)
+        if exc_type is not None:
+            self._collector.incr(self._name + ".errors")
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class StatsCollector:
+    """
+    计数器与耗时直方图，关闭时所有记录方法立即返回
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {}
+        self._histograms: Dict[str, Histogram] = {}
+
+    def incr(self, name: str, value: int = 1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def record(self, name: str, seconds: float):
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+            histogram.record(seconds * 1000)
+
+    def timed(self, name: str):
+        """
+        用于 with 语句，记录代码块的耗时，代码块抛出异常时额外计数 name.errors
+        """
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self.started_at = time.time()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "since": self.started_at,
+                "counters": dict(sorted(self._counters.items())),
+                "histograms": {
+                    name: histogram.to_dict()
+                    for name, histogram in sorted(self._histograms.items())
+                },
+            }
+
+
+class _TimedLockable:
+    """
+    包装 RWLockFair 生成的锁，记录获取锁时的等待时间
+    """
+
+    __slots__ = ("_lock", "_name")
+
+    def __init__(self, lock, name: str):
+        self._lock = lock
+        self._name = name
+
+    def acquire(self, blocking: bool = True, timeout: float = -1) -> bool:
+        start = time.perf_counter()
+        result = self._lock.acquire(blocking, timeout)
+        simple_tp.stats_collector.record(self._name, time.perf_counter() - start)
+        return result
+
+    def release(self):
+        self._lock.release()
+
+    def locked(self) -> bool:
+        return self._lock.locked()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+
+class TimedRWLock(RWLockFair):
+    """
+    统计开启时记录读写锁的等待时间，关闭时直接返回原始的锁
+    """
+
+    def __init__(self, name: str):
+        super().__init__()
+        self._read_stat = f"lock.{name}.read_wait"
+        self._write_stat = f"lock.{name}.write_wait"
+
+    def gen_rlock(self):
+        lock = super().gen_rlock()
+        if not _stats_enabled():
+            return lock
+        return _TimedLockable(lock, self._read_stat)
+
+    def gen_wlock(self):
+        lock = super().gen_wlock()
+        if not _stats_enabled():
+            return lock
+        return _TimedLockable(lock, self._write_stat)
+
+
+def _stats_enabled() -> bool:
+    collector: Optional[StatsCollector] = getattr(simple_tp, "stats_collector", None)
+    return collector is not None and collector.enabled
+
+
+def format_stats(snapshot: Dict[str, Any]) -> List[str]:
+    lines = []
+    for name, value in snapshot.get("gauges", {}).items():
+        lines.append(f"{name}: {value}")
+    for name, value in snapshot["counters"].items():
+        lines.append(f"{name}: {value}")
+    for name, histogram in snapshot["histograms"].items():
+        lines.append(
+            f"{name}: n={histogram['count']} mean={histogram['mean_ms']:.2f}ms "
+            f"p50<={histogram['p50_ms']:g}ms p99<={histogram['p99_ms']:g}ms "
+            f"max={histogram['max_ms']:.2f}ms"
+        )
+    return lines
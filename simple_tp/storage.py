@@ -0,0 +1,730 @@
+import json
+import os
+import sqlite3
+import struct
+import threading
+from typing import (
+    TYPE_CHECKING,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+from urllib.parse import quote, unquote
+
+import simple_tp
+import simple_tp.utils as utils
+
+from simple_tp.data import DataChanges, WaypointTable, waypoints_to_raw
+from simple_tp.utils import CoordWithDimension
+
+if TYPE_CHECKING:
+    from simple_tp.data import DataManager
+
+RawWaypoints = Dict[str, List[Union[float, int]]]
+
+
+def _dump_json(obj, indent_level: int = 0) -> str:
+    # 与 save_config_simple 的输出格式保持一致，并支持嵌入到更深的缩进层级中
+    text = json.dumps(obj, indent=4, ensure_ascii=False)
+    if indent_level:
+        text = text.replace("\n", "\n" + " " * 4 * indent_level)
+    return text
+
+
+def _load_json(path: str) -> Optional[dict]:
+    if not os.path.isfile(path):
+        return None
+    with open(path, "r", encoding="utf8") as f:
+        return json.load(f)
+
+
+def _load_json_data(
+    path: str,
+) -> Tuple[Dict[str, int], RawWaypoints, Dict[str, RawWaypoints]]:
+    # 直接使用 json 解析出的数据，不再逐层反序列化复制一份
+    raw = _load_json(path) or {}
+    return (
+        raw.get("dimension_str2sid", {}),
+        raw.get("global_waypoints", {}),
+        raw.get("personal_waypoints", {}),
+    )
+
+
+class WaypointStorage:
+    """
+    传送点数据的持久化后端
+    lazy 为 True 时个人传送点按需加载，否则在启动时全部加载
+    """
+
+    lazy: bool = False
+
+    def load_dimensions(self) -> Dict[str, int]:
+        raise NotImplementedError()
+
+    def load_global_waypoints(self) -> RawWaypoints:
+        raise NotImplementedError()
+
+    def load_personal_waypoints(self, player: str) -> RawWaypoints:
+        raise NotImplementedError()
+
+    def load_all_personal_waypoints(self) -> Dict[str, RawWaypoints]:
+        raise NotImplementedError()
+
+    def save(self, changes: DataChanges, data_manager: "DataManager"):
+        raise NotImplementedError()
+
+    def close(self):
+        """
+        插件卸载时在最后一次保存之后调用，释放文件句柄等资源
+        """
+        pass
+
+
+class JsonStorage(WaypointStorage):
+    """
+    单文件存储，所有数据保存在 data.json 中
+    """
+
+    def __init__(self, path: str, load: bool = True):
+        self.path = path
+        dimension_str2sid, global_waypoints, personal_waypoints = (
+            _load_json_data(path) if load else ({}, {}, {})
+        )
+        self._dimension_str2sid = dimension_str2sid
+        self._global_waypoints = global_waypoints
+        self._personal_waypoints = personal_waypoints
+        # 序列化缓存：未变化的玩家在保存时直接复用已有的 JSON 片段
+        self._global_fragment: Optional[str] = None
+        self._personal_fragments: Dict[str, str] = {}
+
+    def load_dimensions(self) -> Dict[str, int]:
+        return dict(self._dimension_str2sid)
+
+    def load_global_waypoints(self) -> RawWaypoints:
+        global_waypoints = self._global_waypoints
+        self._global_waypoints = {}
+        return global_waypoints
+
+    def load_personal_waypoints(self, player: str) -> RawWaypoints:
+        return self._personal_waypoints.get(player, {})
+
+    def load_all_personal_waypoints(self) -> Dict[str, RawWaypoints]:
+        personal_waypoints = self._personal_waypoints
+        # 加载完成后不再保留原始数据
+        self._personal_waypoints = {}
+        return personal_waypoints
+
+    def _update_fragment(self, player: str, waypoints: Dict[str, CoordWithDimension]):
+        self._personal_fragments[player] = _dump_json(waypoints_to_raw(waypoints), 2)
+
+    def save(self, changes: DataChanges, data_manager: "DataManager"):
+        if changes.global_waypoints is not None:
+            self._global_fragment = _dump_json(
+                waypoints_to_raw(changes.global_waypoints), 1
+            )
+        elif self._global_fragment is None:
+            self._global_fragment = _dump_json(
+                waypoints_to_raw(data_manager.get_global_waypoints()), 1
+            )
+        for player, waypoints in changes.personal_waypoints.items():
+            self._update_fragment(player, waypoints)
+        for player in data_manager.get_loaded_players():
+            if player not in self._personal_fragments:
+                self._update_fragment(
+                    player, data_manager.get_personal_waypoints(player)
+                )
+
+        personal_items = [
+            f"        {json.dumps(player, ensure_ascii=False)}: {fragment}"
+            for player, fragment in self._personal_fragments.items()
+        ]
+        personal_text = (
+            "{\n" + ",\n".join(personal_items) + "\n    }" if personal_items else "{}"
+        )
+        text = (
+            "{\n"
+            f'    "personal_waypoints": {personal_text},\n'
+            f'    "global_waypoints": {self._global_fragment},\n'
+            f'    "dimension_str2sid": {_dump_json(changes.dimension_str2sid, 1)}\n'
+            "}"
+        )
+        utils.write_file_atomic(self.path, text)
+
+
+class ShardedJsonStorage(WaypointStorage):
+    """
+    分片存储，全局数据保存在 global.json 中，每个玩家的个人传送点单独保存在 players/ 目录下
+    个人传送点在首次访问或玩家加入时才会加载
+    """
+
+    lazy = True
+    GLOBAL_FILE = "global.json"
+    PLAYERS_FOLDER = "players"
+
+    def __init__(self, folder: str, load: bool = True):
+        self.folder = folder
+        self.players_folder = os.path.join(folder, self.PLAYERS_FOLDER)
+        os.makedirs(self.players_folder, exist_ok=True)
+        raw = (_load_json(os.path.join(folder, self.GLOBAL_FILE)) or {}) if load else {}
+        self._dimension_str2sid: Dict[str, int] = raw.get("dimension_str2sid", {})
+        self._global_waypoints: RawWaypoints = raw.get("global_waypoints", {})
+
+    @classmethod
+    def exists(cls, folder: str) -> bool:
+        return os.path.isfile(os.path.join(folder, cls.GLOBAL_FILE))
+
+    @classmethod
+    def migrate_from_json(cls, json_path: str, folder: str):
+        """
+        将单文件 data.json 一次性拆分为分片存储，原文件重命名为 data.json.migrated 保留
+        """
+        dimension_str2sid, global_waypoints, personal_waypoints = _load_json_data(
+            json_path
+        )
+        storage = cls(folder)
+        for player, waypoints in personal_waypoints.items():
+            storage._write_player(player, waypoints)
+        storage._write_global(dimension_str2sid, global_waypoints)
+        if os.path.isfile(json_path):
+            os.replace(json_path, json_path + ".migrated")
+
+    def _player_path(self, player: str) -> str:
+        return os.path.join(self.players_folder, quote(player, safe="") + ".json")
+
+    def _write_player(self, player: str, waypoints: RawWaypoints):
+        path = self._player_path(player)
+        if not waypoints:
+            if os.path.isfile(path):
+                os.remove(path)
+            return
+        utils.write_file_atomic(path, _dump_json(waypoints))
+
+    def _write_global(
+        self, dimension_str2sid: Dict[str, int], global_waypoints: RawWaypoints
+    ):
+        utils.write_file_atomic(
+            os.path.join(self.folder, self.GLOBAL_FILE),
+            _dump_json(
+                {
+                    "global_waypoints": global_waypoints,
+                    "dimension_str2sid": dimension_str2sid,
+                }
+            ),
+        )
+
+    def load_dimensions(self) -> Dict[str, int]:
+        return dict(self._dimension_str2sid)
+
+    def load_global_waypoints(self) -> RawWaypoints:
+        global_waypoints = self._global_waypoints
+        self._global_waypoints = {}
+        return global_waypoints
+
+    def load_personal_waypoints(self, player: str) -> RawWaypoints:
+        return _load_json(self._player_path(player)) or {}
+
+    def load_all_personal_waypoints(self) -> Dict[str, RawWaypoints]:
+        return {
+            unquote(file_name[: -len(".json")]): _load_json(
+                os.path.join(self.players_folder, file_name)
+            )
+            or {}
+            for file_name in os.listdir(self.players_folder)
+            if file_name.endswith(".json")
+        }
+
+    def save(self, changes: DataChanges, data_manager: "DataManager"):
+        for player, waypoints in changes.personal_waypoints.items():
+            self._write_player(player, waypoints_to_raw(waypoints))
+        if changes.global_waypoints is not None:
+            self._write_global(
+                changes.dimension_str2sid,
+                waypoints_to_raw(changes.global_waypoints),
+            )
+
+
+class BinaryStorage(WaypointStorage):
+    """
+    紧凑的二进制单文件存储，所有数据保存在 data.bin 中
+    文件结构（小端序）：
+        头部        magic "STPB"、版本号 u8、字符串数量 u32、字符串表字节数 u32
+        字符串表    UTF-8 编码、以 \\0 分隔的所有传送点名、玩家名和维度名
+        维度表      数量 u16，每项为 名称索引 u32、维度 ID i32
+        全局传送点  数量 u32，每项为 名称索引 u32、x/y/z f64、维度 ID u16
+        个人传送点  玩家数量 u32，每个玩家为 名称索引 u32、传送点数量 u32 及其传送点
+    """
+
+    MAGIC = b"STPB"
+    VERSION = 1
+    HEADER = struct.Struct("<4sBII")
+    DIMENSION_COUNT = struct.Struct("<H")
+    DIMENSION = struct.Struct("<Ii")
+    RECORD = struct.Struct("<I3dH")
+    COUNT = struct.Struct("<I")
+    PLAYER = struct.Struct("<II")
+
+    def __init__(self, path: str, load: bool = True):
+        self.path = path
+        dimension_str2sid, global_waypoints, personal_waypoints = (
+            self.read(path) if load and os.path.isfile(path) else ({}, {}, {})
+        )
+        self._dimension_str2sid = dimension_str2sid
+        self._global_waypoints = global_waypoints
+        self._personal_waypoints = personal_waypoints
+        # 保存时使用的字符串表，已编码的片段中引用其中的索引，只增不减
+        self._string_ids: Dict[str, int] = {}
+        self._global_fragment: Optional[bytes] = None
+        self._personal_fragments: Dict[str, bytes] = {}
+
+    @classmethod
+    def read(
+        cls, path: str
+    ) -> Tuple[Dict[str, int], RawWaypoints, Dict[str, RawWaypoints]]:
+        with open(path, "rb") as f:
+            data = f.read()
+        magic, version, string_count, strings_size = cls.HEADER.unpack_from(data)
+        if magic != cls.MAGIC or version != cls.VERSION:
+            raise ValueError(f"Unsupported waypoint data file: {path}")
+        offset = cls.HEADER.size
+        strings = (
+            data[offset : offset + strings_size].decode("utf8").split("\0")
+            if string_count
+            else []
+        )
+        offset += strings_size
+
+        def read_records(count: int) -> RawWaypoints:
+            nonlocal offset
+            end = offset + count * cls.RECORD.size
+            records = {
+                strings[name]: [x, y, z, dimension]
+                for name, x, y, z, dimension in cls.RECORD.iter_unpack(data[offset:end])
+            }
+            offset = end
+            return records
+
+        (dimension_count,) = cls.DIMENSION_COUNT.unpack_from(data, offset)
+        offset += cls.DIMENSION_COUNT.size
+        dimension_str2sid = {}
+        for _ in range(dimension_count):
+            name, sid = cls.DIMENSION.unpack_from(data, offset)
+            dimension_str2sid[strings[name]] = sid
+            offset += cls.DIMENSION.size
+        (global_count,) = cls.COUNT.unpack_from(data, offset)
+        offset += cls.COUNT.size
+        global_waypoints = read_records(global_count)
+        (player_count,) = cls.COUNT.unpack_from(data, offset)
+        offset += cls.COUNT.size
+        personal_waypoints = {}
+        for _ in range(player_count):
+            player, count = cls.PLAYER.unpack_from(data, offset)
+            offset += cls.PLAYER.size
+            personal_waypoints[strings[player]] = read_records(count)
+        return dimension_str2sid, global_waypoints, personal_waypoints
+
+    @classmethod
+    def migrate_from_json(cls, json_path: str, path: str):
+        """
+        将 data.json 转换为 data.bin，原文件重命名为 data.json.migrated 保留
+        """
+        dimension_str2sid, global_waypoints, personal_waypoints = _load_json_data(
+            json_path
+        )
+        storage = cls(path)
+        storage._write(
+            dimension_str2sid,
+            storage._encode_records(global_waypoints),
+            {
+                player: storage._encode_records(waypoints)
+                for player, waypoints in personal_waypoints.items()
+            },
+        )
+        if os.path.isfile(json_path):
+            os.replace(json_path, json_path + ".migrated")
+
+    @classmethod
+    def export_json(cls, path: str, json_path: str):
+        """
+        将 data.bin 转换回 data.json，原文件重命名为 data.bin.migrated 保留
+        """
+        dimension_str2sid, global_waypoints, personal_waypoints = cls.read(path)
+        utils.write_file_atomic(
+            json_path,
+            _dump_json(
+                {
+                    "personal_waypoints": personal_waypoints,
+                    "global_waypoints": global_waypoints,
+                    "dimension_str2sid": dimension_str2sid,
+                }
+            ),
+        )
+        os.replace(path, path + ".migrated")
+
+    def _string_id(self, string: str) -> int:
+        string_id = self._string_ids.get(string)
+        if string_id is None:
+            if "\0" in string:
+                raise ValueError(f"Invalid character in name: {string!r}")
+            string_id = self._string_ids[string] = len(self._string_ids)
+        return string_id
+
+    def _encode_records(self, raw_waypoints: RawWaypoints) -> bytes:
+        pack = self.RECORD.pack
+        return b"".join(
+            pack(
+                self._string_id(name),
+                coords[0],
+                coords[1],
+                coords[2],
+                int(coords[3]) if len(coords) > 3 else 0,
+            )
+            for name, coords in raw_waypoints.items()
+        )
+
+    def _encode_waypoints(self, waypoints: WaypointTable) -> bytes:
+        pack = self.RECORD.pack
+        string_id = self._string_id
+        return b"".join(
+            pack(string_id(name), x, y, z, dimension)
+            for name, x, y, z, dimension in waypoints.rows()
+        )
+
+    def _write(
+        self,
+        dimension_str2sid: Dict[str, int],
+        global_fragment: bytes,
+        personal_fragments: Dict[str, bytes],
+    ):
+        parts = [self.DIMENSION_COUNT.pack(len(dimension_str2sid))]
+        for dimension, sid in dimension_str2sid.items():
+            parts.append(self.DIMENSION.pack(self._string_id(dimension), sid))
+        parts.append(self.COUNT.pack(len(global_fragment) // self.RECORD.size))
+        parts.append(global_fragment)
+        parts.append(self.COUNT.pack(len(personal_fragments)))
+        for player, fragment in personal_fragments.items():
+            parts.append(
+                self.PLAYER.pack(
+                    self._string_id(player), len(fragment) // self.RECORD.size
+                )
+            )
+            parts.append(fragment)
+        # 字符串表在编码完所有数据后才完整
+        strings = "\0".join(self._string_ids).encode("utf8")
+        header = self.HEADER.pack(
+            self.MAGIC, self.VERSION, len(self._string_ids), len(strings)
+        )
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "wb") as f:
+            f.write(header)
+            f.write(strings)
+            f.writelines(parts)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+
+    def load_dimensions(self) -> Dict[str, int]:
+        return dict(self._dimension_str2sid)
+
+    def load_global_waypoints(self) -> RawWaypoints:
+        return self._global_waypoints
+
+    def load_personal_waypoints(self, player: str) -> RawWaypoints:
+        return self._personal_waypoints.get(player, {})
+
+    def load_all_personal_waypoints(self) -> Dict[str, RawWaypoints]:
+        personal_waypoints = self._personal_waypoints
+        # 加载完成后不再保留原始数据
+        self._global_waypoints = {}
+        self._personal_waypoints = {}
+        return personal_waypoints
+
+    def save(self, changes: DataChanges, data_manager: "DataManager"):
+        # 已删除的名称仍留在字符串表中，过多时重新编码全部数据
+        live_strings = (
+            (
+                len(self._global_fragment or b"")
+                + sum(len(fragment) for fragment in self._personal_fragments.values())
+            )
+            // self.RECORD.size
+            + len(self._personal_fragments)
+            + len(changes.dimension_str2sid)
+        )
+        if len(self._string_ids) > 2 * live_strings + 1024:
+            self._string_ids = {}
+            self._global_fragment = None
+            self._personal_fragments = {}
+        if changes.global_waypoints is not None:
+            self._global_fragment = self._encode_waypoints(changes.global_waypoints)
+        elif self._global_fragment is None:
+            self._global_fragment = self._encode_waypoints(
+                data_manager.get_global_waypoints()
+            )
+        for player, waypoints in changes.personal_waypoints.items():
+            self._personal_fragments[player] = self._encode_waypoints(waypoints)
+        for player in data_manager.get_loaded_players():
+            if player not in self._personal_fragments:
+                self._personal_fragments[player] = self._encode_waypoints(
+                    data_manager.get_personal_waypoints(player)
+                )
+        self._write(
+            changes.dimension_str2sid,
+            self._global_fragment,
+            self._personal_fragments,
+        )
+
+
+class SqliteStorage(WaypointStorage):
+    """
+    SQLite 数据库存储，所有数据保存在 data.db 中，使用 WAL 模式
+    个人传送点在首次访问或玩家加入时才会加载，每次保存只在一个事务中写入发生变化的数据
+    """
+
+    lazy = True
+    # 全局传送点使用的 player_id，玩家的 id 从 1 开始
+    GLOBAL_PLAYER_ID = 0
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS dimensions (
+            name TEXT PRIMARY KEY,
+            sid INTEGER NOT NULL UNIQUE
+        );
+        CREATE TABLE IF NOT EXISTS players (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
+        );
+        CREATE TABLE IF NOT EXISTS waypoints (
+            player_id INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            x REAL NOT NULL,
+            y REAL NOT NULL,
+            z REAL NOT NULL,
+            dimension INTEGER NOT NULL,
+            PRIMARY KEY (player_id, name)
+        ) WITHOUT ROWID;
+    """
+    POSITION_INDEX = """
+        CREATE INDEX IF NOT EXISTS waypoints_position ON waypoints (dimension, x, z)
+    """
+
+    def __init__(self, path: str, load: bool = True):
+        self.path = path
+        # 保存和按需加载使用不同的连接，WAL 模式下读取不会被正在进行的保存阻塞
+        self._write_conn = self._connect(path)
+        self._read_conn = self._connect(path)
+        self._write_lock = threading.Lock()
+        self._read_lock = threading.Lock()
+        with self._write_lock:
+            self._write_conn.executescript(self.SCHEMA)
+            self._write_conn.execute(self.POSITION_INDEX)
+        self._load = load
+
+    @staticmethod
+    def _connect(path: str) -> sqlite3.Connection:
+        conn = sqlite3.connect(path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # WAL 模式下 NORMAL 不会损坏数据库，断电时最多丢失最近的事务，由操作日志兜底
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @classmethod
+    def migrate_from_json(cls, json_path: str, path: str):
+        """
+        将 data.json 导入 data.db，原文件重命名为 data.json.migrated 保留
+        """
+        dimension_str2sid, global_waypoints, personal_waypoints = _load_json_data(
+            json_path
+        )
+        # 在临时文件中完成导入后再替换，中途失败不会留下不完整的 data.db
+        temp_path = path + ".tmp"
+        for file in (temp_path, temp_path + "-wal", temp_path + "-shm"):
+            if os.path.isfile(file):
+                os.remove(file)
+        storage = cls(temp_path, load=False)
+        try:
+            with storage._write_lock, storage._write_conn:
+                # 先导入数据再建立坐标索引，比逐行更新索引快
+                storage._write_conn.execute("DROP INDEX waypoints_position")
+                storage._write_dimensions(dimension_str2sid)
+                storage._write_rows(
+                    cls.GLOBAL_PLAYER_ID, _raw_rows(global_waypoints), replace=False
+                )
+                for player, waypoints in personal_waypoints.items():
+                    storage._write_rows(
+                        storage._player_id(player),
+                        _raw_rows(waypoints),
+                        replace=False,
+                    )
+                storage._write_conn.execute(cls.POSITION_INDEX)
+        finally:
+            storage.close()
+        os.replace(temp_path, path)
+        if os.path.isfile(json_path):
+            os.replace(json_path, json_path + ".migrated")
+
+    @classmethod
+    def export_json(cls, path: str, json_path: str):
+        """
+        将 data.db 导出为 data.json，原文件重命名为 data.db.migrated 保留
+        """
+        storage = cls(path)
+        try:
+            data = {
+                "personal_waypoints": storage.load_all_personal_waypoints(),
+                "global_waypoints": storage.load_global_waypoints(),
+                "dimension_str2sid": storage.load_dimensions(),
+            }
+        finally:
+            storage.close()
+        utils.write_file_atomic(json_path, _dump_json(data))
+        os.replace(path, path + ".migrated")
+
+    def close(self):
+        with self._write_lock, self._read_lock:
+            self._read_conn.close()
+            self._write_conn.close()
+
+    def _read(self, sql: str, parameters: tuple = ()) -> List[tuple]:
+        with self._read_lock:
+            return self._read_conn.execute(sql, parameters).fetchall()
+
+    def _player_id(self, player: str) -> int:
+        # 需持有写锁并处于事务中；不缓存 id，事务回滚后不会留下不存在的 id
+        self._write_conn.execute(
+            "INSERT OR IGNORE INTO players (name) VALUES (?)", (player,)
+        )
+        return self._write_conn.execute(
+            "SELECT id FROM players WHERE name = ?", (player,)
+        ).fetchone()[0]
+
+    def _write_dimensions(self, dimension_str2sid: Dict[str, int]):
+        # 需持有写锁并处于事务中
+        self._write_conn.executemany(
+            "INSERT OR REPLACE INTO dimensions (name, sid) VALUES (?, ?)",
+            dimension_str2sid.items(),
+        )
+
+    def _write_rows(
+        self,
+        player_id: int,
+        rows: Iterable[Tuple[str, float, float, float, int]],
+        replace: bool = True,
+    ):
+        # 需持有写锁并处于事务中，replace 为 True 时先删除该玩家原有的传送点
+        if replace:
+            self._write_conn.execute(
+                "DELETE FROM waypoints WHERE player_id = ?", (player_id,)
+            )
+        self._write_conn.executemany(
+            "INSERT INTO waypoints (player_id, name, x, y, z, dimension) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            ((player_id, *row) for row in rows),
+        )
+
+    def load_dimensions(self) -> Dict[str, int]:
+        if not self._load:
+            return {}
+        return dict(self._read("SELECT name, sid FROM dimensions"))
+
+    def load_global_waypoints(self) -> RawWaypoints:
+        if not self._load:
+            return {}
+        rows = self._read(
+            "SELECT name, x, y, z, dimension FROM waypoints WHERE player_id = ?",
+            (self.GLOBAL_PLAYER_ID,),
+        )
+        return {name: [x, y, z, dimension] for name, x, y, z, dimension in rows}
+
+    def load_personal_waypoints(self, player: str) -> RawWaypoints:
+        # 按主键前缀 (player_id, name) 读取，只访问该玩家的数据
+        rows = self._read(
+            "SELECT waypoints.name, x, y, z, dimension "
+            "FROM players JOIN waypoints ON waypoints.player_id = players.id "
+            "WHERE players.name = ?",
+            (player,),
+        )
+        return {name: [x, y, z, dimension] for name, x, y, z, dimension in rows}
+
+    def load_all_personal_waypoints(self) -> Dict[str, RawWaypoints]:
+        personal_waypoints: Dict[str, RawWaypoints] = {}
+        for player, name, x, y, z, dimension in self._read(
+            "SELECT players.name, waypoints.name, x, y, z, dimension "
+            "FROM waypoints JOIN players ON players.id = waypoints.player_id"
+        ):
+            personal_waypoints.setdefault(player, {})[name] = [x, y, z, dimension]
+        return personal_waypoints
+
+    def save(self, changes: DataChanges, data_manager: "DataManager"):
+        with self._write_lock, self._write_conn:
+            self._write_dimensions(changes.dimension_str2sid)
+            if changes.global_waypoints is not None:
+                self._write_rows(self.GLOBAL_PLAYER_ID, changes.global_waypoints.rows())
+            for player, waypoints in changes.personal_waypoints.items():
+                self._write_rows(self._player_id(player), waypoints.rows())
+
+
+def _raw_rows(
+    raw_waypoints: RawWaypoints,
+) -> Iterator[Tuple[str, float, float, float, int]]:
+    for name, coords in raw_waypoints.items():
+        yield (
+            name,
+            coords[0],
+            coords[1],
+            coords[2],
+            int(coords[3]) if len(coords) > 3 else 0,
+        )
+
+
+STORAGE_TYPES = ("json", "sharded", "binary", "sqlite")
+
+
+def storage_exists(storage_type: str, data_folder: str) -> bool:
+    if storage_type == "sharded":
+        return ShardedJsonStorage.exists(data_folder)
+    file_name = {"json": "data.json", "binary": "data.bin", "sqlite": "data.db"}
+    return os.path.isfile(os.path.join(data_folder, file_name[storage_type]))
+
+
+def can_migrate(source_type: str, target_type: str) -> bool:
+    """
+    create_storage 加载时能否自动完成迁移：
+    可以从 data.json 转换为其他格式，以及将 data.bin / data.db 导出为 data.json
+    """
+    return source_type == "json" or (
+        target_type == "json" and source_type in ("binary", "sqlite")
+    )
+
+
+def create_storage(
+    storage_type: str, data_folder: str, load: bool = True
+) -> WaypointStorage:
+    """
+    load 为 False 时不读取已有数据，用于热重载时由 DataManager 接管旧实例的数据
+    """
+    json_path = os.path.join(data_folder, "data.json")
+    bin_path = os.path.join(data_folder, "data.bin")
+    db_path = os.path.join(data_folder, "data.db")
+    if storage_type == "sqlite":
+        if not os.path.isfile(db_path):
+            SqliteStorage.migrate_from_json(json_path, db_path)
+        return SqliteStorage(db_path, load)
+    if storage_type == "binary":
+        if not os.path.isfile(bin_path):
+            BinaryStorage.migrate_from_json(json_path, bin_path)
+        return BinaryStorage(bin_path, load)
+    if storage_type == "sharded":
+        if not ShardedJsonStorage.exists(data_folder):
+            ShardedJsonStorage.migrate_from_json(json_path, data_folder)
+        return ShardedJsonStorage(data_folder, load)
+    if storage_type != "json":
+        simple_tp.plugin_server.logger.warning(
+            f"Unknown storage type '{storage_type}', falling back to 'json'"
+        )
+    if not os.path.isfile(json_path) and os.path.isfile(bin_path):
+        BinaryStorage.export_json(bin_path, json_path)
+    if not os.path.isfile(json_path) and os.path.isfile(db_path):
+        SqliteStorage.export_json(db_path, json_path)
+    return JsonStorage(json_path, load)
@@ -0,0 +1,183 @@
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+import simple_tp
+
+# 一个游戏刻的时长（秒）
+TICK_SECONDS = 0.05
+
+
+class _Teleport:
+    __slots__ = ("player", "command", "enqueued_at")
+
+    def __init__(self, player: str, command: str, enqueued_at: float):
+        self.player = player
+        self.command = command
+        self.enqueued_at = enqueued_at
+
+
+class TeleportQueue:
+    """
+    限制每个游戏刻执行的传送命令数量，超出的传送排队到之后的游戏刻执行
+    预算充足且没有排队的传送时直接执行，不增加延迟
+    同一玩家排队中的多次传送只执行最后一次，不同发起者的传送轮流执行
+    """
+
+    def __init__(
+        self,
+        per_tick: int,
+        execute: Callable[[str], None],
+        on_executed: Optional[Callable[[str], None]] = None,
+    ):
+        # per_tick 为 0 时不限制，所有传送直接执行
+        self.per_tick = per_tick
+        self._execute = execute
+        self._on_executed = on_executed
+        self._cond = threading.Condition()
+        # 发起者 -> 其排队中的传送
+        self._queues: Dict[str, Deque[_Teleport]] = {}
+        # 有排队传送的发起者，轮流执行
+        self._ready: Deque[str] = deque()
+        # 被传送的玩家 -> 排队中的传送，用于合并
+        self._pending: Dict[str, _Teleport] = {}
+        self._tick = 0
+        self._used = 0
+        self._stopped = False
+        self.coalesced_count = 0
+        self._thread: Optional[threading.Thread] = None
+        if per_tick > 0:
+            self._thread = threading.Thread(
+                target=self._dispatch_loop, daemon=True, name="SimpleTPTeleportQueue"
+            )
+            self._thread.start()
+
+    def _take_budget(self) -> bool:
+        # 需持有锁
+        tick = int(time.monotonic() / TICK_SECONDS)
+        if tick != self._tick:
+            self._tick = tick
+            self._used = 0
+        if self._used >= self.per_tick:
+            return False
+        self._used += 1
+        return True
+
+    def _run(self, teleport: _Teleport):
+        self._execute(teleport.command)
+        if self._on_executed is not None:
+            self._on_executed(teleport.player)
+
+    def submit(self, requester: str, player: str, command: str) -> bool:
+        """
+        提交传送 player 的命令，返回是否已立即执行
+        """
+        return self.submit_many(requester, [(player, command)]) == 1
+
+    def submit_many(self, requester: str, teleports: List[Tuple[str, str]]) -> int:
+        """
+        一次提交多个 (被传送的玩家, 命令)，在预算内的立即执行，其余排队，返回立即执行的数量
+        """
+        now = time.perf_counter()
+        run_now: List[_Teleport] = []
+        if self.per_tick <= 0:
+            run_now = [_Teleport(player, command, now) for player, command in teleports]
+        else:
+            with self._cond:
+                for player, command in teleports:
+                    teleport = _Teleport(player, command, now)
+                    if self._stopped:
+                        run_now.append(teleport)
+                        continue
+                    queued = self._pending.get(player)
+                    if queued is not None:
+                        # 保留原来的排队位置，只替换目标
+                        queued.command = command
+                        self.coalesced_count += 1
+                        simple_tp.stats_collector.incr("tp_queue.coalesced")
+                        continue
+                    if not self._pending and self._take_budget():
+                        run_now.append(teleport)
+                        continue
+                    queue = self._queues.get(requester)
+                    if queue is None:
+                        queue = self._queues[requester] = deque()
+                        self._ready.append(requester)
+                    queue.append(teleport)
+                    self._pending[player] = teleport
+                    simple_tp.stats_collector.incr("tp_queue.queued")
+                if self._pending:
+                    self._cond.notify()
+        for teleport in run_now:
+            self._run(teleport)
+        return len(run_now)
+
+    def discard(self, player: str):
+        """
+        取消该玩家排队中的传送（如玩家已离开）
+        """
+        with self._cond:
+            teleport = self._pending.pop(player, None)
+            if teleport is None:
+                return
+            for requester in list(self._ready):
+                queue = self._queues[requester]
+                if teleport in queue:
+                    queue.remove(teleport)
+                    if not queue:
+                        del self._queues[requester]
+                        self._ready.remove(requester)
+                    return
+
+    def _pop_batch(self) -> List[_Teleport]:
+        # 需持有锁
+        batch = []
+        while self._ready and (self._stopped or self._take_budget()):
+            requester = self._ready.popleft()
+            queue = self._queues[requester]
+            teleport = queue.popleft()
+            if queue:
+                self._ready.append(requester)
+            else:
+                del self._queues[requester]
+            del self._pending[teleport.player]
+            batch.append(teleport)
+        return batch
+
+    def _dispatch_loop(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._stopped:
+                    self._cond.wait()
+                stopped = self._stopped
+                batch = self._pop_batch()
+            now = time.perf_counter()
+            for teleport in batch:
+                simple_tp.stats_collector.record(
+                    "tp_queue.wait", now - teleport.enqueued_at
+                )
+                self._run(teleport)
+            if stopped:
+                return
+            # 等待下一个游戏刻的预算
+            time.sleep(TICK_SECONDS - time.monotonic() % TICK_SECONDS)
+
+    def stop(self):
+        """
+        停止调度线程，排队中的传送会立即全部执行
+        """
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._cond:
+            return {
+                "depth": len(self._pending),
+                "requesters": len(self._queues),
+                "coalesced": self.coalesced_count,
+            }
@@ -0,0 +1,176 @@
+import heapq
+import itertools
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class TeleportRequest:
+    player: str
+    target_player: str
+    timestamp: float
+    is_reversed: bool  # 是否是反向传送请求
+
+
+class TeleportRequestManager:
+    def __init__(
+        self,
+        timeout: float = 0,
+        on_expire: Optional[Callable[[TeleportRequest], None]] = None,
+    ):
+        self._request_sender_dict: Dict[str, TeleportRequest] = {}
+        self._request_receiver_dict: Dict[str, Dict[str, TeleportRequest]] = {}
+        self._lock = threading.RLock()
+        # 过期调度：所有请求共用一个线程，按截止时间排列在小顶堆中
+        # 被提前移除的请求不从堆中删除，到期时检查是否仍然有效即可
+        self.timeout = timeout
+        self._on_expire = on_expire
+        self._cond = threading.Condition(self._lock)
+        self._expire_heap: List[Tuple[float, int, TeleportRequest]] = []
+        self._counter = itertools.count()
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = None
+        self.expired_count = 0
+
+    def start(self):
+        if self.timeout <= 0 or self._thread is not None:
+            return
+        self._stopped = False
+        self._thread = threading.Thread(
+            target=self._expire_loop, daemon=True, name="TeleportRequestExpire"
+        )
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _pop_expired(self) -> List[TeleportRequest]:
+        # 需持有锁
+        now = time.time()
+        expired = []
+        while self._expire_heap and self._expire_heap[0][0] <= now:
+            _, _, tp_request = heapq.heappop(self._expire_heap)
+            if self._request_sender_dict.get(tp_request.player) is tp_request:
+                self.remove_request(tp_request)
+                self.expired_count += 1
+                expired.append(tp_request)
+        return expired
+
+    def _expire_loop(self):
+        while True:
+            with self._cond:
+                expired = self._pop_expired()
+                while not expired and not self._stopped:
+                    self._cond.wait(
+                        self._expire_heap[0][0] - time.time()
+                        if self._expire_heap
+                        else None
+                    )
+                    expired = self._pop_expired()
+                # 停止时先通知已过期的请求再退出，否则它们会被交接给新加载的模块
+                stopped = self._stopped
+            if self._on_expire is not None:
+                for tp_request in expired:
+                    self._on_expire(tp_request)
+            if stopped:
+                return
+
+    def set_request(
+        self,
+        tp_request: TeleportRequest,
+        fail_if_exists: bool = True,
+    ) -> Optional[TeleportRequest]:
+        player = tp_request.player
+        target_player = tp_request.target_player
+        with self._lock:
+            previous_request = self._request_sender_dict.get(player)
+            if previous_request:
+                if fail_if_exists:
+                    return previous_request
+                else:
+                    self.remove_request(previous_request)
+            self._request_receiver_dict.setdefault(target_player, {})[player] = (
+                tp_request
+            )
+            self._request_sender_dict[player] = tp_request
+            if self.timeout > 0:
+                heapq.heappush(
+                    self._expire_heap,
+                    (
+                        tp_request.timestamp + self.timeout,
+                        next(self._counter),
+                        tp_request,
+                    ),
+                )
+                if self._expire_heap[0][2] is tp_request:
+                    self._cond.notify()
+            return previous_request
+
+    def remove_request(self, tp_request: TeleportRequest):
+        with self._lock:
+            if self._request_sender_dict.get(tp_request.player) is tp_request:
+                del self._request_sender_dict[tp_request.player]
+            if tp_request.target_player not in self._request_receiver_dict:
+                return
+            receiver_requests = self._request_receiver_dict[tp_request.target_player]
+            if receiver_requests.get(tp_request.player) is tp_request:
+                del receiver_requests[tp_request.player]
+            if not receiver_requests:
+                del self._request_receiver_dict[tp_request.target_player]
+
+    def remove_player_requests(self, player: str) -> List[TeleportRequest]:
+        """
+        移除该玩家发出和收到的所有请求，返回被移除的请求
+        """
+        with self._lock:
+            removed = list(self._request_receiver_dict.get(player, {}).values())
+            sent_request = self._request_sender_dict.get(player)
+            if sent_request is not None:
+                removed.append(sent_request)
+            for tp_request in removed:
+                self.remove_request(tp_request)
+            return removed
+
+    def get_sender_request(self, player: str) -> Optional[TeleportRequest]:
+        with self._lock:
+            return self._request_sender_dict.get(player)
+
+    def get_receiver_requests(self, player: str) -> Dict[str, TeleportRequest]:
+        with self._lock:
+            return dict(self._request_receiver_dict.get(player, {}))
+
+    def export_requests(self) -> List[Tuple[str, str, float, bool]]:
+        """
+        以内置类型导出所有未处理的请求，用于热重载时交接给新加载的模块
+        """
+        with self._lock:
+            return [
+                (
+                    tp_request.player,
+                    tp_request.target_player,
+                    tp_request.timestamp,
+                    tp_request.is_reversed,
+                )
+                for tp_request in self._request_sender_dict.values()
+            ]
+
+    def restore_requests(self, requests: List[Tuple[str, str, float, bool]]):
+        """
+        恢复 export_requests 导出的请求，过期时间仍从请求发出时开始计算
+        """
+        for request in requests:
+            self.set_request(TeleportRequest(*request), fail_if_exists=False)
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "live": len(self._request_sender_dict),
+                "expired": self.expired_count,
+            }
@@ -0,0 +1,175 @@
+from typing import Dict, Literal, NamedTuple, Optional, Tuple
+
+import mcdreforged.api.all as mcdr
+
+import simple_tp.utils as utils
+
+TRANSLATION_PREFIX = "simple_tp."
+
+# 不含占位符的翻译，加载时预先取出，调用时直接返回
+STATIC_KEYS = (
+    "help.summary",
+    "not_player_tip",
+    "server_busy",
+    "list.personal_waypoints_header",
+    "list.no_personal_waypoints",
+    "list.global_waypoints_header",
+    "list.no_global_waypoints",
+    "near.none",
+    "near.global_tag",
+    "near.personal_tag",
+    "stats.disabled",
+    "stats.reset",
+    "api.failed_get_position.you",
+    "api.failed_get_player_list",
+    "api.failed_get_dimension.you",
+    "tp.queued",
+    "easy_tp.no_permission",
+    "tp_request.no_pending",
+    "tp_user.no_target_player_provided",
+    "bulk_tp.no_players",
+    "bulk_tp.reason.offline",
+    "bulk_tp.reason.no_position",
+    "bulk_tp.reason.dim_not_allowed",
+    "bulk_tp.reason.cross_dim",
+    "tp_here.no_target_player_provided",
+    "waypoint.del.no_name_provided",
+    "waypoint.tp.no_name_provided",
+    "waypoint.set.no_name_provided",
+    "back.no_recorded_position",
+)
+
+# 按钮名 -> (是否使用 button.<name>.hover 翻译作为悬停文本, 颜色)
+# 不使用翻译的悬停文本时，悬停文本为按钮的命令
+BUTTONS: Dict[str, Tuple[bool, mcdr.RColor]] = {
+    "back": (True, mcdr.RColor.aqua),
+    "death_back": (True, mcdr.RColor.aqua),
+    "cancel": (True, mcdr.RColor.aqua),
+    "accept": (True, mcdr.RColor.aqua),
+    "deny": (True, mcdr.RColor.aqua),
+    "prev_page": (True, mcdr.RColor.aqua),
+    "next_page": (True, mcdr.RColor.aqua),
+    "tp": (False, mcdr.RColor.aqua),
+    "del": (True, mcdr.RColor.red),
+}
+
+# 命令固定的按钮：按钮名 -> 子命令
+STATIC_BUTTONS: Dict[str, str] = {
+    "back": "back",
+    "death_back": "back",
+    "cancel": "cancel",
+}
+
+
+class _Compiled(NamedTuple):
+    static: Dict[str, str]
+    # 按钮名 -> 按钮原型（未设置点击命令）
+    prototypes: Dict[str, mcdr.RText]
+    # 按钮名 -> 命令固定的按钮
+    static_buttons: Dict[str, mcdr.RText]
+
+
+class MessageTemplates:
+    """
+    预编译的消息模板：加载时通过 MCDR 已注册的翻译取出所有不含占位符的翻译，
+    并构建所有按钮的原型和命令固定的按钮，含占位符的翻译调用时交由 MCDR 格式化
+    MCDR 的语言改变后，首次使用时按新语言重新全部构建
+    """
+
+    def __init__(self, server: mcdr.PluginServerInterface, command_prefix: str):
+        self._server = server
+        self.command_prefix = command_prefix
+        language = server.get_mcdr_language()
+        self._languages: Dict[str, _Compiled] = {language: self._compile(language)}
+
+    def _translate(self, language: str, key: str) -> Optional[str]:
+        translation_key = TRANSLATION_PREFIX + key
+        try:
+            text = self._server.tr(translation_key, _mcdr_tr_language=language)
+        except (KeyError, IndexError, ValueError):
+            # 翻译中含有占位符，只能在调用时格式化
+            return None
+        if not isinstance(text, str) or text == translation_key:
+            return None
+        return text
+
+    def _compile(self, language: str) -> _Compiled:
+        static: Dict[str, str] = {}
+        for key in STATIC_KEYS:
+            text = self._translate(language, key)
+            if text is not None:
+                static[key] = text
+        prototypes: Dict[str, mcdr.RText] = {}
+        for name, (hover, color) in BUTTONS.items():
+            # 按钮文本不含占位符，缺少翻译时与 MCDR 一样显示翻译键
+            prototypes[name] = utils.get_command_button(
+                self._server.tr(
+                    f"{TRANSLATION_PREFIX}button.{name}.text",
+                    _mcdr_tr_language=language,
+                ),
+                "",
+                hover_text=self._server.tr(
+                    f"{TRANSLATION_PREFIX}button.{name}.hover",
+                    _mcdr_tr_language=language,
+                )
+                if hover
+                else None,
+                color=color,
+            )
+        static_buttons = {
+            name: self._make_button(
+                prototypes, name, f"{self.command_prefix} {subcommand}", "suggest"
+            )
+            for name, subcommand in STATIC_BUTTONS.items()
+        }
+        return _Compiled(static, prototypes, static_buttons)
+
+    def _get_compiled(self) -> _Compiled:
+        language = self._server.get_mcdr_language()
+        compiled = self._languages.get(language)
+        if compiled is None:
+            compiled = self._languages.setdefault(language, self._compile(language))
+        return compiled
+
+    def tr(self, key: str, /, *args, **kwargs):
+        text = self._get_compiled().static.get(key)
+        if text is not None:
+            return text
+        return self._server.tr(TRANSLATION_PREFIX + key, *args, **kwargs)
+
+    @staticmethod
+    def _make_button(
+        prototypes: Dict[str, mcdr.RText],
+        name: str,
+        command: str,
+        type: Literal["suggest", "run"],
+    ) -> mcdr.RText:
+        button = prototypes[name].copy()
+        if not BUTTONS[name][0]:
+            button.h(command)
+        return button.c(
+            mcdr.RAction.suggest_command
+            if type == "suggest"
+            else mcdr.RAction.run_command,
+            command,
+        )
+
+    def button(
+        self,
+        name: str,
+        command: str,
+        *,
+        type: Literal["suggest", "run"] = "suggest",
+    ) -> mcdr.RText:
+        """
+        使用 button.<name> 翻译的命令按钮，悬停文本和颜色见 BUTTONS
+        文本和悬停文本在加载时预先构建，每次调用只复制并设置点击命令
+        """
+        return self._make_button(self._get_compiled().prototypes, name, command, type)
+
+    def static_button(self, name: str) -> mcdr.RText:
+        """
+        命令固定的按钮（如 back、cancel），子命令见 STATIC_BUTTONS，加载时预先构建
+        返回的对象在各消息之间共享，不能修改
+        """
+        return self._get_compiled().static_buttons[name]
@@ -1,4 +1,17 @@
-from typing import NamedTuple, Optional, List, Union, Iterable, Literal, Callable
+from typing import (
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union,
+    Iterable,
+    Literal,
+    Callable,
+    TypeVar,
+)
+import functools
+import os
 import threading
 from enum import Flag, auto
 
@@ -10,6 +23,9 @@ import simple_tp.constants as constants
 
 import simple_tp
 
+_K = TypeVar("_K")
+_V = TypeVar("_V")
+
 
 class CoordWithDimension(NamedTuple):
     x: float
@@ -44,55 +60,102 @@ class LoopManager:
             self._stop_event.clear()
 
 
-def search_for_player(
-    name: str, player_list: List[str], ignore_case: bool = True
-) -> Optional[str]:
-    if name in player_list:
-        return name
-    if not ignore_case:
-        return None
-    lower_name = name.lower()
-    for player in player_list:
-        if player.lower() == lower_name:
-            return player
-    return None
+def write_file_atomic(path: str, content: str):
+    # 先写入临时文件再替换，避免写入中途崩溃导致文件损坏
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", encoding="utf8") as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+def get_typed_argument(ctx: mcdr.CommandContext) -> str:
+    # 补全时正在输入的参数总是命令的最后一段
+    return ctx.command.rsplit(" ", 1)[-1]
+
+
+def _parse_dimension(player: str, dimension) -> Optional[str]:
+    if type(dimension) is int:
+        dimension_id = dimension
+        dimension = constants.DIM_ID2STR.get(
+            dimension_id, simple_tp.plugin_config.extra_dimensions.get(dimension_id)
+        )
+        if dimension is None:
+            simple_tp.plugin_server.logger.warning(
+                f"Player {player} is in an unknown dimension with ID {dimension_id}"
+            )
+            return None
+    return dimension
 
 
 def get_player_dimension(
     player: str,
 ) -> Optional[str]:
+    dimension = simple_tp.player_state_cache.get_dimension(player)
+    if dimension is not None:
+        return dimension
     try:
-        dimension = mc_data_api.get_player_info(player, "Dimension")
+        with simple_tp.stats_collector.timed("data_api.get_player_info"):
+            dimension = mc_data_api.get_player_info(player, "Dimension")
     except Exception as e:
         simple_tp.plugin_server.logger.error(
             f"Error getting dimension for player {player}: {e}"
         )
         return None
-    if type(dimension) is int:
-        dimension = constants.DIM_ID2STR.get(
-            dimension, simple_tp.plugin_config.extra_dimensions.get(dimension)
-        )
-        if dimension is None:
-            simple_tp.plugin_server.logger.warning(
-                f"Player {player} is in an unknown dimension with ID {dimension}"
-            )
-            return None
-
+    dimension = _parse_dimension(player, dimension)
+    if dimension is not None:
+        simple_tp.player_state_cache.put_dimension(player, dimension)
     return dimension
 
 
-def get_player_position(
+def _query_position_combined(
     player: str,
-) -> Optional[CoordWithDimension]:
+) -> Optional[Tuple[Tuple[float, float, float], Optional[str]]]:
+    # 一次查询整个实体数据，同时解析 Pos 和 Dimension
     try:
-        coord = mc_data_api.get_player_coordinate(player)
+        with simple_tp.stats_collector.timed("data_api.get_player_info"):
+            entity_data = mc_data_api.get_player_info(player)
+        pos = entity_data["Pos"]
+        coord = (float(pos[0]), float(pos[1]), float(pos[2]))
+        dimension = entity_data["Dimension"]
+    except Exception as e:
+        simple_tp.plugin_server.logger.debug(
+            f"Combined position query failed for player {player}, falling back: {e}"
+        )
+        return None
+    return coord, _parse_dimension(player, dimension)
+
+
+def _query_position_separately(
+    player: str,
+) -> Optional[Tuple[Tuple[float, float, float], Optional[str]]]:
+    try:
+        with simple_tp.stats_collector.timed("data_api.get_player_coordinate"):
+            coord = mc_data_api.get_player_coordinate(player)
     except Exception as e:
         simple_tp.plugin_server.logger.error(
             f"Error getting position for player {player}: {e}"
         )
         return None
+    return (coord.x, coord.y, coord.z), get_player_dimension(player)
 
-    dimension = get_player_dimension(player)
+
+def get_player_position(
+    player: str,
+) -> Optional[CoordWithDimension]:
+    position = simple_tp.player_state_cache.get_position(player)
+    if position is not None:
+        return position
+
+    result = None
+    if simple_tp.plugin_config.combined_position_query:
+        result = _query_position_combined(player)
+    if result is None:
+        result = _query_position_separately(player)
+    if result is None:
+        return None
+    (x, y, z), dimension = result
 
     if dimension not in simple_tp.data_manager.dimension_str2sid:
         simple_tp.plugin_server.logger.warning(
@@ -100,7 +163,35 @@ def get_player_position(
         )
         return None
     dim_sid = simple_tp.data_manager.dimension_str2sid[dimension]
-    return CoordWithDimension(coord.x, coord.y, coord.z, dim_sid)
+    position = CoordWithDimension(x, y, z, dim_sid)
+    simple_tp.player_state_cache.put_position(player, position, dimension)
+    return position
+
+
+def run_concurrently(calls: Dict[_K, Callable[[], _V]]) -> Dict[_K, _V]:
+    """
+    并发执行多个查询并返回各自的结果，只有一个查询时直接在当前线程执行
+    第一个查询在当前线程执行，其余提交到插件的查询线程池，不为每次调用创建线程
+    """
+    if len(calls) <= 1:
+        return {key: call() for key, call in calls.items()}
+    (first_key, first_call), *rest = calls.items()
+    futures = {key: simple_tp.query_pool.submit(call) for key, call in rest}
+    results = {first_key: first_call()}
+    for key, future in futures.items():
+        results[key] = future.result()
+    return results
+
+
+def get_player_positions(
+    players: List[str],
+) -> Dict[str, Optional[CoordWithDimension]]:
+    """
+    批量查询多名玩家的位置（含维度），缓存未命中的玩家并发查询，总耗时接近一次查询
+    """
+    return run_concurrently(
+        {player: functools.partial(get_player_position, player) for player in players}
+    )
 
 
 def check_permission(player: str, permission: int) -> bool:
@@ -185,20 +276,21 @@ def teleport_check(
         )
 
     if TpCheckFlags.ONLINE in check_flags:
-        player_list = simple_tp.online_player_counter.get_player_list()
-        if player_list is None:
+        online_player_counter = simple_tp.online_player_counter
+        if online_player_counter.get_player_list() is None:
             reply_error(tr("api.failed_get_player_list"))
             return False
-        player = search_for_player(player, player_list)
-
-        if player is None:
+        online_name = online_player_counter.search_player(player)
+        if online_name is None:
             reply_error(tr("player_not_online", player=player))
             return False
+        player = online_name
         if target_player:
-            target_player = search_for_player(target_player, player_list)
-            if target_player is None:
+            online_name = online_player_counter.search_player(target_player)
+            if online_name is None:
                 reply_error(tr("player_not_online", player=target_player))
                 return False
+            target_player = online_name
 
     if TpCheckFlags.WORLD in check_flags:
         player_dim = dim_getter(player)
@@ -278,4 +370,4 @@ def teleport_check(
 
 
 def tr(key: str, /, *args, **kwargs):
-    return simple_tp.plugin_server.tr("simple_tp." + key, *args, **kwargs)
\ No newline at end of file
+    return simple_tp.message_templates.tr(key, *args, **kwargs)
\ No newline at end of file